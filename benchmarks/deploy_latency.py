@@ -0,0 +1,67 @@
+import sys
+import os
+import json
+import shutil
+import statistics
+import subprocess
+import threading
+import time
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from route.project.kube import KubeApiBackend
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ITERATIONS = 20
+
+
+class FakeApiServerHandler(BaseHTTPRequestHandler):
+    # Rollout PATCH만 처리하는 로컬 가짜 Kubernetes API 서버
+    protocol_version = 'HTTP/1.1'
+    wbufsize = 65536
+
+    def do_PATCH(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        body = json.dumps({'kind': 'Rollout', 'metadata': {'name': self.path.rsplit('/', 1)[-1]}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def measure(func):
+    samples = []
+    for index in range(ITERATIONS):
+        startedAt = time.monotonic()
+        func(index)
+        samples.append((time.monotonic() - startedAt) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def report(name, result):
+    print(f'{name:>12}: median {result[0]:8.1f}ms, max {result[1]:8.1f}ms')
+
+
+if __name__ == '__main__':
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeApiServerHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    backend = KubeApiBackend(f'http://127.0.0.1:{server.server_port}', token='bench')
+    report('kube patch', measure(lambda index: backend.patchRolloutImage(
+        'bench', 'bench', f'ghcr.io/pnu-capstone-4/bench:{index:07d}', 8080)))
+    server.shutdown()
+
+    # helm 경로는 클러스터 없이 측정 가능한 부분(프로세스 실행 + 차트 로드 + 렌더링)만 잰다.
+    # 실제 helm upgrade는 여기에 릴리스 조회와 릴리스 시크릿 쓰기가 더해진다
+    if shutil.which('helm') is None:
+        print('   helm path: skipped (helm binary not found)')
+    else:
+        report('helm render', measure(lambda index: subprocess.run(
+            ['helm', 'template', 'bench', os.path.join(ROOT, 'app-template'),
+             '--set', f'image.tag={index:07d}', '--set', 'image.repository=bench', '--set', 'image.targetPort=8080'],
+            capture_output=True, check=True)))
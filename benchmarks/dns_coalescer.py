@@ -0,0 +1,35 @@
+import sys
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from route.project.dns import FakeDnsBackend, DnsChangeCoalescer, makeARecord
+
+# 동시에 생성되는 프로젝트 수와 가짜 Cloud DNS 응답 지연(초)
+PROJECTS = 40
+API_LATENCY = 0.05
+
+
+def createRecords(apply, index):
+    apply(makeARecord(f'bench{index}.pitapat.ne.kr'))
+    apply(makeARecord(f'bench{index}-ci.webhook.pitapat.ne.kr'))
+
+
+def run(name, backend, apply):
+    startedAt = time.monotonic()
+    with ThreadPoolExecutor(max_workers=PROJECTS) as executor:
+        list(executor.map(lambda index: createRecords(apply, index), range(PROJECTS)))
+    elapsed = time.monotonic() - startedAt
+    print(f'{name:>10}: {backend.calls:4d} API calls, {len(backend.records):4d} records, {elapsed * 1000:7.1f}ms')
+
+
+if __name__ == '__main__':
+    direct = FakeDnsBackend(latency=API_LATENCY)
+    run('direct', direct, lambda record: direct.applyChange(additions=[record]))
+
+    batched = FakeDnsBackend(latency=API_LATENCY)
+    coalescer = DnsChangeCoalescer(batched, window=0.2)
+    run('coalesced', batched, lambda record: coalescer.add(record).result())
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _FakeGithubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    wbufsize = 65536
+
+    def _body(self):
+        if self.path.startswith('/user'):
+            return {'login': 'fake', 'name': 'Fake', 'avatar_url': 'https://example.com/a.png'}
+        if '/commits' in self.path:
+            return [{'sha': 'a1b2c3d4e5f6a7b8c9d0a1b2c3d4e5f6a7b8c9d0', 'commit': {'message': 'fake commit'}}]
+        return None
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        if self.headers.get('Authorization', '').removeprefix('Bearer ') in self.server.revokedTokens:
+            self._send(401, b'{"message": "Bad credentials"}')
+            return
+        body = self._body()
+        if body is None:
+            self._send(404, b'{"message": "Not Found"}')
+            return
+        payload = json.dumps(body).encode()
+        etag = '"' + hashlib.sha1(payload).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            # GitHub는 조건부 요청의 304 응답을 rate limit에서 차감하지 않는다
+            self._send(304, b'', etag)
+            return
+        if not self.server.charge():
+            self._send(403, b'{"message": "API rate limit exceeded"}')
+            return
+        self._send(200, payload, etag)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._send(200, b'{"access_token": "gho_fake"}')
+
+    def _send(self, status, payload, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('X-RateLimit-Limit', str(self.server.rateLimit))
+        self.send_header('X-RateLimit-Remaining', str(max(self.server.rateLimit - self.server.charged, 0)))
+        self.send_header('X-RateLimit-Reset', str(int(time.time()) + 3600))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeGithubServer(ThreadingHTTPServer):
+    # 테스트/벤치마크용 로컬 GitHub API. ETag/If-None-Match와 rate limit 헤더를 흉내 내며,
+    # GITHUB_API_URL을 url로 지정하면 앱을 실제 GitHub 없이 띄울 수 있다
+    daemon_threads = True
+
+    def __init__(self, port=0, rateLimit=5000):
+        super().__init__(('127.0.0.1', port), _FakeGithubHandler)
+        self.rateLimit = rateLimit
+        self.charged = 0
+        self.paths = []
+        self.revokedTokens = set()
+        self._lock = threading.Lock()
+        self.url = f'http://127.0.0.1:{self.server_port}'
+
+    def charge(self):
+        # 한도를 넘긴 요청은 GitHub처럼 403으로 거절한다
+        with self._lock:
+            if self.charged >= self.rateLimit:
+                return False
+            self.charged += 1
+            return True
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
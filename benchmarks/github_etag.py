@@ -0,0 +1,43 @@
+import sys
+import os
+import statistics
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ITERATIONS = 200
+
+
+def measure(func):
+    samples = []
+    for _ in range(ITERATIONS):
+        startedAt = time.monotonic()
+        func()
+        samples.append((time.monotonic() - startedAt) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('REDIS_URL', 'redis://localhost:6379/0')
+    from flask import Flask
+    from route.github import GithubClient
+    from benchmarks.fake_github import FakeGithubServer
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        # python benchmarks/github_etag.py serve 8099
+        server = FakeGithubServer(int(sys.argv[2]) if len(sys.argv) > 2 else 8099)
+        print(f'Fake GitHub API listening on {server.url}')
+        server.serve_forever()
+
+    server = FakeGithubServer().start()
+    app = Flask(__name__)
+    app.config['REDIS_URL'] = os.environ['REDIS_URL']
+
+    for name, config in (('no cache', None), ('etag', os.environ['REDIS_URL'])):
+        app.config['REDIS_URL'] = config
+        client = GithubClient(apiUrl=server.url)
+        server.charged = 0
+        with app.app_context():
+            median, worst = measure(lambda: client.get('/repos/bench/bench/commits', 'bench', {'per_page': 1}))
+        print(f'{name:>9}: median {median:6.2f}ms, max {worst:6.2f}ms, '
+              f'{server.charged}/{ITERATIONS} requests charged to the rate limit')
@@ -0,0 +1,88 @@
+import sys
+import os
+import gc
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STREAMS = 1000
+CHANNELS = 200  # 사용자 한 명이 탭 여러 개를 여는 경우를 흉내 낸다
+
+
+def measureMemory(openStreams):
+    # 스트림 1k개를 열었을 때 늘어난 메모리(tracemalloc 기준)를 잰다
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    streams = openStreams()
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    grown = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return streams, grown
+
+
+def openPerClientSubscriptions(redisClient):
+    # 기존 flask_sse 방식: 스트림마다 pubsub 연결을 열고 채널을 구독한다
+    def openStreams():
+        streams = []
+        for index in range(STREAMS):
+            pubsub = redisClient.pubsub()
+            pubsub.subscribe(f'bench-{index % CHANNELS}')
+            streams.append(pubsub)
+        return streams
+    return openStreams
+
+
+def openHubStreams(app, stream):
+    def openStreams():
+        streams = []
+        for index in range(STREAMS):
+            with app.test_request_context(f'/stream?channel=bench-{index % CHANNELS}'):
+                response = stream()
+            body = iter(response.response)
+            next(body)
+            streams.append((response, body))
+        return streams
+    return openStreams
+
+
+def report(name, grown, connections):
+    print(f'{name:>11}: {grown / 1024:8.1f} KiB per {STREAMS} idle streams, {connections:4d} Redis connections')
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('REDIS_URL', 'redis://localhost:6379/0')
+    import redis
+    from flask import Flask
+    from route.redisclient import getRedis
+    from route.sse import getSseHub, publishEvent, stream
+
+    # flask_sse는 decode_responses 없이 REDIS_URL로 자체 클라이언트를 만든다
+    perClient = redis.StrictRedis.from_url(os.environ['REDIS_URL'])
+    streams, grown = measureMemory(openPerClientSubscriptions(perClient))
+    report('per-client', grown, perClient.connection_pool._created_connections)
+    for pubsub in streams:
+        pubsub.close()
+
+    app = Flask(__name__)
+    app.config['REDIS_URL'] = os.environ['REDIS_URL']
+    with app.app_context():
+        redisClient = getRedis()
+        connectionsBefore = redisClient.connection_pool._created_connections
+    streams, grown = measureMemory(openHubStreams(app, stream))
+    time.sleep(0.5)
+    report('hub', grown, redisClient.connection_pool._created_connections - connectionsBefore)
+
+    # 모든 채널에 이벤트를 하나씩 보내고 모든 스트림이 받을 때까지 걸린 시간
+    startedAt = time.monotonic()
+    with app.app_context():
+        for index in range(CHANNELS):
+            publishEvent(f'bench-{index}', {'projectId': index, 'status': 4})
+    for response, body in streams:
+        next(body)
+    print(f'{"fan-out":>11}: {(time.monotonic() - startedAt) * 1000:8.1f}ms to deliver to {STREAMS} streams, '
+          f'{getSseHub().connectionCount()} connected')
+    for response, body in streams:
+        response.close()
@@ -0,0 +1,34 @@
+"""empty message
+
+Revision ID: d41c6a8b3e25
+Revises: 9b3f1c7e2d48
+Create Date: 2026-10-18 21:40:12.083615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41c6a8b3e25'
+down_revision = '9b3f1c7e2d48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Deploy', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('project_id', sa.Integer(), nullable=True))
+
+    # 기존 배포는 빌드의 프로젝트로 채운다
+    op.execute('UPDATE Deploy SET project_id = (SELECT Build.project_id FROM Build WHERE Build.id = Deploy.build_id)')
+
+    with op.batch_alter_table('Deploy', schema=None) as batch_op:
+        batch_op.alter_column('project_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_index('ix_Deploy_project_id_id', ['project_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('Deploy', schema=None) as batch_op:
+        batch_op.drop_index('ix_Deploy_project_id_id')
+        batch_op.drop_column('project_id')
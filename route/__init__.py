@@ -6,7 +6,6 @@ from flask import Flask
 from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
-from flask_sse import sse
 
 # 환경 변수 로드
 load_dotenv()
@@ -31,16 +30,27 @@ def create_app():
     app.register_blueprint(userBlueprint, url_prefix='/user')
     from route.user.errorhandler import registerUserErrorHandler
     registerUserErrorHandler(app)
+    from .user.cache import registerTokenInvalidation
+    registerTokenInvalidation()
 
     from .project.routes import projectBlueprint
     app.register_blueprint(projectBlueprint, url_prefix='/project')
+    from .project.cache import registerVersionTracking
+    registerVersionTracking()
+    from .project.statuswait import registerStatusPublishing
+    registerStatusPublishing()
+    from .project.dns import initWildcardMode
+    initWildcardMode(app)
+    from .project.commands import dnsCli
+    app.cli.add_command(dnsCli)
     from route.project.errorhandler import registerProjectErrorHandler
     registerProjectErrorHandler(app)
 
-    # Add CORS for sse blueprint
+    # 워커당 하나의 Redis 구독을 공유하는 SSE 스트림
+    from .sse import sseBlueprint
     cors = CORS()
-    cors.init_app(sse, resources={r"/stream/*": {"origins": "*"}})
-    app.register_blueprint(sse, url_prefix='/stream')
+    cors.init_app(sseBlueprint, resources={r"/stream/*": {"origins": "*"}})
+    app.register_blueprint(sseBlueprint, url_prefix='/stream')
 
     # 데이터베이스 테이블 정보를 반환하는 엔드포인트
     @app.route('/tables', methods=['GET'])
@@ -58,6 +68,12 @@ def create_app():
             tables[table_name] = columns
         return jsonify(tables)
 
+    # 워커별 캐시 적중률 등 내부 카운터
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics():
+        from .metrics import getMetrics
+        return jsonify(getMetrics())
+
 
     # OPTIONS 요청에 대한 응답을 위한 미들웨어
     @app.after_request
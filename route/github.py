@@ -0,0 +1,148 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+from urllib.parse import urlencode
+from flask import has_app_context
+from redis.exceptions import RedisError
+
+from .httpclient import HttpClient
+from .metrics import incrementCounter
+from .redisclient import getRedis
+
+GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com')
+GITHUB_OAUTH_URL = os.getenv('GITHUB_OAUTH_URL', 'https://github.com')
+ETAG_CACHE_KEY = 'github:etag:{}'
+ETAG_CACHE_TTL = 24 * 60 * 60
+RATE_LIMIT_KEY = 'github:ratelimit:{}'
+RATE_LIMIT_WARNING = 100
+
+logger = logging.getLogger(__name__)
+
+
+def _tokenHash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class GithubClient:
+    # 커넥션 풀을 공유하고, 조건부 요청(If-None-Match)으로 304 응답은 rate limit에 포함되지 않게 한다.
+    # ETag와 응답 본문은 토큰별로 Redis에 저장한다
+    def __init__(self, apiUrl=GITHUB_API_URL, oauthUrl=GITHUB_OAUTH_URL, httpClient=None):
+        self.apiUrl = apiUrl.rstrip('/')
+        self.oauthUrl = oauthUrl.rstrip('/')
+        self.http = httpClient or HttpClient('github')
+
+    def _redis(self):
+        return getRedis() if has_app_context() else None
+
+    def _loadCached(self, cacheKey):
+        redisClient = self._redis()
+        if redisClient is None:
+            return None
+        try:
+            cached = redisClient.hgetall(cacheKey)
+        except RedisError:
+            return None
+        return cached or None
+
+    def _storeCached(self, cacheKey, etag, body):
+        redisClient = self._redis()
+        if redisClient is None:
+            return
+        try:
+            pipe = redisClient.pipeline(transaction=False)
+            pipe.hset(cacheKey, mapping={'etag': etag, 'body': body})
+            pipe.expire(cacheKey, ETAG_CACHE_TTL)
+            pipe.execute()
+        except RedisError:
+            pass
+
+    def _recordRateLimit(self, token, headers):
+        if 'X-RateLimit-Remaining' not in headers:
+            return
+        remaining = int(headers['X-RateLimit-Remaining'])
+        reset = int(headers.get('X-RateLimit-Reset', time.time() + 3600))
+        if remaining < RATE_LIMIT_WARNING:
+            incrementCounter('github.ratelimit.low')
+            logger.warning('GitHub rate limit low for token %s: %d remaining', _tokenHash(token)[:8], remaining)
+        redisClient = self._redis()
+        if redisClient is None:
+            return
+        try:
+            key = RATE_LIMIT_KEY.format(_tokenHash(token))
+            pipe = redisClient.pipeline(transaction=False)
+            pipe.hset(key, mapping={'limit': headers.get('X-RateLimit-Limit', ''), 'remaining': remaining,
+                                    'reset': reset})
+            pipe.expireat(key, max(reset, int(time.time()) + 1))
+            pipe.execute()
+        except RedisError:
+            pass
+
+    def getRateLimit(self, token):
+        redisClient = self._redis()
+        if redisClient is None:
+            return None
+        try:
+            rateLimit = redisClient.hgetall(RATE_LIMIT_KEY.format(_tokenHash(token)))
+        except RedisError:
+            return None
+        if not rateLimit:
+            return None
+        return {'limit': int(rateLimit['limit']) if rateLimit['limit'] else None,
+                'remaining': int(rateLimit['remaining']), 'reset': int(rateLimit['reset'])}
+
+    def get(self, path, token, params=None, allowStale=True):
+        # (상태 코드, 파싱된 JSON)을 반환한다. 304면 캐시된 본문을 200으로 돌려준다.
+        # 한도를 다 쓴 동안 allowStale이면 마지막 본문을, 아니면 429를 반환한다
+        url = self.apiUrl + path
+        query = urlencode(sorted((params or {}).items()))
+        cacheKey = ETAG_CACHE_KEY.format(hashlib.sha256(f'{token}\n{url}?{query}'.encode()).hexdigest())
+        cached = self._loadCached(cacheKey)
+
+        headers = {'Authorization': f'Bearer {token}', 'Accept': 'application/vnd.github.v3+json'}
+        if cached is not None:
+            headers['If-None-Match'] = cached['etag']
+
+        rateLimit = self.getRateLimit(token)
+        if rateLimit is not None and rateLimit['remaining'] == 0 and rateLimit['reset'] > time.time():
+            # 한도를 다 쓴 동안에는 요청하지 않는다
+            if allowStale and cached is not None:
+                incrementCounter('github.ratelimit.served_stale')
+                return 200, json.loads(cached['body'])
+            incrementCounter('github.ratelimit.rejected')
+            return 429, None
+
+        response = self.http.get(url, params=params, headers=headers)
+        self._recordRateLimit(token, response.headers)
+        if response.status_code == 304 and cached is not None:
+            incrementCounter('github.etag.hit')
+            return 200, json.loads(cached['body'])
+
+        incrementCounter('github.etag.miss')
+        if response.status_code in (403, 429) and response.headers.get('X-RateLimit-Remaining') == '0':
+            return 429, None
+        if response.status_code != 200:
+            return response.status_code, None
+        if response.headers.get('ETag'):
+            self._storeCached(cacheKey, response.headers['ETag'], response.text)
+        return 200, response.json()
+
+    def exchangeCode(self, clientId, clientSecret, code, redirectUri):
+        # OAuth 인가 코드를 액세스 토큰으로 교환. 코드가 잘못되었으면 None
+        response = self.http.post(self.oauthUrl + '/login/oauth/access_token',
+                                  data={'client_id': clientId, 'client_secret': clientSecret,
+                                        'code': code, 'redirect_uri': redirectUri},
+                                  headers={'Accept': 'application/json'})
+        return response.json().get('access_token')
+
+
+_client = None
+
+
+def getGithubClient():
+    global _client
+    if _client is None:
+        _client = GithubClient()
+    return _client
@@ -0,0 +1,165 @@
+import os
+import random
+import threading
+import time
+
+import requests
+
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from .metrics import incrementCounter
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 10))
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 2))
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 20))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('HTTP_CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv('HTTP_CIRCUIT_RESET_TIMEOUT', 30))
+
+RETRY_STATUSES = (502, 503, 504)
+# 요청이 처리됐을 수 있는 상태에서 POST 등을 다시 보내면 중복 실행되므로, 처리하지 않았다는 뜻의 503만 재시도한다
+NON_IDEMPOTENT_RETRY_STATUSES = (503,)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    pass
+
+
+def isConnectFailure(error):
+    # 요청을 보내기 전, 연결 단계에서 실패했는지 (보낸 뒤 연결이 끊긴 경우와 구분한다)
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError) or not error.args:
+        return False
+    reason = getattr(error.args[0], 'reason', error.args[0])
+    return isinstance(reason, NewConnectionError)
+
+
+class CircuitBreaker:
+    # 연속 실패가 failureThreshold에 이르면 resetTimeout 동안 요청을 막고, 이후 한 번만 시험 요청을 보낸다
+    def __init__(self, failureThreshold=CIRCUIT_FAILURE_THRESHOLD, resetTimeout=CIRCUIT_RESET_TIMEOUT):
+        self.failureThreshold = failureThreshold
+        self.resetTimeout = resetTimeout
+        self.failures = 0
+        self.openedAt = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.openedAt is None:
+                return True
+            if time.monotonic() - self.openedAt < self.resetTimeout or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def recordSuccess(self):
+        with self._lock:
+            self.failures = 0
+            self.openedAt = None
+            self._probing = False
+
+    def recordFailure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failureThreshold:
+                self.openedAt = time.monotonic()
+            self._probing = False
+
+
+class HttpClient:
+    # keep-alive 커넥션 풀, 연결/읽기 타임아웃, 지터를 준 재시도, 호스트별 서킷 브레이커를 갖춘 공용 클라이언트
+    def __init__(self, name, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT), maxRetries=HTTP_MAX_RETRIES,
+                 backoff=0.2, poolSize=HTTP_POOL_SIZE, failureThreshold=CIRCUIT_FAILURE_THRESHOLD,
+                 resetTimeout=CIRCUIT_RESET_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self.maxRetries = maxRetries
+        self.backoff = backoff
+        self.failureThreshold = failureThreshold
+        self.resetTimeout = resetTimeout
+        self._breakers = {}
+        self._breakersLock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _breaker(self, host):
+        with self._breakersLock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failureThreshold, self.resetTimeout)
+                self._breakers[host] = breaker
+            return breaker
+
+    def _sleepBeforeRetry(self, attempt):
+        # full jitter: 0 ~ backoff * 2^attempt
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def request(self, method, url, **kwargs):
+        method = method.upper()
+        idempotent = method in IDEMPOTENT_METHODS
+        retryStatuses = RETRY_STATUSES if idempotent else NON_IDEMPOTENT_RETRY_STATUSES
+        host = urlsplit(url).netloc
+        breaker = self._breaker(host)
+        kwargs.setdefault('timeout', self.timeout)
+
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                incrementCounter(f'http.{self.name}.circuit_open')
+                raise CircuitOpenError(f"Circuit open for {host}")
+
+            incrementCounter(f'http.{self.name}.requests')
+            startedAt = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                incrementCounter(f'http.{self.name}.errors')
+                breaker.recordFailure()
+                # 멱등이 아닌 요청은 연결 자체가 실패한 경우에만 안전하게 재시도할 수 있다
+                # (읽기 타임아웃이나 보낸 뒤 끊긴 연결은 서버에서 이미 실행됐을 수 있다)
+                retryable = isConnectFailure(e) or \
+                    (idempotent and isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)))
+                if not retryable or attempt >= self.maxRetries:
+                    raise
+            else:
+                incrementCounter(f'http.{self.name}.latency_ms', int((time.monotonic() - startedAt) * 1000))
+                if response.status_code >= 500:
+                    incrementCounter(f'http.{self.name}.errors')
+                    breaker.recordFailure()
+                else:
+                    breaker.recordSuccess()
+                if response.status_code not in retryStatuses or attempt >= self.maxRetries:
+                    return response
+                response.close()
+
+            attempt += 1
+            incrementCounter(f'http.{self.name}.retries')
+            self._sleepBeforeRetry(attempt)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+
+_clients = {}
+_clientsLock = threading.Lock()
+
+
+def getHttpClient(name='default'):
+    # 용도(name)별로 프로세스당 하나의 클라이언트를 공유한다
+    with _clientsLock:
+        client = _clients.get(name)
+        if client is None:
+            client = HttpClient(name)
+            _clients[name] = client
+        return client
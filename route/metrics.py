@@ -0,0 +1,35 @@
+import os
+import threading
+
+from collections import defaultdict
+
+# 워커 프로세스 단위의 카운터 (GET /metrics 로 노출)
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_gauges = {}
+
+
+def incrementCounter(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def getCounters():
+    with _lock:
+        return dict(_counters)
+
+
+def registerGauge(name, func):
+    # 현재 연결 수처럼 누적되지 않는 값은 조회할 때 func()로 읽는다
+    with _lock:
+        _gauges[name] = func
+
+
+def getGauges():
+    with _lock:
+        gauges = dict(_gauges)
+    return {name: func() for name, func in gauges.items()}
+
+
+def getMetrics():
+    return {'pid': os.getpid(), 'counters': getCounters(), 'gauges': getGauges()}
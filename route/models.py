@@ -23,7 +23,7 @@ class User(db.Model):
 class Token(db.Model):
     __tablename__ = 'Token'
     user_id = db.Column(db.Integer, db.ForeignKey('User.id'), primary_key=True, nullable=False)
-    access_token = db.Column(db.String(255), primary_key=True, nullable=False)
+    access_token = db.Column(db.String(255), primary_key=True, nullable=False, index=True)
 
     def __repr__(self):
         return f'Token: user_id={self.user_id}, access_token={self.access_token}'
@@ -47,11 +47,16 @@ class Project(db.Model):
     subdomain = db.Column(db.String(255), nullable=False)
     description = db.Column(db.String(100), nullable=False, default="")
     detailed_description = db.Column(db.Text, nullable=False, default="")
+    # GitHub push 웹훅으로 받은 main 브랜치의 마지막 커밋
+    latest_commit_sha = db.Column(db.String(40), nullable=True)
+    latest_commit_msg = db.Column(db.String(255), nullable=True)
+    latest_commit_at = db.Column(db.DateTime, nullable=True)
 
     builds = db.relationship('Build', backref='Project', lazy=True, cascade='all, delete-orphan', foreign_keys='Build.project_id')
     secrets = db.relationship('Secret', backref='Project', lazy=True, cascade='all, delete-orphan')
     favorites = db.relationship('Favorite', backref='project', lazy=True, cascade='all, delete-orphan')
     logs = db.relationship('Log', backref='project', uselist=False, lazy=True, cascade='all, delete-orphan')
+    pending_builds = db.relationship('PendingBuild', backref='project', lazy=True, cascade='all, delete-orphan')
 
     def __repr__(self):
         return f'Project: id={self.id}, name={self.name}, status={self.status}'
@@ -74,15 +79,51 @@ class Build(db.Model):
 
     deploys = db.relationship('Deploy', backref='Build', lazy=True, cascade='all, delete-orphan')
 
+    __table_args__ = (db.Index('ix_Build_project_id_id', 'project_id', 'id'),)
+
     def __repr__(self):
         return f'Build: id={self.id}, image_name={self.image_name}, image_tag={self.image_tag}, build_date={self.build_date}'
 
+class PendingBuild(db.Model):
+    # 빌드를 요청할 때 조회한 커밋 정보 (Argo 콜백에서 GitHub를 다시 호출하지 않기 위함)
+    __tablename__ = 'PendingBuild'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('Project.id'), nullable=False)
+    image_tag = db.Column(db.String(255), nullable=False)
+    sha = db.Column(db.String(40), nullable=False)
+    commit_msg = db.Column(db.String(255), nullable=False)
+    created = db.Column(db.DateTime, nullable=False, default=getSeoulTime)
+
+    __table_args__ = (db.Index('ix_PendingBuild_project_id_image_tag', 'project_id', 'image_tag', unique=True),)
+
+    def __repr__(self):
+        return f'PendingBuild: id={self.id}, project_id={self.project_id}, image_tag={self.image_tag}'
+
+
+class Outbox(db.Model):
+    # 상태 변경과 같은 트랜잭션으로 기록하고 워커의 relay가 SSE로 발행한 뒤 지우는 이벤트
+    __tablename__ = 'Outbox'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    channel = db.Column(db.String(64), nullable=False)
+    project_id = db.Column(db.Integer, nullable=True)  # 삭제된 프로젝트의 이벤트도 남아야 하므로 FK를 두지 않는다
+    payload = db.Column(db.Text, nullable=False)
+    created = db.Column(db.DateTime, nullable=False, default=getSeoulTime)
+
+    def __repr__(self):
+        return f'Outbox: id={self.id}, channel={self.channel}, project_id={self.project_id}'
+
 class Deploy(db.Model):
     __tablename__ = 'Deploy'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     build_id = db.Column(db.Integer, db.ForeignKey('Build.id'), nullable=False)
+    # 프로젝트별 배포 이력을 (project_id, id) 인덱스로 키셋 조회하기 위해 Build.project_id를 복사해 둔다.
+    # Deploy는 Build를 통해 함께 지워지므로 FK는 두지 않는다
+    project_id = db.Column(db.Integer, nullable=False)
     deploy_date = db.Column(db.DateTime, nullable=False, default=getSeoulTime)
 
+    __table_args__ = (db.Index('ix_Deploy_build_id_id', 'build_id', 'id'),
+                      db.Index('ix_Deploy_project_id_id', 'project_id', 'id'))
+
     def __repr__(self):
         return f'Deploy: id={self.id}, build_id={self.build_id}, deploy_date={self.deploy_date}'
 
@@ -0,0 +1,102 @@
+import os
+
+from redis.exceptions import RedisError
+
+from .. import db
+from ..models import Project, PendingBuild, Build, User, Token
+from ..metrics import incrementCounter
+from ..queue import registerJobHandler, enqueueJob, enqueueUniqueJob
+from .utils import getCurrentCommitMessage, createNewBuild, queueSseMessage
+from .status import DELETING_STATUS
+
+BUILD_EVENT_JOB = 'build-event'
+BUILD_EVENT_DEDUPE_KEY = 'build:event:{}:{}:{}'
+BUILD_EVENT_DEDUPE_TTL = 24 * 60 * 60
+BUILD_EVENT_BATCH_SIZE = int(os.getenv('BUILD_EVENT_BATCH_SIZE', 50))
+
+
+def ingestBuildEvent(event):
+    # Argo의 재시도로 같은 이벤트가 여러 번 와도 한 번만 큐에 넣는다. 새 이벤트면 True
+    payload = {'projectId': int(event['projectId']), 'imageTag': event.get('imageTag'), 'status': event['status']}
+    if not event.get('imageTag'):
+        enqueueJob(BUILD_EVENT_JOB, payload)
+        return True
+
+    key = BUILD_EVENT_DEDUPE_KEY.format(event['projectId'], event['imageTag'], event['status'])
+    try:
+        queued = enqueueUniqueJob(BUILD_EVENT_JOB, payload, key, BUILD_EVENT_DEDUPE_TTL)
+    except RedisError:
+        # 키와 작업이 함께 실패했으므로 오류로 응답해 Argo가 다시 보내게 한다
+        incrementCounter('build.event.enqueue_error')
+        raise
+    if not queued:
+        incrementCounter('build.event.duplicate')
+    return queued
+
+
+def _resolveCommit(project, pendingBuilds, imageTag):
+    # 빌드 요청 시 저장한 커밋 정보가 없을 때만 GitHub를 조회한다
+    pendingBuild = pendingBuilds.pop((project.id, imageTag), None)
+    if pendingBuild is not None:
+        db.session.delete(pendingBuild)
+        return pendingBuild.commit_msg, pendingBuild.image_tag
+
+    user = User.query.filter_by(id=project.user_id).first()
+    token = Token.query.filter_by(user_id=user.id).first()
+    commitMsg, sha = getCurrentCommitMessage(project.name, user, token.access_token)
+    return commitMsg, imageTag or sha[:7]
+
+
+def applyBuildEvents(events):
+    # 한 배치의 이벤트를 프로젝트/대기 빌드/기존 빌드를 각각 한 번에 조회해 하나의 트랜잭션으로 반영한다
+    projectIds = {event['projectId'] for event in events}
+    imageTags = {event['imageTag'] for event in events if event['imageTag']}
+    projects = {project.id: project for project in Project.query.filter(Project.id.in_(projectIds))}
+    pendingBuilds, existingBuilds = {}, set()
+    if imageTags:
+        for pendingBuild in PendingBuild.query.filter(PendingBuild.project_id.in_(projectIds),
+                                                      PendingBuild.image_tag.in_(imageTags)):
+            pendingBuilds[(pendingBuild.project_id, pendingBuild.image_tag)] = pendingBuild
+        for projectId, imageTag in db.session.query(Build.project_id, Build.image_tag) \
+                .filter(Build.project_id.in_(projectIds), Build.image_tag.in_(imageTags)):
+            existingBuilds.add((projectId, imageTag))
+
+    changed = {}
+    for event in events:
+        project = projects.get(event['projectId'])
+        # 삭제 요청 전에 큐에 들어간 이벤트는 버린다
+        if project is None or project.status == DELETING_STATUS:
+            continue
+
+        if event['status'] == 'build-success':
+            commitMsg, imageTag = _resolveCommit(project, pendingBuilds, event['imageTag'])
+            if (project.id, imageTag) in existingBuilds:
+                # 중복 제거 키가 만료된 뒤 다시 온 이벤트로 같은 Build가 두 번 생기지 않게 한다
+                incrementCounter('build.event.duplicate')
+                continue
+            newBuild = createNewBuild(project.id, commitMsg, project.name, imageTag)
+            existingBuilds.add((project.id, imageTag))
+            project.status = 2  # 빌드 완료
+            project.current_build_id = newBuild.id
+        else:
+            pendingBuild = pendingBuilds.pop((project.id, event['imageTag']), None)
+            if pendingBuild is not None:
+                db.session.delete(pendingBuild)
+            project.status = 5  # 빌드 실패
+        changed[project.id] = project
+
+    # 빌드 로그를 업데이트하는 작업이 필요함
+    # buildLog = fetchBuildLogs(subdomain=project.subdomain)
+    # createOrUpdateBuildLog(project.id, buildLog)
+
+    for project in changed.values():
+        queueSseMessage(f"{project.user_id}", {'projectId': project.id,
+                                               'status': project.status,
+                                               'currentBuildId': project.current_build_id,
+                                               'currentDeployId': project.current_deploy_id})
+    db.session.commit()
+    incrementCounter('build.event.applied', len(events))
+
+
+registerJobHandler(BUILD_EVENT_JOB, applyBuildEvents, maxAttempts=5, retryDelay=5,
+                   batchSize=BUILD_EVENT_BATCH_SIZE)
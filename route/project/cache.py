@@ -0,0 +1,183 @@
+import time
+
+from flask import request, make_response, current_app
+from redis.exceptions import RedisError, LockError
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .. import db
+from ..redisclient import getRedis
+from ..metrics import incrementCounter
+from ..models import Project, Build, Secret, Favorite
+
+PROJECT_VERSION_KEY = 'project:version:{}'
+USER_PROJECTS_VERSION_KEY = 'user:projects:version:{}'
+RESPONSE_CACHE_KEY = 'response:{}'
+
+RESPONSE_CACHE_TTL = 300
+VERSION_TTL = 30 * 24 * 60 * 60  # 만료되어도 현재 시각으로 다시 시작하므로 이전 ETag와 겹치지 않는다
+REBUILD_LOCK_TIMEOUT = 10
+REBUILD_WAIT_TIMEOUT = 3
+REBUILD_POLL_INTERVAL = 0.05
+
+
+def _getVersion(key, exists=None):
+    redisClient = getRedis()
+    if redisClient is None:
+        return None
+    try:
+        version = redisClient.get(key)
+        if version is None:
+            # 클라이언트가 보낸 임의의 id로 키가 쌓이지 않도록 실제 있는 대상만 버전을 만든다
+            if exists is not None and not exists():
+                return None
+            # 초기값을 현재 시각으로 두어 Redis가 비워진 뒤에도 이전 ETag와 겹치지 않게 함
+            redisClient.set(key, int(time.time() * 1000), nx=True, ex=VERSION_TTL)
+            version = redisClient.get(key)
+        return version
+    except RedisError:
+        incrementCounter('version.redis.error')
+        return None
+
+
+def getProjectVersion(projectId):
+    return _getVersion(PROJECT_VERSION_KEY.format(projectId),
+                       lambda: db.session.query(Project.id).filter_by(id=projectId).first() is not None)
+
+
+def getUserProjectsVersion(userId):
+    return _getVersion(USER_PROJECTS_VERSION_KEY.format(userId))
+
+
+def bumpVersions(projectIds=(), userIds=(), deletedProjectIds=()):
+    keys = [PROJECT_VERSION_KEY.format(projectId) for projectId in projectIds] + \
+           [USER_PROJECTS_VERSION_KEY.format(userId) for userId in userIds]
+    deletedKeys = [PROJECT_VERSION_KEY.format(projectId) for projectId in deletedProjectIds]
+    if not keys and not deletedKeys:
+        return
+
+    redisClient = getRedis()
+    if redisClient is None:
+        return
+    try:
+        pipe = redisClient.pipeline(transaction=False)
+        for key in keys:
+            pipe.set(key, int(time.time() * 1000), nx=True)
+            pipe.incr(key)
+            pipe.expire(key, VERSION_TTL)
+        if deletedKeys:
+            # 삭제된 프로젝트의 버전 키는 다시 쓰일 일이 없으므로 지운다
+            pipe.delete(*deletedKeys)
+        pipe.execute()
+    except RedisError:
+        incrementCounter('version.redis.error')
+
+
+def makeProjectListEtag(userId):
+    version = getUserProjectsVersion(userId)
+    return f'u{userId}-v{version}' if version is not None else None
+
+
+def makeProjectDetailEtag(projectId, limit=None):
+    version = getProjectVersion(projectId)
+    if version is None:
+        return None
+    return f'p{projectId}-v{version}' + (f'-l{limit}' if limit is not None else '')
+
+
+def checkNotModified(etag):
+    if etag is None or not request.if_none_match.contains(etag):
+        return None
+    incrementCounter('etag.not_modified')
+    return withEtag(make_response('', 304), etag)
+
+
+def withEtag(response, etag):
+    if etag is not None:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _waitForRebuild(redisClient, key):
+    deadline = time.monotonic() + REBUILD_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(REBUILD_POLL_INTERVAL)
+        body = redisClient.get(key)
+        if body is not None:
+            return body
+    return None
+
+
+def getCachedJson(etag, builder):
+    # ETag(버전)을 키로 쓰므로 쓰기 경로에서 버전이 올라가면 이전 엔트리는 자연히 무효화된다
+    if etag is None:
+        return current_app.json.dumps(builder())
+
+    key = RESPONSE_CACHE_KEY.format(etag)
+    redisClient = getRedis()
+    try:
+        body = redisClient.get(key)
+        if body is not None:
+            incrementCounter('response.cache.hit')
+            return body
+        incrementCounter('response.cache.miss')
+
+        # 여러 워커가 동시에 같은 페이로드를 만들지 않도록 한 워커만 재생성 (cache stampede 방지)
+        lock = redisClient.lock(key + ':lock', timeout=REBUILD_LOCK_TIMEOUT)
+        if not lock.acquire(blocking=False):
+            incrementCounter('response.cache.wait')
+            body = _waitForRebuild(redisClient, key)
+            if body is not None:
+                return body
+            return current_app.json.dumps(builder())
+
+        try:
+            body = current_app.json.dumps(builder())
+            redisClient.set(key, body, ex=RESPONSE_CACHE_TTL)
+            return body
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                pass
+    except RedisError:
+        incrementCounter('response.cache.redis.error')
+        return current_app.json.dumps(builder())
+
+
+def jsonBodyResponse(body):
+    return current_app.response_class(f'{body}\n', status=200, mimetype=current_app.json.mimetype)
+
+
+def _collectVersionBumps(session, flushContext):
+    projectIds, userIds, deletedProjectIds = session.info.setdefault('versionBumps', (set(), set(), set()))
+    for obj in session.deleted:
+        if isinstance(obj, Project):
+            deletedProjectIds.add(obj.id)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Project):
+            projectIds.add(obj.id)
+            userIds.add(obj.user_id)
+        elif isinstance(obj, (Build, Secret)):
+            projectIds.add(obj.project_id)
+        elif isinstance(obj, Favorite):
+            userIds.add(obj.user_id)
+
+
+def _applyVersionBumps(session):
+    projectIds, userIds, deletedProjectIds = session.info.pop('versionBumps', (set(), set(), set()))
+    bumpVersions(projectIds - deletedProjectIds, userIds, deletedProjectIds)
+
+
+def _discardVersionBumps(session):
+    session.info.pop('versionBumps', None)
+
+
+def registerVersionTracking():
+    # 커밋된 변경(status, current_build_id, 설명, 시크릿, 즐겨찾기 등)에 따라 버전을 올린다
+    if event.contains(Session, 'after_flush', _collectVersionBumps):
+        return
+    event.listen(Session, 'after_flush', _collectVersionBumps)
+    event.listen(Session, 'after_commit', _applyVersionBumps)
+    event.listen(Session, 'after_rollback', _discardVersionBumps)
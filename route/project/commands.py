@@ -0,0 +1,42 @@
+import click
+
+from flask.cli import AppGroup
+
+from ..models import Project
+from .dns import getDnsBackend, makeARecord, findMissingWildcardRecords, WILDCARD_RECORD_NAMES, ZONE_DOMAIN, \
+    getIngressIp
+
+dnsCli = AppGroup('dns', help='Cloud DNS 레코드 관리')
+
+
+@dnsCli.command('migrate-wildcard')
+@click.option('--create-wildcard', is_flag=True, help='와일드카드 레코드가 없으면 생성한다')
+@click.option('--apply', is_flag=True, help='지정하지 않으면 삭제할 레코드만 출력한다')
+def migrateToWildcard(create_wildcard, apply):
+    # 기존 프로젝트의 개별 A 레코드를 와일드카드 레코드로 대체한다
+    backend = getDnsBackend()
+    missing = findMissingWildcardRecords(backend)
+    if missing:
+        if not create_wildcard:
+            raise click.ClickException(f"Wildcard records missing: {', '.join(missing)} (use --create-wildcard)")
+        click.echo(f"Creating wildcard records: {', '.join(missing)}")
+        if apply:
+            backend.applyChange(additions=[makeARecord(name) for name in missing])
+
+    names = []
+    for project in Project.query.all():
+        names.append(f"{project.subdomain}.{ZONE_DOMAIN}.")
+        names.append(f"{project.subdomain}-ci.webhook.{ZONE_DOMAIN}.")
+
+    deletions = []
+    for name in names:
+        for record in backend.listRecords(name=name, recordType='A'):
+            # 인그레스 IP를 가리키는 레코드만 와일드카드로 대체 가능하다
+            if record.get('rrdatas') == [getIngressIp()] and name not in WILDCARD_RECORD_NAMES:
+                deletions.append(record)
+
+    for record in deletions:
+        click.echo(f"{'Deleting' if apply else 'Would delete'} {record['name']}")
+    if apply and deletions:
+        backend.applyChange(deletions=deletions)
+    click.echo(f"{len(deletions)} explicit record(s) {'deleted' if apply else 'to delete'}")
@@ -0,0 +1,101 @@
+import hashlib
+import hmac
+import os
+
+from datetime import datetime, timezone
+from redis.exceptions import RedisError
+
+from .. import db
+from ..models import Project, User, Build
+from ..metrics import incrementCounter
+from ..redisclient import getRedis
+from .error import InvalidWebhookSignatureError
+from .utils import getCurrentCommitMessage
+
+LATEST_COMMIT_KEY = 'project:commit:{}'
+LATEST_COMMIT_TTL = 30 * 24 * 60 * 60
+BUILD_BRANCH_REF = 'refs/heads/main'  # CI 워크플로가 빌드하는 브랜치
+
+
+def verifyWebhookSignature(body, signature):
+    secret = os.getenv('GITHUB_WEBHOOK_SECRET')
+    if not secret or not signature:
+        raise InvalidWebhookSignatureError('Webhook signature is required')
+    expected = 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, signature):
+        raise InvalidWebhookSignatureError('Invalid webhook signature')
+
+
+def _parseTimestamp(timestamp):
+    # Python 3.9의 fromisoformat은 'Z' 접미사를 처리하지 못한다
+    parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _storeLatestCommit(project, sha, message, committedAt):
+    project.latest_commit_sha = sha
+    project.latest_commit_msg = message
+    project.latest_commit_at = committedAt
+    redisClient = getRedis()
+    if redisClient is None:
+        return
+    try:
+        key = LATEST_COMMIT_KEY.format(project.id)
+        pipe = redisClient.pipeline(transaction=False)
+        pipe.hset(key, mapping={'sha': sha, 'message': message,
+                                'timestamp': committedAt.isoformat() if committedAt else ''})
+        pipe.expire(key, LATEST_COMMIT_TTL)
+        pipe.execute()
+    except RedisError:
+        pass
+
+
+def recordPushEvent(payload):
+    # main 브랜치 push의 마지막 커밋을 해당 저장소의 프로젝트에 기록한다. 반영된 프로젝트 수를 반환
+    headCommit = payload.get('head_commit')
+    if payload.get('ref') != BUILD_BRANCH_REF or payload.get('deleted') or headCommit is None:
+        return 0
+
+    repository = payload['repository']
+    committedAt = _parseTimestamp(headCommit['timestamp'])
+    projects = Project.query.join(User, Project.user_id == User.id) \
+        .filter(User.login == repository['owner']['login'], Project.name == repository['name']).all()
+    updated = 0
+    for project in projects:
+        # 웹훅은 순서대로 오지 않을 수 있으므로 더 오래된 커밋으로 덮어쓰지 않는다
+        if project.latest_commit_at is not None and project.latest_commit_at > committedAt:
+            continue
+        _storeLatestCommit(project, headCommit['id'], headCommit['message'][:255], committedAt)
+        updated += 1
+    db.session.commit()
+    return updated
+
+
+def _loadLatestCommit(project):
+    redisClient = getRedis()
+    try:
+        cached = redisClient.hgetall(LATEST_COMMIT_KEY.format(project.id)) if redisClient is not None else None
+    except RedisError:
+        cached = None
+    if cached:
+        return cached['message'], cached['sha']
+    if project.latest_commit_sha is not None:
+        return project.latest_commit_msg, project.latest_commit_sha
+    return None
+
+
+def getLatestCommit(project, user, token):
+    # push 웹훅으로 받아 둔 커밋을 먼저 쓰고, 없거나 이미 빌드된 커밋이면(웹훅 유실 가능성) GitHub를 조회한다
+    latest = _loadLatestCommit(project)
+    if latest is not None:
+        commitMsg, sha = latest
+        if Build.query.filter_by(project_id=project.id, image_tag=sha[:7]).first() is None:
+            incrementCounter('commit.cache.hit')
+            return commitMsg, sha
+
+    incrementCounter('commit.cache.miss')
+    commitMsg, sha = getCurrentCommitMessage(project.name, user, token)
+    if latest is None or latest[1] != sha:
+        # 커밋 시각을 모르므로 웹훅 순서 비교에 쓰는 시각은 그대로 둔다
+        _storeLatestCommit(project, sha, commitMsg[:255], project.latest_commit_at)
+    return commitMsg, sha
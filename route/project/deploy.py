@@ -0,0 +1,45 @@
+import os
+
+from ..queue import registerJobHandler, enqueueJob
+from ..redisclient import getRedis
+from .kube import getKubeBackend
+from .task import deployWithHelm, DEFAULT_TARGET_PORT
+
+# kube: Rollout 이미지를 Kubernetes API로 바로 패치, helm: 기존 helm upgrade 방식
+DEPLOY_MODE = os.getenv('DEPLOY_MODE', 'helm')
+IMAGE_REGISTRY = 'ghcr.io/pnu-capstone-4'
+
+HELM_RECONCILE_JOB = 'helm-reconcile'
+HELM_DESIRED_KEY = 'helm:desired:{}'
+HELM_DESIRED_TTL = 24 * 60 * 60  # 맞추기 작업의 재시도가 모두 끝날 때까지만 필요하다
+
+
+def deployImage(subdomain, image_tag, target_port):
+    if DEPLOY_MODE == 'kube':
+        deployWithKubeApi(subdomain, image_tag, target_port)
+    else:
+        # 사용자가 요청한 배포는 같은 태그로 다시 배포하는 경우에도 전체 값으로 helm upgrade를 실행한다
+        deployWithHelm(subdomain=subdomain, image_tag=image_tag, target_port=target_port, force=True)
+
+
+def deployWithKubeApi(subdomain, image_tag, target_port):
+    # Rollout 이름과 네임스페이스는 모두 릴리스 이름(subdomain)이다 (app-template/templates/rollout.yaml)
+    getKubeBackend().patchRolloutImage(namespace=subdomain, name=subdomain,
+                                       image=f'{IMAGE_REGISTRY}/{subdomain}:{image_tag}',
+                                       containerPort=target_port or DEFAULT_TARGET_PORT)
+
+    # helm 릴리스 값은 워커에서 나중에 맞춘다. 이후 helm upgrade가 이미지를 되돌리지 않도록 하기 위함
+    desired = {'subdomain': subdomain, 'imageTag': image_tag, 'targetPort': target_port}
+    getRedis().set(HELM_DESIRED_KEY.format(subdomain), image_tag, ex=HELM_DESIRED_TTL)
+    enqueueJob(HELM_RECONCILE_JOB, desired)
+
+
+def reconcileHelmRelease(payload):
+    # 같은 릴리스에 더 최신 배포가 있으면 그 작업이 반영하므로 건너뛴다
+    desiredTag = getRedis().get(HELM_DESIRED_KEY.format(payload['subdomain']))
+    if desiredTag is not None and desiredTag != payload['imageTag']:
+        return
+    deployWithHelm(subdomain=payload['subdomain'], image_tag=payload['imageTag'], target_port=payload['targetPort'])
+
+
+registerJobHandler(HELM_RECONCILE_JOB, reconcileHelmRelease, maxAttempts=5, retryDelay=30)
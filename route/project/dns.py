@@ -0,0 +1,278 @@
+import json
+import os
+import threading
+
+from concurrent.futures import Future
+
+import httplib2
+from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build_from_document
+
+from ..metrics import incrementCounter
+
+MANAGED_ZONE = 'pitapat'
+ZONE_DOMAIN = 'pitapat.ne.kr'
+RECORD_TTL = 300
+DNS_SCOPES = ['https://www.googleapis.com/auth/cloud-platform']
+DNS_COALESCE_WINDOW = float(os.getenv('DNS_COALESCE_WINDOW', 0.2))
+DNS_CHANGE_TIMEOUT = 60
+DISCOVERY_DOCUMENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'dns_v1.json')
+
+
+WILDCARD_RECORD_NAMES = (f'*.{ZONE_DOMAIN}.', f'*.webhook.{ZONE_DOMAIN}.')
+
+# 와일드카드 모드에서는 프로젝트별 A 레코드를 만들거나 지우지 않는다 (시작 시 initWildcardMode로 결정)
+_wildcardMode = False
+
+
+class DnsChangeError(Exception):
+    pass
+
+
+def getIngressIp():
+    return os.getenv('INGRESS_IP', '220.84.206.115')
+
+
+def makeARecord(name):
+    return {
+        "name": name if name.endswith('.') else f"{name}.",
+        "type": "A",
+        "ttl": RECORD_TTL,
+        "rrdatas": [getIngressIp()]
+    }
+
+
+class GoogleDnsBackend:
+    # 자격 증명과 서비스 객체는 프로세스당 한 번만 만들고, discovery 문서는 번들된 파일에서 읽는다
+    def __init__(self, credentialsInfo, projectId, managedZone=MANAGED_ZONE):
+        self.projectId = projectId
+        self.managedZone = managedZone
+        self.credentials = service_account.Credentials.from_service_account_info(credentialsInfo, scopes=DNS_SCOPES)
+        with open(DISCOVERY_DOCUMENT_PATH) as f:
+            self.service = build_from_document(f.read(), http=httplib2.Http())
+        # httplib2.Http는 스레드 안전하지 않으므로 스레드마다 하나씩 둔다 (토큰 갱신은 AuthorizedHttp가 처리)
+        self._local = threading.local()
+
+    def _http(self):
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=30))
+            self._local.http = http
+        return http
+
+    def applyChange(self, additions=(), deletions=()):
+        incrementCounter('dns.api.changes')
+        body = {"additions": list(additions), "deletions": list(deletions)}
+        request = self.service.changes().create(project=self.projectId, managedZone=self.managedZone, body=body)
+        return request.execute(http=self._http())
+
+    def listRecords(self, name=None, recordType=None):
+        records = []
+        pageToken = None
+        while True:
+            incrementCounter('dns.api.list')
+            request = self.service.resourceRecordSets().list(project=self.projectId, managedZone=self.managedZone,
+                                                             name=name, type=recordType, pageToken=pageToken)
+            response = request.execute(http=self._http())
+            records.extend(response.get('rrsets', []))
+            pageToken = response.get('nextPageToken')
+            if not pageToken:
+                return records
+
+
+class FakeDnsBackend:
+    # 테스트/벤치마크용 메모리 백엔드. Cloud DNS처럼 중복 추가나 없는 레코드 삭제는 실패한다
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.records = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def applyChange(self, additions=(), deletions=()):
+        if self.latency:
+            threading.Event().wait(self.latency)
+        with self._lock:
+            self.calls += 1
+            for record in deletions:
+                if (record['name'], record['type']) not in self.records:
+                    raise DnsChangeError(f"Record {record['name']} does not exist")
+            for record in additions:
+                if (record['name'], record['type']) in self.records:
+                    raise DnsChangeError(f"Record {record['name']} already exists")
+            for record in deletions:
+                del self.records[(record['name'], record['type'])]
+            for record in additions:
+                self.records[(record['name'], record['type'])] = dict(record)
+            return {"kind": "dns#change", "status": "done",
+                    "additions": list(additions), "deletions": list(deletions)}
+
+    def listRecords(self, name=None, recordType=None):
+        with self._lock:
+            return [dict(record) for (recordName, type_), record in self.records.items()
+                    if (name is None or recordName == name) and (recordType is None or type_ == recordType)]
+
+
+class DnsChangeCoalescer:
+    # 짧은 시간(window) 동안 들어온 추가/삭제 요청을 하나의 change로 묶어 Cloud DNS 호출 수를 줄인다
+    def __init__(self, backend, window=0.2, maxBatchSize=100):
+        self.backend = backend
+        self.window = window
+        self.maxBatchSize = maxBatchSize
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._timer = None
+
+    def add(self, record):
+        return self._submit('add', record)
+
+    def delete(self, record):
+        return self._submit('delete', record)
+
+    def _submit(self, operation, record):
+        future = Future()
+        key = (record['name'], record['type'])
+        flushNow = False
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = (operation, record, [future])
+            elif pending[0] == operation:
+                # 같은 레코드에 대한 중복 요청은 하나로 합친다
+                pending[2].append(future)
+            else:
+                # 같은 window 안의 추가+삭제는 서로 상쇄되어 API를 호출하지 않는다
+                del self._pending[key]
+                for waiter in pending[2] + [future]:
+                    waiter.set_result({'status': 'cancelled', 'name': record['name']})
+                incrementCounter('dns.coalescer.cancelled')
+                return future
+
+            if len(self._pending) >= self.maxBatchSize:
+                flushNow = True
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if flushNow:
+            threading.Thread(target=self.flush, daemon=True).start()
+        return future
+
+    def flush(self):
+        with self._lock:
+            batch = list(self._pending.values())
+            self._pending = {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not batch:
+            return
+
+        additions = [record for operation, record, _ in batch if operation == 'add']
+        deletions = [record for operation, record, _ in batch if operation == 'delete']
+        incrementCounter('dns.coalescer.batches')
+        incrementCounter('dns.coalescer.records', len(batch))
+        try:
+            response = self.backend.applyChange(additions=additions, deletions=deletions)
+        except Exception as e:
+            if len(batch) == 1:
+                for waiter in batch[0][2]:
+                    waiter.set_exception(e)
+                return
+            # change는 원자적으로 실패하므로, 레코드별로 다시 시도해 실패한 요청에만 오류를 전달한다
+            incrementCounter('dns.coalescer.fallbacks')
+            for operation, record, waiters in batch:
+                self._applySingle(operation, record, waiters)
+            return
+
+        for _, _, waiters in batch:
+            for waiter in waiters:
+                waiter.set_result(response)
+
+    def _applySingle(self, operation, record, waiters):
+        try:
+            if operation == 'add':
+                response = self.backend.applyChange(additions=[record])
+            else:
+                response = self.backend.applyChange(deletions=[record])
+        except Exception as e:
+            for waiter in waiters:
+                waiter.set_exception(e)
+            return
+        for waiter in waiters:
+            waiter.set_result(response)
+
+
+_backend = None
+_coalescer = None
+_backendLock = threading.Lock()
+
+
+def createDnsBackend():
+    if os.getenv('DNS_BACKEND') == 'fake':
+        return FakeDnsBackend()
+    credentialsInfo = json.loads(os.environ.get("GOOGLE_APPLICATION_CREDENTIALS_JSON"))
+    return GoogleDnsBackend(credentialsInfo, os.environ.get("GCP_PROJECT_ID"))
+
+
+def getDnsBackend():
+    global _backend
+    if _backend is None:
+        with _backendLock:
+            if _backend is None:
+                _backend = createDnsBackend()
+    return _backend
+
+
+def setDnsBackend(backend):
+    global _backend, _coalescer
+    with _backendLock:
+        _backend = backend
+        _coalescer = None
+
+
+def getDnsCoalescer():
+    global _coalescer
+    backend = getDnsBackend()
+    if _coalescer is None:
+        with _backendLock:
+            if _coalescer is None:
+                _coalescer = DnsChangeCoalescer(backend, window=DNS_COALESCE_WINDOW)
+    return _coalescer
+
+
+def applyDnsChange(additions=(), deletions=()):
+    # DNS_COALESCE_WINDOW가 0이면 묶지 않고 바로 호출
+    if DNS_COALESCE_WINDOW <= 0:
+        return getDnsBackend().applyChange(additions=additions, deletions=deletions)
+
+    coalescer = getDnsCoalescer()
+    futures = [coalescer.add(record) for record in additions] + [coalescer.delete(record) for record in deletions]
+    return [future.result(timeout=DNS_CHANGE_TIMEOUT) for future in futures]
+
+
+def isWildcardMode():
+    return _wildcardMode
+
+
+def findMissingWildcardRecords(backend=None):
+    backend = backend or getDnsBackend()
+    return [name for name in WILDCARD_RECORD_NAMES if not backend.listRecords(name=name, recordType='A')]
+
+
+def initWildcardMode(app):
+    global _wildcardMode
+    _wildcardMode = False
+    if os.getenv('DNS_WILDCARD_MODE', 'false').lower() != 'true':
+        return
+
+    try:
+        missing = findMissingWildcardRecords()
+    except Exception:
+        app.logger.exception('Could not verify wildcard DNS records, falling back to per-project records')
+        return
+    if missing:
+        app.logger.error('Wildcard DNS records missing (%s), falling back to per-project records', ', '.join(missing))
+        return
+    _wildcardMode = True
@@ -23,4 +23,19 @@ class DeployingProjectHelmError(Exception):
     pass
 
 class DeletingProjectHelmError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class InvalidPaginationError(Exception):
+    pass
+
+class KubernetesApiError(Exception):
+    pass
+
+class InvalidWebhookSignatureError(Exception):
+    pass
+
+class GithubRateLimitError(Exception):
+    pass
+
+class ProjectDeletingError(Exception):
+    pass
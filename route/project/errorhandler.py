@@ -1,7 +1,8 @@
 from flask import jsonify
 from sqlalchemy.exc import SQLAlchemyError
 from route.project.error import AuthorizationError, DeletingProjectHelmError, ProjectNotFoundError, CreatingProjectHelmError, ArgoWorkflowError, \
-    DeployingProjectHelmError, BuildExistsError, BuildNotFoundError, DeployExistsError
+    DeployingProjectHelmError, BuildExistsError, BuildNotFoundError, DeployExistsError, InvalidPaginationError, \
+    KubernetesApiError, InvalidWebhookSignatureError, GithubRateLimitError, ProjectDeletingError
 from .. import db
 
 def registerProjectErrorHandler(app):
@@ -50,6 +51,31 @@ def registerProjectErrorHandler(app):
         return jsonify({'error': {'message': str(error),
                                   'status': 500}}), 500
 
+    @app.errorhandler(KubernetesApiError)
+    def handleKubernetesApiError(error):
+        return jsonify({'error': {'message': str(error),
+                                  'status': 500}}), 500
+
+    @app.errorhandler(InvalidPaginationError)
+    def handleInvalidPaginationError(error):
+        return jsonify({'error': {'message': str(error),
+                                  'status': 400}}), 400
+
+    @app.errorhandler(InvalidWebhookSignatureError)
+    def handleInvalidWebhookSignatureError(error):
+        return jsonify({'error': {'message': str(error),
+                                  'status': 401}}), 401
+
+    @app.errorhandler(GithubRateLimitError)
+    def handleGithubRateLimitError(error):
+        return jsonify({'error': {'message': str(error),
+                                  'status': 429}}), 429
+
+    @app.errorhandler(ProjectDeletingError)
+    def handleProjectDeletingError(error):
+        return jsonify({'error': {'message': str(error),
+                                  'status': 409}}), 409
+
     @app.errorhandler(SQLAlchemyError)
     def handleDatabaseError(error):
         db.session.rollback()
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from concurrent.futures import Future
+from flask import has_app_context
+from redis.exceptions import RedisError
+
+from ..metrics import incrementCounter
+from ..redisclient import getRedis
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CHART_CACHE_DIR = os.getenv('HELM_CHART_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'helm-charts'))
+HELM_MAX_PARALLEL = int(os.getenv('HELM_MAX_PARALLEL', 4))
+HELM_TIMEOUT = 300
+HELM_NAMESPACE = 'default'
+RELEASE_LOCK_KEY = 'helm:lock:{}'
+RELEASE_VALUES_KEY = 'helm:values:{}'
+REVISION_PATTERN = re.compile(r'^REVISION: (\d+)$', re.MULTILINE)
+
+logger = logging.getLogger(__name__)
+
+
+def hashChartDirectory(chartDir):
+    digest = hashlib.sha256()
+    for dirPath, dirNames, fileNames in os.walk(chartDir):
+        dirNames.sort()
+        for fileName in sorted(fileNames):
+            path = os.path.join(dirPath, fileName)
+            digest.update(os.path.relpath(path, chartDir).encode())
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def flattenValues(values, prefix=''):
+    # 중첩된 values를 'image.tag' 형태의 경로로 펼친다 (리스트는 하나의 값으로 취급)
+    flat = {}
+    for key, value in values.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict) and value:
+            flat.update(flattenValues(value, f'{path}.'))
+        else:
+            flat[path] = value
+    return flat
+
+
+def unflattenValues(flat):
+    values = {}
+    for path, value in flat.items():
+        node = values
+        keys = path.split('.')
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+        node[keys[-1]] = value
+    return values
+
+
+def mergeValues(base, override):
+    return unflattenValues({**flattenValues(base), **flattenValues(override)})
+
+
+def fingerprintValues(values):
+    # 토큰이나 시크릿 원문을 Redis에 남기지 않도록 값 대신 해시만 저장한다
+    return {path: hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+            for path, value in flattenValues(values).items()}
+
+
+class HelmService:
+    # 차트는 해시별 .tgz로 한 번만 패키징해 두고, 같은 릴리스에 대한 작업은 직렬화하며
+    # 서로 다른 릴리스는 HELM_MAX_PARALLEL개까지 동시에 실행한다
+    def __init__(self, maxParallel=HELM_MAX_PARALLEL, chartCacheDir=CHART_CACHE_DIR, lockWait=HELM_TIMEOUT):
+        self.chartCacheDir = chartCacheDir
+        self.lockWait = lockWait
+        self._charts = {}
+        self._chartLock = threading.Lock()
+        self._releaseLocks = {}
+        self._releaseLocksLock = threading.Lock()
+        self._pendingUpgrades = {}
+        self._pendingLock = threading.Lock()
+        self._semaphore = threading.BoundedSemaphore(maxParallel)
+
+    def getChart(self, chartName):
+        with self._chartLock:
+            if chartName in self._charts:
+                return self._charts[chartName]
+
+            chartDir = os.path.join(ROOT_DIR, chartName)
+            chartHash = hashChartDirectory(chartDir)
+            artifact = os.path.join(self.chartCacheDir, f'{chartName}-{chartHash[:12]}.tgz')
+            if not os.path.exists(artifact):
+                artifact = self._packageChart(chartDir, artifact) or chartDir
+            self._charts[chartName] = artifact
+            return artifact
+
+    def _packageChart(self, chartDir, artifact):
+        os.makedirs(self.chartCacheDir, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.chartCacheDir) as workDir:
+            result = subprocess.run(['helm', 'package', chartDir, '-d', workDir], capture_output=True, text=True)
+            if result.returncode != 0:
+                logger.warning('helm package %s failed, using chart directory: %s', chartDir, result.stderr)
+                return None
+            packaged = os.listdir(workDir)[0]
+            shutil.move(os.path.join(workDir, packaged), artifact)
+        incrementCounter('helm.chart.packaged')
+        return artifact
+
+    def _releaseLock(self, releaseName):
+        with self._releaseLocksLock:
+            return self._releaseLocks.setdefault(releaseName, threading.Lock())
+
+    def _execute(self, releaseName, command, input=None):
+        # 다른 워커 프로세스와도 릴리스 단위로 직렬화 (Redis에 닿을 수 없을 때만 프로세스 내 잠금으로 대신한다).
+        # 다른 프로세스의 잠금을 기다리는 동안 동시 실행 슬롯을 차지하지 않도록 Redis 잠금을 먼저 잡는다
+        redisLock = None
+        acquired = False
+        redisClient = getRedis() if has_app_context() else None
+        if redisClient is not None:
+            redisLock = redisClient.lock(RELEASE_LOCK_KEY.format(releaseName), timeout=HELM_TIMEOUT,
+                                         blocking_timeout=self.lockWait)
+            try:
+                acquired = redisLock.acquire()
+            except RedisError:
+                logger.warning('Could not take Redis lock for release %s', releaseName)
+            else:
+                if not acquired:
+                    incrementCounter('helm.lock.timeout')
+                    return subprocess.CompletedProcess(args=command, returncode=1, stdout='',
+                                                       stderr=f'Timed out waiting for the lock on release {releaseName}')
+        try:
+            with self._semaphore:
+                incrementCounter('helm.commands')
+                return subprocess.run(command, capture_output=True, text=True, input=input, timeout=HELM_TIMEOUT)
+        finally:
+            if acquired:
+                try:
+                    redisLock.release()
+                except RedisError:
+                    pass
+
+    def run(self, releaseName, command, input=None):
+        with self._releaseLock(releaseName):
+            return self._execute(releaseName, command, input)
+
+    def _loadFingerprint(self, releaseName):
+        redisClient = getRedis() if has_app_context() else None
+        if redisClient is None:
+            return None
+        try:
+            cached = redisClient.get(RELEASE_VALUES_KEY.format(releaseName))
+        except RedisError:
+            return None
+        cached = json.loads(cached) if cached is not None else None
+        # 리비전 없이 값만 저장하던 이전 형식은 없는 것으로 본다
+        return cached if isinstance(cached, dict) and 'values' in cached else None
+
+    def _storeFingerprint(self, releaseName, fingerprint):
+        redisClient = getRedis() if has_app_context() else None
+        if redisClient is None:
+            return
+        try:
+            if fingerprint is None:
+                redisClient.delete(RELEASE_VALUES_KEY.format(releaseName))
+            else:
+                redisClient.set(RELEASE_VALUES_KEY.format(releaseName), json.dumps(fingerprint))
+        except RedisError:
+            pass
+
+    def _deployedRevision(self, releaseName):
+        # 릴리스가 deployed 상태면 현재 리비전, 실패했거나 진행 중이거나 없으면 None
+        result = self._execute(releaseName, ['helm', 'status', '-n', HELM_NAMESPACE, releaseName, '-o', 'json'])
+        if result.returncode != 0:
+            return None
+        try:
+            status = json.loads(result.stdout)
+        except ValueError:
+            return None
+        if status.get('info', {}).get('status') != 'deployed':
+            return None
+        return status.get('version')
+
+    def _applyValues(self, releaseName, chartName, values, install, reuseValues, force):
+        fingerprint = fingerprintValues(values)
+        cached = self._loadFingerprint(releaseName) if reuseValues and not force else None
+        if cached is not None and (cached.get('revision') is None
+                                   or cached['revision'] != self._deployedRevision(releaseName)):
+            # 실패한 릴리스이거나 이 서비스 밖에서(helm rollback 등) 바뀌었으면 전체 값을 다시 보낸다
+            incrementCounter('helm.values.drift')
+            cached = None
+        document = values
+        if cached is not None:
+            # 마지막으로 적용한 리비전이 그대로 배포되어 있으면 달라진 항목만 보낸다
+            flat = flattenValues(values)
+            document = unflattenValues({path: value for path, value in flat.items()
+                                        if cached['values'].get(path) != fingerprint[path]})
+            if not document:
+                incrementCounter('helm.upgrade.skipped')
+                return subprocess.CompletedProcess(args=[], returncode=0, stdout='', stderr='')
+
+        # values는 --set 인자 대신 표준 입력으로 전달한다 (JSON은 YAML로도 유효하다)
+        command = ['helm', 'upgrade'] + (['--install'] if install else []) + \
+                  ['-n', HELM_NAMESPACE, releaseName, self.getChart(chartName), '-f', '-'] + \
+                  (['--reuse-values'] if reuseValues else [])
+        result = self._execute(releaseName, command, input=json.dumps(document))
+        if result.returncode == 0:
+            revision = REVISION_PATTERN.search(result.stdout or '')
+            applied = {**(cached['values'] if cached else {}), **fingerprint} if reuseValues else fingerprint
+            self._storeFingerprint(releaseName, {'revision': int(revision.group(1)) if revision else None,
+                                                 'values': applied})
+        return result
+
+    def upgrade(self, releaseName, chartName, values, install=False, reuseValues=True, force=False):
+        # 아직 시작하지 않은 같은 릴리스의 upgrade가 있으면 값을 합치고(최신 값 우선) 그 결과를 함께 기다린다.
+        # force면 마지막으로 적용한 값과 같더라도 전체 값을 보낸다
+        with self._pendingLock:
+            pending = self._pendingUpgrades.get(releaseName)
+            if pending is not None and pending['install'] == install and pending['reuseValues'] == reuseValues:
+                pending['values'] = mergeValues(pending['values'], values)
+                pending['force'] = pending['force'] or force
+                incrementCounter('helm.upgrade.collapsed')
+                future = pending['future']
+            else:
+                future = None
+                pending = {'values': values, 'install': install, 'reuseValues': reuseValues,
+                           'force': force, 'future': Future()}
+                self._pendingUpgrades.setdefault(releaseName, pending)
+        if future is not None:
+            return future.result()
+
+        with self._releaseLock(releaseName):
+            with self._pendingLock:
+                if self._pendingUpgrades.get(releaseName) is pending:
+                    del self._pendingUpgrades[releaseName]
+            try:
+                result = self._applyValues(releaseName, chartName, pending['values'], install, reuseValues,
+                                            pending['force'])
+            except Exception as e:
+                pending['future'].set_exception(e)
+                raise
+            pending['future'].set_result(result)
+            return result
+
+    def listReleases(self):
+        # 네임스페이스의 모든 릴리스 (실패한 릴리스 포함)
+        with self._semaphore:
+            incrementCounter('helm.commands')
+            return subprocess.run(['helm', 'list', '-n', HELM_NAMESPACE, '--all', '-o', 'json'],
+                                  capture_output=True, text=True, timeout=HELM_TIMEOUT)
+
+    def uninstall(self, releaseName):
+        result = self.run(releaseName, ['helm', 'delete', '-n', HELM_NAMESPACE, releaseName])
+        if result.returncode == 0:
+            self._storeFingerprint(releaseName, None)
+        return result
+
+
+_service = None
+_serviceLock = threading.Lock()
+
+
+def getHelmService():
+    global _service
+    if _service is None:
+        with _serviceLock:
+            if _service is None:
+                _service = HelmService()
+    return _service
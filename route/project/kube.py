@@ -0,0 +1,221 @@
+import json
+import os
+import threading
+import time
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+from route.project.error import KubernetesApiError
+from ..metrics import incrementCounter
+
+SERVICE_ACCOUNT_DIR = '/var/run/secrets/kubernetes.io/serviceaccount'
+ROLLOUT_PATH = '/apis/argoproj.io/v1alpha1/namespaces/{namespace}/rollouts/{name}'
+ROLLOUTS_PATH = '/apis/argoproj.io/v1alpha1/rollouts'
+TOKEN_RELOAD_INTERVAL = 60
+
+
+def getRolloutPhase(rollout):
+    # Argo Rollouts는 잘못된 스펙을 phase가 아닌 InvalidSpec 조건으로 알린다
+    status = rollout.get('status') or {}
+    for condition in status.get('conditions') or []:
+        if condition.get('type') == 'InvalidSpec' and condition.get('status') == 'True':
+            return 'InvalidSpec'
+    # 컨트롤러가 최신 스펙을 아직 반영하지 않았다면 이전 리비전의 phase이므로 진행 중으로 본다
+    generation = rollout['metadata'].get('generation')
+    if generation is not None and str(status.get('observedGeneration')) != str(generation):
+        return 'Progressing'
+    return status.get('phase', 'Progressing')
+
+
+def getRolloutImageTag(rollout):
+    image = rollout['spec']['template']['spec']['containers'][0]['image']
+    return image.rsplit(':', 1)[-1]
+
+
+class KubeApiBackend:
+    # 커넥션 풀을 재사용하는 Kubernetes API 클라이언트 (클러스터 내부 서비스 계정 또는 KUBE_API_URL/KUBE_TOKEN)
+    def __init__(self, baseUrl, token=None, tokenPath=None, caCert=None, timeout=(3, 10), poolSize=10):
+        self.baseUrl = baseUrl.rstrip('/')
+        self.timeout = timeout
+        self._token = token
+        self._tokenPath = tokenPath
+        self._tokenLoadedAt = 0
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=poolSize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.verify = caCert if caCert else True
+
+    def _authHeader(self):
+        # 바운드 서비스 계정 토큰은 주기적으로 갱신되므로 다시 읽는다
+        if self._tokenPath and time.monotonic() - self._tokenLoadedAt > TOKEN_RELOAD_INTERVAL:
+            with self._lock:
+                with open(self._tokenPath) as f:
+                    self._token = f.read().strip()
+                self._tokenLoadedAt = time.monotonic()
+        return {'Authorization': f'Bearer {self._token}'} if self._token else {}
+
+    def request(self, method, path, **kwargs):
+        headers = {**self._authHeader(), **kwargs.pop('headers', {})}
+        try:
+            response = self.session.request(method, self.baseUrl + path, headers=headers,
+                                            timeout=kwargs.pop('timeout', self.timeout), **kwargs)
+        except requests.exceptions.RequestException as e:
+            incrementCounter('kube.api.error')
+            raise KubernetesApiError(f"Kubernetes API request failed: {e}")
+        if response.status_code >= 400:
+            incrementCounter('kube.api.error')
+            raise KubernetesApiError(f"Kubernetes API returned {response.status_code}: {response.text}")
+        return response
+
+    def getRollout(self, namespace, name):
+        return self.request('GET', ROLLOUT_PATH.format(namespace=namespace, name=name)).json()
+
+    def listRollouts(self):
+        # 모든 네임스페이스의 Rollout과 이어서 watch할 resourceVersion
+        body = self.request('GET', ROLLOUTS_PATH).json()
+        return body['items'], body['metadata']['resourceVersion']
+
+    def watchRollouts(self, resourceVersion, timeoutSeconds=30):
+        # 서버가 timeoutSeconds 후에 스트림을 닫으면 끝난다. 410(Gone)은 ERROR 이벤트로 전달된다
+        params = {'watch': '1', 'resourceVersion': resourceVersion, 'timeoutSeconds': timeoutSeconds,
+                  'allowWatchBookmarks': 'true'}
+        response = self.request('GET', ROLLOUTS_PATH, params=params, stream=True,
+                                timeout=(self.timeout[0], timeoutSeconds + 10))
+        with response:
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def patchRolloutImage(self, namespace, name, image, containerPort):
+        incrementCounter('kube.api.patch')
+        patch = [
+            {'op': 'replace', 'path': '/spec/template/spec/containers/0/image', 'value': image},
+            {'op': 'replace', 'path': '/spec/template/spec/containers/0/ports/0/containerPort', 'value': containerPort},
+        ]
+        return self.request('PATCH', ROLLOUT_PATH.format(namespace=namespace, name=name), json=patch,
+                            headers={'Content-Type': 'application/json-patch+json'}).json()
+
+
+class FakeKubeBackend:
+    # 테스트/벤치마크용 메모리 백엔드. 변경 사항은 watchRollouts 스트림으로도 흘려보낸다
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.rollouts = {}
+        self.calls = 0
+        self._lock = threading.Condition()
+        self._events = []
+        self._resourceVersion = 0
+        self._compactedAt = 0
+
+    def _emit(self, eventType, rollout):
+        # self._lock을 잡은 상태에서 호출한다
+        self._resourceVersion += 1
+        rollout['metadata']['resourceVersion'] = str(self._resourceVersion)
+        self._events.append((self._resourceVersion, {'type': eventType, 'object': json.loads(json.dumps(rollout))}))
+        self._lock.notify_all()
+
+    def addRollout(self, namespace, name, image='', containerPort=80, phase='Healthy'):
+        with self._lock:
+            rollout = {
+                'metadata': {'namespace': namespace, 'name': name, 'generation': 1},
+                'spec': {'template': {'spec': {'containers': [{'image': image, 'ports': [{'containerPort': containerPort}]}]}}},
+                'status': {'phase': phase, 'observedGeneration': '1'}
+            }
+            self.rollouts[(namespace, name)] = rollout
+            self._emit('ADDED', rollout)
+
+    def setRolloutPhase(self, namespace, name, phase, invalidSpec=False):
+        # 컨트롤러가 최신 스펙을 반영하고 phase를 바꾼 것처럼 만든다
+        with self._lock:
+            rollout = self.rollouts[(namespace, name)]
+            rollout['status'] = {'phase': phase, 'observedGeneration': str(rollout['metadata']['generation'])}
+            if invalidSpec:
+                rollout['status']['conditions'] = [{'type': 'InvalidSpec', 'status': 'True'}]
+            self._emit('MODIFIED', rollout)
+
+    def compactEvents(self):
+        # etcd 압축처럼 지금까지의 이벤트를 버린다. 그 이전 resourceVersion으로 watch하면 410 ERROR 이벤트를 받는다
+        with self._lock:
+            self._events = []
+            self._compactedAt = self._resourceVersion
+
+    def listRollouts(self):
+        with self._lock:
+            self.calls += 1
+            return [json.loads(json.dumps(rollout)) for rollout in self.rollouts.values()], str(self._resourceVersion)
+
+    def watchRollouts(self, resourceVersion, timeoutSeconds=30):
+        deadline = time.monotonic() + timeoutSeconds
+        lastSeen = int(resourceVersion)
+        if lastSeen < self._compactedAt:
+            yield {'type': 'ERROR', 'object': {'kind': 'Status', 'code': 410, 'reason': 'Expired',
+                                               'message': f'too old resource version: {lastSeen}'}}
+            return
+        while True:
+            with self._lock:
+                pending = [event for version, event in self._events if version > lastSeen]
+                if not pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    self._lock.wait(remaining)
+                    continue
+            for event in pending:
+                lastSeen = int(event['object']['metadata']['resourceVersion'])
+                yield event
+
+    def getRollout(self, namespace, name):
+        with self._lock:
+            self.calls += 1
+            if (namespace, name) not in self.rollouts:
+                raise KubernetesApiError(f"Kubernetes API returned 404: rollout {namespace}/{name} not found")
+            return self.rollouts[(namespace, name)]
+
+    def patchRolloutImage(self, namespace, name, image, containerPort):
+        if self.latency:
+            threading.Event().wait(self.latency)
+        rollout = self.getRollout(namespace, name)
+        with self._lock:
+            container = rollout['spec']['template']['spec']['containers'][0]
+            container['image'] = image
+            container['ports'][0]['containerPort'] = containerPort
+            rollout['metadata']['generation'] += 1
+            self._emit('MODIFIED', rollout)
+            return rollout
+
+
+_backend = None
+_backendLock = threading.Lock()
+
+
+def createKubeBackend():
+    if os.getenv('KUBE_BACKEND') == 'fake':
+        return FakeKubeBackend()
+    if os.getenv('KUBE_API_URL'):
+        return KubeApiBackend(os.getenv('KUBE_API_URL'), token=os.getenv('KUBE_TOKEN'),
+                              caCert=os.getenv('KUBE_CA_CERT'))
+    host = os.getenv('KUBERNETES_SERVICE_HOST')
+    port = os.getenv('KUBERNETES_SERVICE_PORT', '443')
+    return KubeApiBackend(f'https://{host}:{port}',
+                          tokenPath=os.path.join(SERVICE_ACCOUNT_DIR, 'token'),
+                          caCert=os.path.join(SERVICE_ACCOUNT_DIR, 'ca.crt'))
+
+
+def getKubeBackend():
+    global _backend
+    if _backend is None:
+        with _backendLock:
+            if _backend is None:
+                _backend = createKubeBackend()
+    return _backend
+
+
+def setKubeBackend(backend):
+    global _backend
+    with _backendLock:
+        _backend = backend
@@ -0,0 +1,93 @@
+import logging
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+
+class Step:
+    def __init__(self, name, run, dependsOn=(), rollback=None):
+        self.name = name
+        self.run = run
+        self.dependsOn = tuple(dependsOn)
+        self.rollback = rollback
+
+
+class StepFailedError(Exception):
+    def __init__(self, stepName, error):
+        super().__init__(f"Step '{stepName}' failed: {error}")
+        self.stepName = stepName
+        self.error = error
+
+
+def _withAppContext(app, func, *args):
+    if app is None:
+        return func(*args)
+    with app.app_context():
+        return func(*args)
+
+
+def _rollbackSteps(app, steps, completed):
+    # 완료된 순서의 역순으로 되돌린다. 되돌리기에 실패한 단계 이름을 반환
+    failed = []
+    for name in reversed(completed):
+        step = steps[name]
+        if step.rollback is None:
+            continue
+        try:
+            _withAppContext(app, step.rollback)
+        except Exception:
+            logger.exception('Rollback of step %s failed', name)
+            failed.append(name)
+    return failed
+
+
+def runSteps(steps, maxWorkers=4, doneSteps=()):
+    # 의존 관계가 없는 단계는 최대 maxWorkers개까지 동시에 실행하고,
+    # 하나라도 실패하면 이미 끝난 단계를 롤백한 뒤 StepFailedError를 던진다.
+    # doneSteps는 이전 시도에서 끝나 이번에는 실행하지 않는 단계로, 실패하면 함께 롤백해 자원을 남기지 않는다
+    doneNames = [step.name for step in doneSteps]
+    allSteps = {step.name: step for step in doneSteps}
+    steps = {step.name: step for step in steps}
+    allSteps.update(steps)
+    for step in steps.values():
+        for dependency in step.dependsOn:
+            if dependency not in allSteps:
+                raise ValueError(f"Step '{step.name}' depends on unknown step '{dependency}'")
+
+    app = current_app._get_current_object() if has_app_context() else None
+    results = dict.fromkeys(doneNames)
+    completed = list(doneNames)
+    pending = dict(steps)
+    running = {}
+    failure = None
+
+    with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        while pending or running:
+            if failure is None:
+                for name, step in list(pending.items()):
+                    if all(dependency in results for dependency in step.dependsOn):
+                        running[executor.submit(_withAppContext, app, step.run)] = name
+                        del pending[name]
+
+            if not running:
+                if failure is None and pending:
+                    raise ValueError(f"Dependency cycle among steps: {', '.join(pending)}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                    completed.append(name)
+                except Exception as e:
+                    if failure is None:
+                        failure = StepFailedError(name, e)
+
+    if failure is not None:
+        failure.rollbackFailed = _rollbackSteps(app, allSteps, completed)
+        failure.completed = completed
+        raise failure
+    return {name: result for name, result in results.items() if name in steps}
@@ -0,0 +1,80 @@
+import json
+import logging
+import os
+import threading
+
+from .. import db
+from ..models import Outbox
+from ..metrics import incrementCounter
+from ..sse import publishEvents
+
+OUTBOX_RELAY_ENABLED = os.getenv('OUTBOX_RELAY', 'true').lower() == 'true'
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '200'))
+OUTBOX_COALESCE_WINDOW = float(os.getenv('OUTBOX_COALESCE_WINDOW', '0.2'))  # 이 시간 동안 쌓인 변경을 한 번에 보낸다
+OUTBOX_ERROR_DELAY = 1
+
+logger = logging.getLogger(__name__)
+
+
+def coalesceOutboxRows(rows):
+    # 같은 채널의 같은 프로젝트 이벤트는 순서대로 합쳐 마지막 상태 하나만 보낸다
+    events = {}
+    for row in rows:
+        message = json.loads(row.payload)
+        key = (row.channel, row.project_id) if row.project_id is not None else ('', row.id)
+        previous = events.pop(key, None)
+        events[key] = (row.channel, {**previous[1], **message} if previous is not None else message)
+    return list(events.values())
+
+
+def relayOutboxOnce(batchSize=OUTBOX_BATCH_SIZE):
+    # 오래된 순으로 outbox 행을 가져와 발행하고 지운다. 발행 후 삭제 전에 죽으면 다시 보내므로 최소 한 번 전달이다.
+    # autoincrement id는 동시 트랜잭션 사이의 커밋 순서와 다를 수 있지만, 같은 프로젝트의 행은 queueSseMessage가
+    # 프로젝트 행 잠금을 잡은 뒤 만들므로 커밋 순서대로 id를 받는다. 서로 다른 프로젝트 이벤트의 순서는 상관없다
+    rows = Outbox.query.order_by(Outbox.id).limit(batchSize).with_for_update(skip_locked=True).all()
+    if not rows:
+        db.session.rollback()
+        return 0
+    events = coalesceOutboxRows(rows)
+    publishEvents(events)
+    Outbox.query.filter(Outbox.id.in_([row.id for row in rows])).delete(synchronize_session=False)
+    db.session.commit()
+    incrementCounter('outbox.relayed', len(rows))
+    incrementCounter('outbox.coalesced', len(rows) - len(events))
+    return len(rows)
+
+
+class OutboxRelay:
+    def __init__(self, app, batchSize=OUTBOX_BATCH_SIZE, window=OUTBOX_COALESCE_WINDOW):
+        self.app = app
+        self.batchSize = batchSize
+        self.window = window
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            with self.app.app_context():
+                try:
+                    relayed = relayOutboxOnce(self.batchSize)
+                except Exception:
+                    db.session.rollback()
+                    incrementCounter('outbox.error')
+                    logger.exception('Failed to relay outbox events, retrying')
+                    self._stopped.wait(OUTBOX_ERROR_DELAY)
+                    continue
+                finally:
+                    db.session.remove()
+            # 배치가 가득 찼으면 밀린 행을 바로 이어서 보낸다
+            if relayed < self.batchSize:
+                self._stopped.wait(self.window)
+
+
+def startOutboxRelay(app):
+    if not OUTBOX_RELAY_ENABLED:
+        return None
+    relay = OutboxRelay(app)
+    threading.Thread(target=relay.run, name='outbox-relay', daemon=True).start()
+    return relay
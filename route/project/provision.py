@@ -0,0 +1,164 @@
+import json
+import os
+import time
+
+from redis.exceptions import RedisError
+
+from .. import db
+from ..models import Project, Token, User
+from ..queue import registerJobHandler, enqueueJob
+from ..redisclient import getRedis
+from .task import getProjectUrls, installCiChart, installAppChart, uninstallRelease, addDnsRecord, deleteDnsRecord
+from .orchestrator import Step, runSteps
+from .dns import isWildcardMode
+from .utils import assignUrlsToProject, sendSseMessage, queueSseMessage
+from .status import PROVISIONED_STATUS, PROVISIONING_STATUS, PROVISIONING_FAILED_STATUS
+
+PROVISION_JOB = 'provision'
+PROVISION_STATE_KEY = 'provision:{}'
+PROVISION_STATE_TTL = 7 * 24 * 60 * 60
+
+PROVISION_MAX_PARALLEL = int(os.getenv('PROVISION_MAX_PARALLEL', 4))
+
+
+def enqueueProvisioning(projectId):
+    enqueueJob(PROVISION_JOB, {'projectId': projectId})
+
+
+def getProvisioningState(projectId):
+    redisClient = getRedis()
+    if redisClient is None:
+        return {}
+    state = redisClient.hgetall(PROVISION_STATE_KEY.format(projectId))
+    return {key: json.loads(value) for key, value in state.items()}
+
+
+def _recordState(projectId, field, value):
+    try:
+        key = PROVISION_STATE_KEY.format(projectId)
+        redisClient = getRedis()
+        pipe = redisClient.pipeline(transaction=False)
+        pipe.hset(key, field, json.dumps(value))
+        pipe.expire(key, PROVISION_STATE_TTL)
+        pipe.execute()
+    except RedisError:
+        pass
+
+
+def _timedStep(spec, name, func):
+    # 단계별 소요 시간을 기록하고 진행 상황을 SSE로 전달
+    projectId, channel = spec['projectId'], f"{spec['userId']}"
+
+    def run():
+        sendSseMessage(channel, {'projectId': projectId, 'status': PROVISIONING_STATUS,
+                                 'step': name, 'stepStatus': 'running'})
+        startedAt = time.monotonic()
+        try:
+            func()
+        except Exception as e:
+            elapsedMs = int((time.monotonic() - startedAt) * 1000)
+            _recordState(projectId, name, {'status': 'failed', 'elapsedMs': elapsedMs, 'error': str(e)})
+            sendSseMessage(channel, {'projectId': projectId, 'status': PROVISIONING_STATUS,
+                                     'step': name, 'stepStatus': 'failed', 'elapsedMs': elapsedMs})
+            raise
+
+        elapsedMs = int((time.monotonic() - startedAt) * 1000)
+        _recordState(projectId, name, {'status': 'done', 'elapsedMs': elapsedMs})
+        sendSseMessage(channel, {'projectId': projectId, 'status': PROVISIONING_STATUS,
+                                 'step': name, 'stepStatus': 'done', 'elapsedMs': elapsedMs})
+    return run
+
+
+def _rollbackStep(spec, name, func):
+    projectId = spec['projectId']
+
+    def rollback():
+        func()
+        _recordState(projectId, name, {'status': 'rolled-back'})
+    return rollback
+
+
+def loadProvisioningSpec(projectId):
+    # 단계는 워커 스레드에서 실행되므로 세션에 묶인 ORM 객체 대신 필요한 값만 읽어 넘긴다
+    project = Project.query.filter_by(id=projectId).first()
+    if project is None or project.status != PROVISIONING_STATUS:
+        return None
+    user = User.query.filter_by(id=project.user_id).first()
+    token = Token.query.filter_by(user_id=user.id).first()
+    return {'projectId': project.id, 'userId': project.user_id, 'subdomain': project.subdomain,
+            'repository': project.name, 'githubName': user.login, 'gitToken': token.access_token,
+            'envs': {secret.key: secret.value for secret in project.secrets}}
+
+
+def buildProvisioningSteps(spec):
+    subdomain = spec['subdomain']
+    webhookUrl, domainUrl = getProjectUrls(subdomain)
+    # 서로 의존하지 않는 단계이므로 모두 동시에 실행된다
+    steps = [
+        Step('helm-ci',
+             _timedStep(spec, 'helm-ci', lambda: installCiChart(subdomain=subdomain,
+                                                              github_name=spec['githubName'],
+                                                              github_repository=spec['repository'],
+                                                              git_token=spec['gitToken'],
+                                                              project_id=spec['projectId'])),
+             rollback=_rollbackStep(spec, 'helm-ci', lambda: uninstallRelease(subdomain + '-ci'))),
+        Step('helm-app',
+             _timedStep(spec, 'helm-app', lambda: installAppChart(envs=spec['envs'],
+                                                                subdomain=subdomain,
+                                                                github_name=spec['githubName'])),
+             rollback=_rollbackStep(spec, 'helm-app', lambda: uninstallRelease(subdomain))),
+    ]
+    # 와일드카드 DNS 모드에서는 레코드 등록이 필요 없다
+    if not isWildcardMode():
+        steps += [
+            Step('dns-webhook',
+                 _timedStep(spec, 'dns-webhook', lambda: addDnsRecord(webhookUrl)),
+                 rollback=_rollbackStep(spec, 'dns-webhook', lambda: deleteDnsRecord(subdomain + '-ci.webhook'))),
+            Step('dns-domain',
+                 _timedStep(spec, 'dns-domain', lambda: addDnsRecord(domainUrl)),
+                 rollback=_rollbackStep(spec, 'dns-domain', lambda: deleteDnsRecord(subdomain))),
+        ]
+    return steps
+
+
+def provisionProject(payload):
+    spec = loadProvisioningSpec(payload['projectId'])
+    if spec is None:
+        return
+    # 단계를 실행하는 동안 트랜잭션과 커넥션을 붙잡지 않는다
+    db.session.close()
+    state = getProvisioningState(spec['projectId'])
+    _recordState(spec['projectId'], 'attempts', state.get('attempts', 0) + 1)
+
+    # 이전 시도에서 완료되었고 롤백되지 않은 단계(워커가 도중에 죽은 경우)는 건너뛰되, 이번 시도가 실패하면 함께 롤백한다
+    steps, doneSteps = [], []
+    for step in buildProvisioningSteps(spec):
+        (doneSteps if state.get(step.name, {}).get('status') == 'done' else steps).append(step)
+    startedAt = time.monotonic()
+    runSteps(steps, maxWorkers=PROVISION_MAX_PARALLEL, doneSteps=doneSteps)
+
+    project = Project.query.filter_by(id=spec['projectId']).first()
+    if project is None or project.status != PROVISIONING_STATUS:
+        # 단계를 실행하는 동안 삭제가 요청되었으면 만든 자원은 teardown이 정리한다
+        return
+    _recordState(project.id, 'elapsedMs', int((time.monotonic() - startedAt) * 1000))
+
+    webhookUrl, domainUrl = getProjectUrls(project.subdomain)
+    assignUrlsToProject(project, webhookUrl, domainUrl)
+    project.status = PROVISIONED_STATUS
+    queueSseMessage(f"{project.user_id}", {'projectId': project.id, 'status': project.status})
+    db.session.commit()
+
+
+def handleProvisioningFailure(payload, error):
+    project = Project.query.filter_by(id=payload['projectId']).first()
+    if project is None:
+        return
+    project.status = PROVISIONING_FAILED_STATUS
+    queueSseMessage(f"{project.user_id}", {'projectId': project.id, 'status': project.status,
+                                           'error': str(error)})
+    db.session.commit()
+
+
+registerJobHandler(PROVISION_JOB, provisionProject, maxAttempts=3, retryDelay=10,
+                   onFailure=handleProvisioningFailure)
@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+import uuid
+
+from redis.exceptions import RedisError
+
+from .. import db
+from ..models import Project, Build
+from ..metrics import incrementCounter
+from ..redisclient import getRedis
+from .kube import getKubeBackend, getRolloutPhase, getRolloutImageTag
+from .utils import createNewDeploy, queueSseMessage
+from .status import DEPLOYING_STATUS
+
+TERMINAL_PHASES = ('Healthy', 'Degraded', 'InvalidSpec')
+
+ROLLOUT_WATCHER_ENABLED = os.getenv('ROLLOUT_WATCHER', 'true').lower() == 'true'
+WATCHER_LEADER_KEY = 'rollout:watcher:leader'
+WATCHER_LEASE = 60
+WATCH_TIMEOUT = 30  # 리더 임대 기간보다 짧아야 스트림 사이에 임대를 갱신할 수 있다
+
+# 값 확인과 만료 연장 사이에 임대가 끝나 다른 워커가 잡은 키를 연장하지 않도록 한 번에 실행한다
+RENEW_LEADER_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def applyDeployPhase(project, build, phase):
+    # Healthy면 Deploy를 남기고 배포 완료, Degraded/InvalidSpec이면 배포 실패로 바꾼다
+    if phase == 'Healthy':
+        newDeploy = createNewDeploy(build)
+        project.status = 4  # 배포 완료
+        project.current_deploy_id = newDeploy.id
+        project.current_build_id = build.id
+    else:
+        project.status = 6  # 배포 실패
+
+    # 배포 로그를 업데이트하는 작업이 필요함
+
+    queueSseMessage(f"{project.user_id}", {'projectId': project.id,
+                                           'status': project.status,
+                                           'currentBuildId': project.current_build_id,
+                                           'currentDeployId': project.current_deploy_id})
+    db.session.commit()
+
+
+def lockDeployingProject(projectId):
+    # 워처, 상태 조회 API, long-poll이 같은 전이를 두 번 반영하지 않도록 행을 잠그고 최신 상태를 다시 읽는다
+    project = Project.query.filter_by(id=projectId).with_for_update().populate_existing().first()
+    if project is None or project.status != DEPLOYING_STATUS:
+        db.session.rollback()
+        return None
+    return project
+
+
+def applyRolloutEvent(rollout):
+    phase = getRolloutPhase(rollout)
+    if phase not in TERMINAL_PHASES:
+        return None
+
+    # Rollout 이름은 프로젝트 subdomain이다 (app-template/templates/rollout.yaml)
+    project = Project.query.filter_by(subdomain=rollout['metadata']['name'], status=DEPLOYING_STATUS).first()
+    if project is None:
+        return None
+    # 배포 중인 빌드는 Rollout 이미지 태그로 찾는다
+    build = Build.query.filter_by(project_id=project.id, image_tag=getRolloutImageTag(rollout)) \
+        .order_by(Build.id.desc()).first()
+    if build is None:
+        # 아직 이전 이미지(예: 최초 landing 이미지)의 상태이므로 새 리비전을 기다린다
+        return None
+    project = lockDeployingProject(project.id)
+    if project is None:
+        return None
+
+    applyDeployPhase(project, build, phase)
+    incrementCounter(f'rollout.watcher.{phase.lower()}')
+    return phase
+
+
+class RolloutWatcher:
+    # 워커 프로세스 중 Redis 리더 키를 잡은 하나만 모든 네임스페이스의 Rollout을 watch한다
+    def __init__(self, app, backend=None, watchTimeout=WATCH_TIMEOUT, lease=WATCHER_LEASE):
+        self.app = app
+        self.backend = backend
+        self.watchTimeout = watchTimeout
+        self.lease = lease
+        self.identity = uuid.uuid4().hex
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _holdLeadership(self, redisClient):
+        try:
+            if redisClient.set(WATCHER_LEADER_KEY, self.identity, nx=True, ex=self.lease):
+                logger.info('Rollout watcher %s became leader', self.identity)
+                return True
+            renewLeader = redisClient.register_script(RENEW_LEADER_SCRIPT)
+            if renewLeader(keys=[WATCHER_LEADER_KEY], args=[self.identity, self.lease]):
+                return True
+        except RedisError:
+            logger.exception('Redis error while renewing rollout watcher leadership')
+        return False
+
+    def _apply(self, rollout):
+        with self.app.app_context():
+            try:
+                applyRolloutEvent(rollout)
+            except Exception:
+                db.session.rollback()
+                logger.exception('Failed to apply rollout event for %s', rollout['metadata'].get('name'))
+            finally:
+                db.session.remove()
+
+    def runOnce(self, redisClient, resourceVersion):
+        # 리더가 아니면 None, 아니면 다음 watch에 쓸 resourceVersion을 반환한다
+        if not self._holdLeadership(redisClient):
+            return None
+
+        backend = self.backend or getKubeBackend()
+        if resourceVersion is None:
+            # 처음이거나 resourceVersion이 만료되면 전체 목록으로 놓친 변경을 따라잡는다
+            rollouts, resourceVersion = backend.listRollouts()
+            for rollout in rollouts:
+                self._apply(rollout)
+
+        for event in backend.watchRollouts(resourceVersion, timeoutSeconds=self.watchTimeout):
+            if event['type'] == 'ERROR':
+                logger.warning('Rollout watch error, relisting: %s', event['object'].get('message'))
+                return None
+            resourceVersion = event['object']['metadata']['resourceVersion']
+            if event['type'] in ('ADDED', 'MODIFIED'):
+                incrementCounter('rollout.watcher.events')
+                self._apply(event['object'])
+            if not self._holdLeadership(redisClient):
+                return None
+        return resourceVersion
+
+    def run(self):
+        with self.app.app_context():
+            redisClient = getRedis()
+        resourceVersion = None
+        while not self._stopped.is_set():
+            try:
+                wasLeader = resourceVersion is not None
+                resourceVersion = self.runOnce(redisClient, resourceVersion)
+                if resourceVersion is None and not wasLeader:
+                    self._stopped.wait(self.lease / 2)
+            except Exception:
+                logger.exception('Rollout watcher failed, retrying')
+                resourceVersion = None
+                self._stopped.wait(5)
+
+
+def startRolloutWatcher(app):
+    if not ROLLOUT_WATCHER_ENABLED:
+        return None
+    watcher = RolloutWatcher(app)
+    threading.Thread(target=watcher.run, name='rollout-watcher', daemon=True).start()
+    return watcher
@@ -1,41 +1,84 @@
-from flask import Blueprint, request, jsonify, make_response
-from .utils import createLogAndSecretsForProject, validateTokenAndGetUser, fetchProjects, deleteProjectById, \
-    getCurrentCommitMessage, getProjectDetailById, createNewBuild, sendSseMessage, createNewDeploy, \
-    extractToken, createNewProject, convertSecretsToDict, assignUrlsToProject, getProjectById, checkBuildExists, \
-    handleWorkflowResponse, getBuildById, checkCurrentDeployId, getRolloutStatus, createOrUpdateBuildLog, fetchLogs
-from ..models import Project, User, Token, Favorite
+from flask import Blueprint, request, jsonify, make_response, g, current_app
+from .utils import createLogAndSecretsForProject, loginRequired, fetchProjects, \
+    getProjectDetailById, queueSseMessage, \
+    createNewProject, getProjectById, checkBuildExists, \
+    handleWorkflowResponse, getBuildWithProjectById, checkCurrentDeployId, getRolloutStatus, createOrUpdateBuildLog, fetchLogs, \
+    parsePaginationArgs, fetchBuildPage, fetchDeployPage, savePendingBuild, fetchProjectSecrets, \
+    checkProjectNotDeleting
+from ..models import Project, Favorite
 from .. import db
-from .task import addDnsRecord, deleteWithHelm, triggerArgoWorkflow, deployWithHelm, createProjectWithHelm, \
-    deleteDnsRecord, fetchBuildLogs
+from .task import triggerArgoWorkflow, fetchBuildLogs
+from .deploy import deployImage
+from .teardown import enqueueTeardown
+from .buildevents import ingestBuildEvent
+from .rollouts import applyDeployPhase, lockDeployingProject, TERMINAL_PHASES
+from .statuswait import waitForStatusChange, parseWaitTimeout
+from .commits import verifyWebhookSignature, recordPushEvent, getLatestCommit
+from .provision import enqueueProvisioning, getProvisioningState
+from .status import PROVISIONING_STATUS, DELETING_STATUS, DEPLOYING_STATUS
+from .cache import makeProjectListEtag, makeProjectDetailEtag, checkNotModified, withEtag, getCachedJson, \
+    jsonBodyResponse
 from route.response import successResponse
 
 projectBlueprint = Blueprint('project', __name__)
 
 @projectBlueprint.route('/', methods=['GET'])
+@loginRequired
 def getProjects():
-    token = extractToken(request)
-    user = validateTokenAndGetUser(token)
-    responseData = fetchProjects(user.id)
-    return make_response(jsonify(responseData), 200)
+    etag = makeProjectListEtag(g.user.id)
+    notModified = checkNotModified(etag)
+    if notModified is not None:
+        return notModified
+
+    body = getCachedJson(etag, lambda: fetchProjects(g.user.id))
+    return withEtag(jsonBodyResponse(body), etag)
 
 
 @projectBlueprint.route('/<int:projectId>', methods=['GET'])
+@loginRequired
 def getProjectDetail(projectId):
-    token = extractToken(request)
-    validateTokenAndGetUser(token)
-    responseData = getProjectDetailById(projectId)
-    return make_response(jsonify(responseData), 200)
+    limit = None
+    if request.args.get('limit'):
+        limit, _ = parsePaginationArgs(request.args)
+
+    etag = makeProjectDetailEtag(projectId, limit)
+    notModified = checkNotModified(etag)
+    if notModified is not None:
+        return notModified
+
+    # 시크릿 값이 Redis에 평문으로 남지 않도록 캐시에는 시크릿을 빼고 넣고, 응답할 때마다 DB에서 붙인다
+    body = getCachedJson(etag, lambda: getProjectDetailById(projectId, limit, includeSecrets=False))
+    data = current_app.json.loads(body)
+    data['secrets'] = fetchProjectSecrets(projectId)
+    return withEtag(jsonBodyResponse(current_app.json.dumps(data)), etag)
+
+
+@projectBlueprint.route('/<int:projectId>/builds', methods=['GET'])
+@loginRequired
+def getProjectBuilds(projectId):
+    limit, after = parsePaginationArgs(request.args)
+    getProjectById(projectId)
+    builds, nextCursor = fetchBuildPage(projectId, limit, after)
+    return make_response(jsonify({'builds': builds, 'nextCursor': nextCursor}), 200)
+
+
+@projectBlueprint.route('/<int:projectId>/deploys', methods=['GET'])
+@loginRequired
+def getProjectDeploys(projectId):
+    limit, after = parsePaginationArgs(request.args)
+    getProjectById(projectId)
+    deploys, nextCursor = fetchDeployPage(projectId, limit, after)
+    return make_response(jsonify({'deploys': deploys, 'nextCursor': nextCursor}), 200)
 
 
 @projectBlueprint.route('/<int:projectId>', methods=['DELETE'])
+@loginRequired
 def deleteProject(projectId):
-    token = extractToken(request)
-    validateTokenAndGetUser(token)
+    # helm 릴리스와 DNS 레코드 정리는 워커에서 처리하고 즉시 응답한다
     project = getProjectById(projectId)
-    deleteWithHelm(project.subdomain)
-    deleteDnsRecord(project.subdomain)
-    deleteDnsRecord(project.subdomain+'-ci.webhook')
-    deleteProjectById(projectId)
+    project.status = DELETING_STATUS
+    db.session.commit()
+    enqueueTeardown(project.id)
     return make_response(jsonify(successResponse), 200)
 
 
@@ -51,118 +94,103 @@ def checkSubdomain():
 
 
 @projectBlueprint.route('/create', methods=['POST'])
+@loginRequired
 def createProject():
-    token = extractToken(request)
-    user = validateTokenAndGetUser(token)
+    # helm 설치와 DNS 등록은 워커에서 처리하고 즉시 응답한다
     requestData = request.json
-    newProject = createNewProject(requestData, user.id)
-    envs = convertSecretsToDict(requestData['secrets'])
-    webhookUrl, domainUrl = createProjectWithHelm(envs=envs,
-                                                  subdomain=newProject.subdomain,
-                                                  github_name=user.login,
-                                                  github_repository=newProject.name,
-                                                  git_token=token,
-                                                  project_id=newProject.id)
-
-    addDnsRecord(webhookUrl)
-    addDnsRecord(domainUrl)
-    assignUrlsToProject(newProject, webhookUrl, domainUrl)
+    newProject = createNewProject(requestData, g.user.id)
+    newProject.status = PROVISIONING_STATUS
     createLogAndSecretsForProject(requestData, newProject)
     db.session.commit()
-    return make_response(jsonify({"projectId": newProject.id}), 200)
+    enqueueProvisioning(newProject.id)
+    return make_response(jsonify({"projectId": newProject.id, "status": newProject.status}), 200)
+
+
+@projectBlueprint.route('/<int:projectId>/provisioning', methods=['GET'])
+@loginRequired
+def getProjectProvisioning(projectId):
+    project = getProjectById(projectId)
+    return make_response(jsonify({'status': project.status,
+                                  'steps': getProvisioningState(projectId)}), 200)
 
 
 @projectBlueprint.route('/build', methods=['POST'])
+@loginRequired
 def buildProject():
-    token = extractToken(request)
-    user = validateTokenAndGetUser(token)
+    user = g.user
     project = getProjectById(request.json['id'])
-    commitMsg, sha = getCurrentCommitMessage(project.name, user, token)
+    checkProjectNotDeleting(project)
+    commitMsg, sha = getLatestCommit(project, user, g.token)
     checkBuildExists(project.id, sha[:7])
+    savePendingBuild(project.id, sha, commitMsg)
     workflowResponse = triggerArgoWorkflow(ci_domain=project.webhook_url,
                                            imageTag=sha[:7])
 
     handleWorkflowResponse(workflowResponse, project)
-    sendSseMessage(f"{project.user_id}", {'projectId': project.id, 'status': project.status})
+    return make_response(jsonify(successResponse), 200)
+
+
+@projectBlueprint.route('/github/push', methods=['POST'])
+def handleGithubPushEvent():
+    # 저장소에 등록한 GitHub push 웹훅 (Content type: application/json, Secret: GITHUB_WEBHOOK_SECRET)
+    verifyWebhookSignature(request.get_data(), request.headers.get('X-Hub-Signature-256'))
+    if request.headers.get('X-GitHub-Event') != 'push':
+        return make_response(jsonify(successResponse), 200)
+    recordPushEvent(request.get_json())
     return make_response(jsonify(successResponse), 200)
 
 
 @projectBlueprint.route('/deploy', methods=['POST'])
+@loginRequired
 def deployProject():
-    token = extractToken(request)
-    validateTokenAndGetUser(token)
-    build = getBuildById(request.json['id'])
-    project = getProjectById(build.project_id)
+    build, project = getBuildWithProjectById(request.json['id'])
+    checkProjectNotDeleting(project)
     checkCurrentDeployId(build.id, project.current_deploy_id)
-    deployWithHelm(subdomain=project.subdomain, image_tag=build.image_tag, target_port=project.port)
+    deployImage(subdomain=project.subdomain, image_tag=build.image_tag, target_port=project.port)
 
     project.status = 3  # 배포 중
+    queueSseMessage(f"{project.user_id}", {'projectId': project.id, 'status': project.status})
     db.session.commit()
-    sendSseMessage(f"{project.user_id}", {'projectId': project.id, 'status': project.status})
     return make_response(jsonify(successResponse), 200)
 
 
 @projectBlueprint.route('/build/event', methods=['POST'])
 def handleArgoBuildEvent():
-    data = request.json
-    project = Project.query.filter_by(id=data['projectId']).first()
-    user = User.query.filter_by(id=project.user_id).first()
-    token = Token.query.filter_by(user_id=user.id).first()
-    commitMsg, sha = getCurrentCommitMessage(project.name, user, token.access_token)
-
-    status = data['status']
-    if status == 'build-success':
-        newBuild = createNewBuild(project.id, commitMsg, project.name, sha[:7])
-        project.status = 2  # 빌드 완료
-        project.current_build_id = newBuild.id
-    else:
-        project.status = 5  # 빌드 실패
-
-    # 빌드 로그를 업데이트하는 작업이 필요함
-    # buildLog = fetchBuildLogs(subdomain=project.subdomain)
-    # createOrUpdateBuildLog(project.id, buildLog)
-
-    db.session.commit()
-    sendSseMessage(f"{project.user_id}", {'projectId': project.id,
-                                          'status': project.status,
-                                          'currentBuildId': project.current_build_id,
-                                          'currentDeployId': project.current_deploy_id})
-    return make_response(jsonify(successResponse), 200)
+    # 원본 이벤트는 큐에 넣고 바로 응답하며, 상태 반영은 워커가 여러 이벤트를 묶어서 처리한다
+    checkProjectNotDeleting(getProjectById(int(request.json['projectId'])))
+    ingestBuildEvent(request.json)
+    return make_response(jsonify(successResponse), 202)
 
 
 @projectBlueprint.route('/deploy/status', methods=['GET'])
+@loginRequired
 def checkDeployStatus():
-    token = extractToken(request)
-    validateTokenAndGetUser(token)
+    # 상태 반영은 워커의 Rollout watcher가 SSE로 알려 주며, 이 API는 watcher를 쓸 수 없는 환경을 위해 남겨 둔다
     buildId = request.args.get('buildId')
-    build = getBuildById(buildId)
-    project = getProjectById(build.project_id)
-    status = getRolloutStatus(project.subdomain)
-
-    if status in ['Healthy', 'Degraded', 'InvalidSpec']:
-        if status == 'Healthy':
-            newDeploy = createNewDeploy(build.id)
-            project.status = 4  # 배포 완료
-            project.current_deploy_id = newDeploy.id
-            project.current_build_id = build.id
-        else:
-            project.status = 6  # 배포 실패
-
-        # 배포 로그를 업데이트하는 작업이 필요함
-
-        db.session.commit()
-        sendSseMessage(f"{project.user_id}", {'projectId': project.id,
-                                              'status': project.status,
-                                              'currentBuildId': project.current_build_id,
-                                              'currentDeployId': project.current_deploy_id})
+    build, project = getBuildWithProjectById(buildId)
+    status = getRolloutStatus(project.subdomain, build.image_tag)
+
+    if status in TERMINAL_PHASES and project.status == DEPLOYING_STATUS:
+        lockedProject = lockDeployingProject(project.id)
+        if lockedProject is not None:
+            applyDeployPhase(lockedProject, build, status)
 
     return make_response(jsonify({'status': project.status}), 200)
 
 
+@projectBlueprint.route('/deploy/status/wait', methods=['GET'])
+@loginRequired
+def waitDeployStatus():
+    # SSE를 쓸 수 없는 클라이언트용 long-poll. status(클라이언트가 알고 있는 상태)와 달라지거나 timeout이 지나면 응답한다
+    build, project = getBuildWithProjectById(request.args.get('buildId'))
+    knownStatus = request.args.get('status', default=project.status, type=int)
+    result = waitForStatusChange(project, build, knownStatus, parseWaitTimeout(request.args.get('timeout')))
+    return make_response(jsonify(result), 200)
+
+
 @projectBlueprint.route('/<int:projectId>/description', methods=['PUT'])
+@loginRequired
 def updateProjectDescription(projectId):
-    token = extractToken(request)
-    validateTokenAndGetUser(token)
     project = getProjectById(projectId)
     project.description = request.json['description']
     db.session.commit()
@@ -170,9 +198,8 @@ def updateProjectDescription(projectId):
 
 
 @projectBlueprint.route('/<int:projectId>/detailed_description', methods=['PUT'])
+@loginRequired
 def updateProjectDetailedDescription(projectId):
-    token = extractToken(request)
-    validateTokenAndGetUser(token)
     project = getProjectById(projectId)
     project.detailed_description = request.json['detailedDescription']
     db.session.commit()
@@ -180,19 +207,16 @@ def updateProjectDetailedDescription(projectId):
 
 
 @projectBlueprint.route('/favorite/<int:userId>', methods=['GET'])
+@loginRequired
 def getFavoriteProjects(userId):
-    token = extractToken(request)
-    validateTokenAndGetUser(token)
     favorites = Favorite.query.filter_by(user_id=userId).all()
     projectIds = [favorite.project_id for favorite in favorites]
     return make_response(jsonify(projectIds), 200)
 
 
 @projectBlueprint.route('/favorite', methods=['POST'])
+@loginRequired
 def addFavoriteProject():
-    token = extractToken(request)
-    validateTokenAndGetUser(token)
-
     favorite = Favorite.query.filter_by(user_id=request.json['userId'],
                                         project_id=request.json['projectId']).first()
     if favorite is not None:
@@ -206,9 +230,8 @@ def addFavoriteProject():
 
 
 @projectBlueprint.route('/favorite', methods=['DELETE'])
+@loginRequired
 def deleteFavoriteProject():
-    token = extractToken(request)
-    validateTokenAndGetUser(token)
     userId = request.args.get('userId')
     projectId = request.args.get('projectId')
     favorite = Favorite.query.filter_by(user_id=userId, project_id=projectId).first()
@@ -223,8 +246,7 @@ def deleteFavoriteProject():
 
 
 @projectBlueprint.route('/<int:projectId>/logs', methods=['GET'])
+@loginRequired
 def getProjectLogs(projectId):
-    token = extractToken(request)
-    validateTokenAndGetUser(token)
     response = fetchLogs(projectId)
     return make_response(jsonify(response), 200)
\ No newline at end of file
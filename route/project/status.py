@@ -0,0 +1,6 @@
+# 프로젝트 상태 코드. 여러 모듈이 서로를 import하지 않고도 같은 값을 쓰도록 한곳에 모은다
+PROVISIONED_STATUS = 0
+DEPLOYING_STATUS = 3  # 배포 중
+PROVISIONING_STATUS = 7  # 프로비저닝 중
+PROVISIONING_FAILED_STATUS = 8  # 프로비저닝 실패
+DELETING_STATUS = 9  # 삭제 중
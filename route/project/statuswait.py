@@ -0,0 +1,261 @@
+import json
+import logging
+import threading
+import time
+
+from redis.exceptions import RedisError
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .. import db
+from ..metrics import incrementCounter
+from ..models import Project, Build
+from ..redisclient import getRedis
+from .error import KubernetesApiError, ProjectNotFoundError
+from .utils import getRolloutStatus
+from .rollouts import applyDeployPhase, lockDeployingProject, TERMINAL_PHASES
+from .status import DEPLOYING_STATUS
+
+PROJECT_STATUS_CHANNEL = 'project:status:{}'
+ROLLOUT_STATUS_CACHE_KEY = 'rollout:status:{}:{}'
+ROLLOUT_STATUS_CACHE_TTL = 2
+DEFAULT_WAIT_TIMEOUT = 25
+MAX_WAIT_TIMEOUT = 60
+ROLLOUT_RECHECK_INTERVAL = 5  # watcher가 없는 환경에서도 배포 중 상태가 끝나도록 Rollout을 다시 확인하는 간격
+
+logger = logging.getLogger(__name__)
+
+
+def _collectStatusChanges(session, flushContext):
+    changes = session.info.setdefault('statusChanges', {})
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Project) and inspect(obj).attrs.status.history.has_changes():
+            changes[obj.id] = {'projectId': obj.id, 'status': obj.status,
+                               'currentBuildId': obj.current_build_id, 'currentDeployId': obj.current_deploy_id}
+
+
+def _publishStatusChanges(session):
+    changes = session.info.pop('statusChanges', {})
+    if not changes:
+        return
+    redisClient = getRedis()
+    if redisClient is None:
+        return
+    try:
+        pipe = redisClient.pipeline(transaction=False)
+        for projectId, change in changes.items():
+            pipe.publish(PROJECT_STATUS_CHANNEL.format(projectId), json.dumps(change))
+        pipe.execute()
+    except RedisError:
+        incrementCounter('status.publish.error')
+
+
+def _discardStatusChanges(session):
+    session.info.pop('statusChanges', None)
+
+
+def registerStatusPublishing():
+    # 커밋된 프로젝트 상태 변경을 project:status:<id> 채널로 알린다 (워커에서 바뀐 상태 포함)
+    if event.contains(Session, 'after_flush', _collectStatusChanges):
+        return
+    event.listen(Session, 'after_flush', _collectStatusChanges)
+    event.listen(Session, 'after_commit', _publishStatusChanges)
+    event.listen(Session, 'after_rollback', _discardStatusChanges)
+
+
+class _Waiter:
+    def __init__(self):
+        self.event = threading.Event()
+        self.change = None
+
+
+class StatusWaiterHub:
+    # 프로세스당 하나의 psubscribe로 상태 변경을 받아 같은 프로젝트를 기다리는 요청들을 깨운다
+    def __init__(self):
+        self._waiters = {}
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def _ensureListener(self, redisClient):
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, args=(redisClient,),
+                                              name='project-status-listener', daemon=True)
+            self._listener.start()
+
+    def _listen(self, redisClient):
+        while True:
+            try:
+                pubsub = redisClient.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(PROJECT_STATUS_CHANNEL.format('*'))
+                while True:
+                    # 소켓 타임아웃(2초)보다 짧게 기다려 메시지가 없어도 연결 오류로 취급되지 않게 한다
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None and message['type'] == 'pmessage':
+                        self._notify(json.loads(message['data']))
+            except (RedisError, ValueError):
+                logger.exception('Project status listener disconnected, reconnecting')
+                threading.Event().wait(1)
+
+    def _notify(self, change):
+        with self._lock:
+            waiters = self._waiters.pop(change['projectId'], ())
+        for waiter in waiters:
+            waiter.change = change
+            waiter.event.set()
+
+    def register(self, projectId):
+        self._ensureListener(getRedis())
+        waiter = _Waiter()
+        with self._lock:
+            self._waiters.setdefault(projectId, set()).add(waiter)
+        return waiter
+
+    def unregister(self, projectId, waiter):
+        with self._lock:
+            waiters = self._waiters.get(projectId)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._waiters[projectId]
+
+    def waiterCount(self):
+        with self._lock:
+            return sum(len(waiters) for waiters in self._waiters.values())
+
+
+_hub = StatusWaiterHub()
+
+
+def getStatusWaiterHub():
+    return _hub
+
+
+class SingleFlight:
+    # 같은 키에 대한 동시 호출은 첫 호출의 결과를 함께 받는다
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'event': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+        if not leader:
+            incrementCounter('rollout.status.coalesced')
+            call['event'].wait()
+        else:
+            try:
+                call['result'] = func()
+            except Exception as e:
+                call['error'] = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call['event'].set()
+        if call['error'] is not None:
+            raise call['error']
+        return call['result']
+
+
+_rolloutLookups = SingleFlight()
+
+
+def _lookupRolloutStatus(subdomain, imageTag):
+    # 워커 간에는 짧은 Redis 캐시로 Rollout 조회를 합친다. 결과는 기다리는 빌드의 이미지에 따라 달라지므로 키에 포함한다
+    redisClient = getRedis()
+    key = ROLLOUT_STATUS_CACHE_KEY.format(subdomain, imageTag)
+    try:
+        cached = redisClient.get(key) if redisClient is not None else None
+    except RedisError:
+        cached = None
+    if cached is not None:
+        incrementCounter('rollout.status.cached')
+        return cached
+    incrementCounter('rollout.status.lookup')
+    status = getRolloutStatus(subdomain, imageTag)
+    try:
+        if redisClient is not None:
+            redisClient.set(key, status, ex=ROLLOUT_STATUS_CACHE_TTL)
+    except RedisError:
+        pass
+    return status
+
+
+def checkRolloutOnce(projectId, subdomain, buildId, imageTag):
+    # 같은 프로젝트를 기다리는 요청들은 하나의 조회(와 상태 반영)를 공유한다.
+    # Kubernetes API 오류는 None으로 돌려주고, 기다리던 요청은 계속 상태 변경 알림을 기다린다
+    def checkRollout():
+        try:
+            phase = _lookupRolloutStatus(subdomain, imageTag)
+        except KubernetesApiError:
+            incrementCounter('status.wait.rollout_error')
+            logger.warning('Rollout lookup failed for %s', subdomain, exc_info=True)
+            return None
+        if phase in TERMINAL_PHASES:
+            lockedProject = lockDeployingProject(projectId)
+            if lockedProject is not None:
+                applyDeployPhase(lockedProject, db.session.get(Build, buildId), phase)
+        return phase
+
+    return _rolloutLookups.do((projectId, imageTag), checkRollout)
+
+
+def parseWaitTimeout(value):
+    try:
+        timeout = float(value) if value else DEFAULT_WAIT_TIMEOUT
+    except ValueError:
+        timeout = DEFAULT_WAIT_TIMEOUT
+    return min(max(timeout, 0), MAX_WAIT_TIMEOUT)
+
+
+def _statusPayload(project):
+    return {'projectId': project.id, 'status': project.status,
+            'currentBuildId': project.current_build_id, 'currentDeployId': project.current_deploy_id}
+
+
+def _readStatus(projectId):
+    # 읽을 때마다 새 트랜잭션을 열고 바로 닫는다. REPEATABLE READ에서도 최신 커밋이 보이고,
+    # 기다리는 동안 트랜잭션과 풀 커넥션을 붙잡지 않는다
+    try:
+        project = Project.query.filter_by(id=projectId).populate_existing().first()
+        if project is None:
+            raise ProjectNotFoundError('Project not found')
+        return _statusPayload(project)
+    finally:
+        db.session.close()
+
+
+def waitForStatusChange(project, build, knownStatus, timeout):
+    projectId, subdomain, buildId, imageTag = project.id, project.subdomain, build.id, build.image_tag
+    # 요청을 처리하며 열린 트랜잭션을 끝내 커넥션을 풀에 돌려준 뒤 기다린다
+    db.session.close()
+    hub = getStatusWaiterHub()
+    # 알림을 놓치지 않도록 먼저 등록한 뒤 상태를 다시 읽는다
+    waiter = hub.register(projectId)
+    incrementCounter('status.wait.started')
+    try:
+        deadline = time.monotonic() + timeout
+        state = _readStatus(projectId)
+        while state['status'] == knownStatus:
+            if state['status'] == DEPLOYING_STATUS and \
+                    checkRolloutOnce(projectId, subdomain, buildId, imageTag) in TERMINAL_PHASES:
+                state = _readStatus(projectId)
+                if state['status'] != knownStatus:
+                    break
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                incrementCounter('status.wait.timeout')
+                break
+            if waiter.event.wait(min(remaining, ROLLOUT_RECHECK_INTERVAL)):
+                incrementCounter('status.wait.notified')
+                return {**waiter.change, 'changed': waiter.change['status'] != knownStatus}
+            state = _readStatus(projectId)
+        return {**state, 'changed': state['status'] != knownStatus}
+    finally:
+        hub.unregister(projectId, waiter)
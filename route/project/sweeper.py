@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+
+from datetime import timedelta
+
+from .. import db
+from ..models import Project, PendingBuild, getSeoulTime
+from ..metrics import incrementCounter
+from ..queue import registerJobHandler, registerPeriodicJob, findQueuedPayloads
+from .helm import getHelmService
+from .dns import getDnsBackend, getIngressIp, WILDCARD_RECORD_NAMES, ZONE_DOMAIN
+from .teardown import enqueueTeardown, uninstallIfPresent, TEARDOWN_JOB
+from .provision import enqueueProvisioning, PROVISION_JOB
+from .status import PROVISIONING_STATUS, DELETING_STATUS
+
+SWEEP_JOB = 'sweep-orphans'
+SWEEP_INTERVAL = int(os.getenv('SWEEP_INTERVAL', 3600))
+# 기본은 드라이런: 고아 리소스를 로그와 카운터로만 남기고 SWEEPER_DELETE=true일 때만 지운다
+SWEEPER_DELETE = os.getenv('SWEEPER_DELETE', 'false').lower() == 'true'
+# 인그레스 IP를 가리키지만 프로젝트가 아닌 레코드 (예: api,argo)
+RESERVED_SUBDOMAINS = {name for name in os.getenv('SWEEPER_RESERVED_SUBDOMAINS', '').split(',') if name}
+PROJECT_CHARTS = ('app-template', 'create-projects')
+# 이보다 오래된 대기 빌드는 콜백이 오지 않은 것으로 본다 (워크플로 취소, 이벤트 유실 등)
+PENDING_BUILD_MAX_AGE = int(os.getenv('PENDING_BUILD_MAX_AGE', 7 * 24 * 60 * 60))
+
+logger = logging.getLogger(__name__)
+
+
+def _subdomainFromRelease(release):
+    name, chart = release['name'], release.get('chart', '')
+    if not chart.startswith(PROJECT_CHARTS):
+        return None
+    return name[:-len('-ci')] if chart.startswith('create-projects') and name.endswith('-ci') else name
+
+
+def _subdomainFromRecord(record):
+    name = record['name']
+    if record.get('type') != 'A' or record.get('rrdatas') != [getIngressIp()] or name in WILDCARD_RECORD_NAMES:
+        return None
+    # <subdomain>.pitapat.ne.kr. 또는 <subdomain>-ci.webhook.pitapat.ne.kr. 형태만 프로젝트 레코드로 본다
+    for suffix in (f"-ci.webhook.{ZONE_DOMAIN}.", f".{ZONE_DOMAIN}."):
+        if name.endswith(suffix):
+            subdomain = name[:-len(suffix)]
+            return subdomain if subdomain and '.' not in subdomain else None
+    return None
+
+
+def findOrphanReleases():
+    result = getHelmService().listReleases()
+    if result.returncode != 0:
+        raise RuntimeError(f"helm list failed: {result.stderr}")
+    releases = json.loads(result.stdout or '[]')
+    # 릴리스 목록을 먼저 읽고 나서 프로젝트를 조회해야 그 사이 생성된 프로젝트를 고아로 오인하지 않는다
+    subdomains = {project.subdomain for project in Project.query.with_entities(Project.subdomain)}
+    return [release['name'] for release in releases
+            if _subdomainFromRelease(release) not in (None, *subdomains)]
+
+
+def findOrphanRecords():
+    # Cloud DNS는 name 없이 type만으로 필터링할 수 없으므로 전체를 받아 거른다
+    records = getDnsBackend().listRecords()
+    subdomains = {project.subdomain for project in Project.query.with_entities(Project.subdomain)}
+    orphans = []
+    for record in records:
+        subdomain = _subdomainFromRecord(record)
+        if subdomain is None or subdomain in subdomains or subdomain in RESERVED_SUBDOMAINS:
+            continue
+        orphans.append(record)
+    return orphans
+
+
+def requeueStuckProjects():
+    # 상태는 커밋됐지만 작업을 넣지 못한(큐 장애 등) 프로비저닝/삭제 중 프로젝트의 작업을 다시 넣는다.
+    # 이미 끝난 단계는 각 작업이 건너뛴다
+    for status, kind, enqueue in ((PROVISIONING_STATUS, PROVISION_JOB, enqueueProvisioning),
+                                  (DELETING_STATUS, TEARDOWN_JOB, enqueueTeardown)):
+        queued = {payload.get('projectId') for payload in findQueuedPayloads(kind)}
+        for project in Project.query.filter_by(status=status):
+            if project.id not in queued:
+                incrementCounter(f'sweeper.requeued.{kind}')
+                logger.warning('Requeueing %s job for project %d', kind, project.id)
+                enqueue(project.id)
+
+
+def deleteStalePendingBuilds():
+    # 대기 빌드는 빌드 콜백에서 Build로 옮겨질 때만 지워지므로 오래된 것은 여기서 정리한다
+    cutoff = getSeoulTime() - timedelta(seconds=PENDING_BUILD_MAX_AGE)
+    deleted = PendingBuild.query.filter(PendingBuild.created < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    if deleted:
+        incrementCounter('sweeper.pending_builds.deleted', deleted)
+        logger.info('Deleted %d stale pending builds', deleted)
+    return deleted
+
+
+def sweepOrphans(payload):
+    requeueStuckProjects()
+    deleteStalePendingBuilds()
+
+    for releaseName in findOrphanReleases():
+        incrementCounter('sweeper.orphan.releases')
+        logger.warning('%s orphan helm release %s', 'Deleting' if SWEEPER_DELETE else 'Found', releaseName)
+        if SWEEPER_DELETE:
+            uninstallIfPresent(releaseName)
+
+    orphanRecords = findOrphanRecords()
+    for record in orphanRecords:
+        incrementCounter('sweeper.orphan.records')
+        logger.warning('%s orphan DNS record %s', 'Deleting' if SWEEPER_DELETE else 'Found', record['name'])
+    if SWEEPER_DELETE and orphanRecords:
+        getDnsBackend().applyChange(deletions=orphanRecords)
+
+
+registerJobHandler(SWEEP_JOB, sweepOrphans, maxAttempts=1)
+registerPeriodicJob(SWEEP_JOB, SWEEP_INTERVAL)
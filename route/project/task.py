@@ -1,63 +1,58 @@
 import requests, subprocess
-import json
 import os
 
 from route.project.error import CreatingProjectHelmError, ArgoWorkflowError, DeletingProjectHelmError, DeployingProjectHelmError
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from .dns import applyDnsChange, makeARecord, ZONE_DOMAIN
+from .helm import getHelmService
+from ..httpclient import getHttpClient
 
+DEFAULT_TARGET_PORT = 80  # app-template/values.yaml의 image.targetPort
 
-def createProjectWithHelm(envs, subdomain, github_name, github_repository, git_token, project_id):
-    app_release_name = subdomain
-    app_chart_name = "app-template"
-    ci_release_name = subdomain + "-ci"
-    ci_chart_name = "create-projects"
-    docker_token = os.environ.get("DOCKER_TOKEN")
+
+def getProjectUrls(subdomain):
+    return f"{subdomain}-ci.webhook.pitapat.ne.kr", f"{subdomain}.pitapat.ne.kr"
+
+
+def _runHelmInstall(release_name, chart_name, values):
+    # 프로비저닝 작업이 재시도되어도 실패하지 않도록 upgrade --install 사용
+    try:
+        result = getHelmService().upgrade(release_name, chart_name, values, install=True, reuseValues=False)
+        result.check_returncode()
+    except subprocess.CalledProcessError as e:
+        raise CreatingProjectHelmError(f"Helm command failed: {e.stderr}")
+    except Exception as e:
+        raise CreatingProjectHelmError(f"Unexpected error: {e}")
+
+
+def installCiChart(subdomain, github_name, github_repository, git_token, project_id):
     ci_values = {
-        "fullnameOverride": ci_release_name,
-        "apptemplateName": app_release_name,
+        "fullnameOverride": subdomain + "-ci",
+        "apptemplateName": subdomain,
         "githubName": github_name,
         "gitToken": git_token,
         "githubRepository": github_repository,
-        "dockerToken": docker_token,
+        "dockerToken": os.environ.get("DOCKER_TOKEN"),
         "projectId": project_id
     }
+    _runHelmInstall(subdomain + "-ci", "create-projects", ci_values)
 
-    for idx, (key, value) in enumerate(envs.items()):
-        ci_values[f"env[{idx}].name"] = key
-        ci_values[f"env[{idx}].value"] = value
 
+def installAppChart(envs, subdomain, github_name):
+    # 시크릿은 Rollout 컨테이너의 env로 들어간다 (app-template/templates/rollout.yaml)
     app_values = {
-        "fullnameOverride": app_release_name,
+        "fullnameOverride": subdomain,
         "githubName": github_name,
         "subdomainName": subdomain,
-        "dockerToken": docker_token
+        "dockerToken": os.environ.get("DOCKER_TOKEN"),
+        "env": [{"name": key, "value": value} for key, value in envs.items()]
     }
-    try:
-        ci_command = [
-            'helm', 'install', '-n', 'default', ci_release_name, ci_chart_name
-        ]
-        for key, value in ci_values.items():
-            ci_command.extend(['--set', f"{key}={value}"])
-
-        ci_result = subprocess.run(ci_command, capture_output=True, text=True)
-        ci_result.check_returncode()
-
-        app_command = [
-            'helm', 'install', '-n','default', app_release_name, app_chart_name
-        ]
-        for key, value in app_values.items():
-            app_command.extend(['--set', f"{key}={value}"])
-
-        app_result = subprocess.run(app_command, capture_output=True, text=True)
-        app_result.check_returncode()
+    _runHelmInstall(subdomain, "app-template", app_values)
 
-        return f"{ci_release_name}.webhook.pitapat.ne.kr", f"{subdomain}.pitapat.ne.kr"
 
-    except subprocess.CalledProcessError as e:
-        raise CreatingProjectHelmError(f"Helm command failed: {e.stderr}")
-    except Exception as e:
-        raise CreatingProjectHelmError(f"Unexpected error: {e}")
+def uninstallRelease(release_name):
+    result = getHelmService().uninstall(release_name)
+    if result.returncode != 0:
+        raise DeletingProjectHelmError(result.stderr)
 
 
 def triggerArgoWorkflow(ci_domain, imageTag):
@@ -67,7 +62,8 @@ def triggerArgoWorkflow(ci_domain, imageTag):
     }
     data = {"after": imageTag}
     try:
-        response = requests.post("https://"+ci_domain, headers=headers, json=data)
+        # Argo EventSource 호출은 커넥션 풀, 타임아웃, 재시도, 서킷 브레이커가 있는 공용 클라이언트로 보낸다
+        response = getHttpClient('ci').post("https://"+ci_domain, headers=headers, json=data)
         response.raise_for_status()  # 상태 코드가 4xx, 5xx일 경우 예외를 발생시킴
         return response
     except requests.exceptions.HTTPError as http_err:
@@ -76,15 +72,11 @@ def triggerArgoWorkflow(ci_domain, imageTag):
         raise ArgoWorkflowError(f"Request error occurred: {err}")
 
 
-def deployWithHelm(subdomain, image_tag, target_port):
+def deployWithHelm(subdomain, image_tag, target_port, force=False):
     try:
-        helm_chart_path = 'app-template'
-        helm_upgrade_command = [
-            'helm', 'upgrade', '-n', 'default', subdomain, helm_chart_path, '--reuse-values',
-            '--set', f'image.tag={image_tag}', '--set', f'image.repository={subdomain}', '--set', f'image.targetPort={target_port}'
-        ]
-
-        result = subprocess.run(helm_upgrade_command, capture_output=True, text=True)
+        result = getHelmService().upgrade(subdomain, 'app-template', {
+            'image': {'tag': image_tag, 'repository': subdomain, 'targetPort': target_port or DEFAULT_TARGET_PORT}
+        }, force=force)
         if result.returncode != 0:
             raise DeployingProjectHelmError(result.stderr)
 
@@ -93,82 +85,10 @@ def deployWithHelm(subdomain, image_tag, target_port):
 
 
 def addDnsRecord(subdomain):
-    credentials_info = json.loads(os.environ.get("GOOGLE_APPLICATION_CREDENTIALS_JSON"))
-    credentials = service_account.Credentials.from_service_account_info(
-        credentials_info,
-        scopes=['https://www.googleapis.com/auth/cloud-platform']
-    )
-    PROJECT_ID = os.environ.get("GCP_PROJECT_ID")
-    MANAGED_ZONE = 'pitapat'
-    dns_service = build('dns', 'v1', credentials=credentials)
-    ip_address = '220.84.206.115'
-    change_body = {
-        "additions": [
-            {
-                "name": f"{subdomain}.",
-                "type": "A",
-                "ttl": 300,
-                "rrdatas": [ip_address]
-            }
-        ]
-    }
-
-    request = dns_service.changes().create(
-        project=PROJECT_ID,
-        managedZone=MANAGED_ZONE,
-        body=change_body
-    )
-    response = request.execute()
-    return response
-
-def deleteWithHelm(subdomain):
-    try:
-        helm_delete_command = [
-            'helm', 'delete', '-n', 'default', subdomain
-        ]
-        result = subprocess.run(helm_delete_command, capture_output=True, text=True)
-        if result.returncode != 0:
-            raise DeletingProjectHelmError(result.stderr)
-        helm_ci_delete_command = [
-            'helm', 'delete', '-n', 'default', subdomain+'-ci'
-        ]
-        result = subprocess.run(helm_ci_delete_command, capture_output=True, text=True)
-        if result.returncode != 0:
-            raise DeletingProjectHelmError(result.stderr)
-
-    except Exception as e:
-        raise DeletingProjectHelmError(f"Unexpected error: {e}")
+    return applyDnsChange(additions=[makeARecord(subdomain)])
 
 def deleteDnsRecord(domain):
-    credentials_info = json.loads(os.environ.get("GOOGLE_APPLICATION_CREDENTIALS_JSON"))
-    credentials = service_account.Credentials.from_service_account_info(
-        credentials_info,
-        scopes=['https://www.googleapis.com/auth/cloud-platform']
-    )
-    
-    PROJECT_ID = os.environ.get("GCP_PROJECT_ID")
-    MANAGED_ZONE = 'pitapat'
-    dns_service = build('dns', 'v1', credentials=credentials)
-    
-    ip_address = '220.84.206.115'
-    change_body = {
-        "deletions": [
-            {
-                "name": f"{domain}.pitapat.ne.kr.",
-                "type": "A",
-                "ttl": 300,
-                "rrdatas": [ip_address]
-            }
-        ]
-    }
-    
-    request = dns_service.changes().create(
-        project=PROJECT_ID,
-        managedZone=MANAGED_ZONE,
-        body=change_body
-    )
-    response = request.execute()
-    return response
+    return applyDnsChange(deletions=[makeARecord(f"{domain}.{ZONE_DOMAIN}")])
 
 def fetchBuildLogs(subdomain):
     url = f"https://argo-server.argo.svc.cluster.local:2746/api/v1/workflows/{subdomain}-ci2"
@@ -0,0 +1,121 @@
+import logging
+import os
+
+from redis.exceptions import RedisError
+
+from ..models import Project
+from ..metrics import incrementCounter
+from ..queue import registerJobHandler, enqueueJob
+from ..redisclient import getRedis
+from .task import deleteDnsRecord
+from .deploy import HELM_DESIRED_KEY
+from .helm import getHelmService
+from .orchestrator import Step, runSteps
+from .dns import isWildcardMode, getDnsBackend, ZONE_DOMAIN
+from .error import DeletingProjectHelmError
+from .utils import deleteProjectById, queueSseMessage
+from .status import DELETING_STATUS
+
+TEARDOWN_JOB = 'teardown'
+TEARDOWN_STATE_KEY = 'teardown:{}'
+TEARDOWN_STATE_TTL = 7 * 24 * 60 * 60
+
+TEARDOWN_MAX_PARALLEL = int(os.getenv('TEARDOWN_MAX_PARALLEL', 4))
+
+logger = logging.getLogger(__name__)
+
+
+def enqueueTeardown(projectId):
+    enqueueJob(TEARDOWN_JOB, {'projectId': projectId})
+
+
+def _getDoneSteps(projectId):
+    redisClient = getRedis()
+    if redisClient is None:
+        return set()
+    try:
+        return set(redisClient.smembers(TEARDOWN_STATE_KEY.format(projectId)))
+    except RedisError:
+        return set()
+
+
+def _markStepDone(projectId, name):
+    try:
+        key = TEARDOWN_STATE_KEY.format(projectId)
+        redisClient = getRedis()
+        pipe = redisClient.pipeline(transaction=False)
+        pipe.sadd(key, name)
+        pipe.expire(key, TEARDOWN_STATE_TTL)
+        pipe.execute()
+    except RedisError:
+        pass
+
+
+def uninstallIfPresent(releaseName):
+    # 이미 지워진 릴리스는 성공으로 본다 (재시도/스위퍼와 겹쳐도 안전하도록)
+    result = getHelmService().uninstall(releaseName)
+    if result.returncode != 0 and 'not found' not in result.stderr:
+        raise DeletingProjectHelmError(result.stderr)
+
+
+def deleteDnsRecordIfPresent(domain):
+    try:
+        deleteDnsRecord(domain)
+    except Exception:
+        if getDnsBackend().listRecords(name=f"{domain}.{ZONE_DOMAIN}.", recordType='A'):
+            raise
+
+
+def _trackedStep(projectId, name, func):
+    def run():
+        func()
+        _markStepDone(projectId, name)
+    return Step(name, run)
+
+
+def buildTeardownSteps(project):
+    subdomain = project.subdomain
+    # 정리 단계는 서로 독립적이고 되돌릴 필요가 없으므로 롤백 없이 동시에 실행한다
+    steps = [
+        _trackedStep(project.id, 'helm-app', lambda: uninstallIfPresent(subdomain)),
+        _trackedStep(project.id, 'helm-ci', lambda: uninstallIfPresent(subdomain + '-ci')),
+    ]
+    if not isWildcardMode():
+        steps += [
+            _trackedStep(project.id, 'dns-domain', lambda: deleteDnsRecordIfPresent(subdomain)),
+            _trackedStep(project.id, 'dns-webhook', lambda: deleteDnsRecordIfPresent(subdomain + '-ci.webhook')),
+        ]
+    return steps
+
+
+def _finishTeardown(project):
+    userId, projectId, subdomain = project.user_id, project.id, project.subdomain
+    # 삭제 알림은 프로젝트 행 삭제와 같은 커밋으로 남긴다
+    queueSseMessage(f"{userId}", {'projectId': projectId, 'deleted': True})
+    deleteProjectById(projectId)
+    try:
+        getRedis().delete(TEARDOWN_STATE_KEY.format(projectId), HELM_DESIRED_KEY.format(subdomain))
+    except RedisError:
+        pass
+
+
+def teardownProject(payload):
+    project = Project.query.filter_by(id=payload['projectId']).first()
+    if project is None or project.status != DELETING_STATUS:
+        return
+
+    # 이전 시도에서 끝난 단계는 건너뛰고, 실패하면 큐가 간격을 늘려가며 다시 시도한다
+    doneSteps = _getDoneSteps(project.id)
+    steps = [step for step in buildTeardownSteps(project) if step.name not in doneSteps]
+    runSteps(steps, maxWorkers=TEARDOWN_MAX_PARALLEL)
+    _finishTeardown(project)
+
+
+def handleTeardownFailure(payload, error):
+    # 정리가 끝나기 전에는 행을 지우지 않는다. 삭제 중 상태로 남은 프로젝트는 스위퍼가 작업을 다시 넣는다
+    incrementCounter('teardown.failed')
+    logger.error('Teardown of project %s failed, keeping it for the sweeper to retry: %s', payload['projectId'], error)
+
+
+registerJobHandler(TEARDOWN_JOB, teardownProject, maxAttempts=5, retryDelay=30,
+                   onFailure=handleTeardownFailure)
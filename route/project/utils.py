@@ -1,15 +1,33 @@
-import requests
+import json
 
+from functools import wraps
+from types import SimpleNamespace
+from flask import request, g
 from .. import db
-from ..models import Project, Secret, Token, User, Build, Deploy, Log
+from ..models import Project, Secret, Token, User, Build, Deploy, Log, PendingBuild, Outbox
 from sqlalchemy.exc import SQLAlchemyError
 from route.project.error import AuthorizationError, ProjectNotFoundError, BuildExistsError, ArgoWorkflowError, \
-    BuildNotFoundError, DeployExistsError
-from flask_sse import sse
+    BuildNotFoundError, DeployExistsError, InvalidPaginationError, GithubRateLimitError, ProjectDeletingError
+from ..user.cache import getCachedUser, cacheUser
+from ..github import getGithubClient
+from .kube import getKubeBackend, getRolloutPhase, getRolloutImageTag
+from .status import DELETING_STATUS
+from ..sse import publishEvent
+
+DEFAULT_PAGE_LIMIT = 20
+MAX_PAGE_LIMIT = 100
 
 
 def sendSseMessage(channel, message):
-    sse.publish(message, type='message', channel=channel)
+    # 프로비저닝 단계 진행률처럼 DB 변경과 묶이지 않는 일시적인 알림에만 쓴다
+    publishEvent(channel, message)
+
+
+def queueSseMessage(channel, message):
+    # 상태 변경과 같은 트랜잭션에 outbox로 기록한다. 커밋 전에 호출해야 하며 발행은 워커의 relay가 한다.
+    # 프로젝트 행 변경을 먼저 flush해 행 잠금을 잡은 뒤 id를 받으므로, 같은 프로젝트의 행은 id 순서가 커밋 순서와 같다
+    db.session.flush()
+    db.session.add(Outbox(channel=channel, project_id=message.get('projectId'), payload=json.dumps(message)))
 
 
 def extractToken(request):
@@ -20,19 +38,37 @@ def extractToken(request):
 
 
 def validateTokenAndGetUser(token):
+    # 세션에 붙지 않은 User 인스턴스를 만들지 않도록 캐시 여부와 관계없이 값만 담은 객체를 돌려준다
+    cachedUser = getCachedUser(token)
+    if cachedUser is not None:
+        return SimpleNamespace(**cachedUser)
+
     try:
-        tokenEntry = Token.query.filter_by(access_token=token).first()
-        if tokenEntry is None:
+        # Token.access_token 인덱스를 타는 단일 JOIN 쿼리
+        user = db.session.query(User).join(Token, Token.user_id == User.id) \
+            .filter(Token.access_token == token).first()
+        if user is None:
             raise AuthorizationError('Invalid token')
-        user = User.query.filter_by(id=tokenEntry.user_id).first()
-        return user
+        return SimpleNamespace(**cacheUser(token, user))
     except SQLAlchemyError as e:
         raise e
 
 
+def loginRequired(view):
+    # 인증된 사용자와 토큰을 요청 컨텍스트(g)에 저장
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = extractToken(request)
+        g.token = token
+        g.user = validateTokenAndGetUser(token)
+        return view(*args, **kwargs)
+    return wrapper
+
+
 def fetchProjects(userId):
     try:
-        projects = Project.query.filter_by(user_id=userId).all()
+        # 삭제 중인 프로젝트는 목록에서 숨긴다
+        projects = Project.query.filter(Project.user_id == userId, Project.status != DELETING_STATUS).all()
         projectList = []
         for project in projects:
             projectList.append({
@@ -49,7 +85,66 @@ def fetchProjects(userId):
         raise e
 
 
-def getProjectDetailById(projectId):
+def serializeBuild(build):
+    return {
+        'id': build.id,
+        'buildDate': build.build_date,
+        'commitMsg': build.commit_msg,
+        'imageTag': build.image_tag
+    }
+
+
+def serializeDeploy(deploy, commitMsg, imageTag):
+    return {
+        'id': deploy.id,
+        'buildId': deploy.build_id,
+        'deployDate': deploy.deploy_date,
+        'commitMsg': commitMsg,
+        'imageTag': imageTag
+    }
+
+
+def parsePaginationArgs(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_LIMIT))
+        after = int(args['after']) if args.get('after') else None
+    except ValueError:
+        raise InvalidPaginationError('limit and after must be integers')
+    if limit < 1 or limit > MAX_PAGE_LIMIT:
+        raise InvalidPaginationError(f'limit must be between 1 and {MAX_PAGE_LIMIT}')
+    return limit, after
+
+
+def fetchBuildPage(projectId, limit, after=None):
+    # (project_id, id) 인덱스를 이용한 키셋 페이지네이션, 최신순
+    query = Build.query.filter_by(project_id=projectId)
+    if after is not None:
+        query = query.filter(Build.id < after)
+    builds = query.order_by(Build.id.desc()).limit(limit + 1).all()
+
+    nextCursor = builds[limit - 1].id if len(builds) > limit else None
+    return [serializeBuild(build) for build in builds[:limit]], nextCursor
+
+
+def fetchDeployPage(projectId, limit, after=None):
+    # (project_id, id) 인덱스를 이용한 키셋 페이지네이션, 최신순
+    query = db.session.query(Deploy, Build.commit_msg, Build.image_tag) \
+        .join(Build, Deploy.build_id == Build.id) \
+        .filter(Deploy.project_id == projectId)
+    if after is not None:
+        query = query.filter(Deploy.id < after)
+    deploys = query.order_by(Deploy.id.desc()).limit(limit + 1).all()
+
+    nextCursor = deploys[limit - 1][0].id if len(deploys) > limit else None
+    return [serializeDeploy(*row) for row in deploys[:limit]], nextCursor
+
+
+def fetchProjectSecrets(projectId):
+    secrets = Secret.query.filter_by(project_id=projectId).all()
+    return [{'key': secret.key, 'value': secret.value} for secret in secrets]
+
+
+def getProjectDetailById(projectId, limit=None, includeSecrets=True):
     try:
         data = {'builds': [], 'deploys': [], 'secrets': [], 'domainUrl': '', 'webhookUrl': '', 'subdomain': '',
                 'detailedDescription': ''}
@@ -57,36 +152,32 @@ def getProjectDetailById(projectId):
         if project is None:
             raise ProjectNotFoundError('Project not found')
 
-        builds = Build.query.filter_by(project_id=projectId).all()
-        for build in builds:
-            data['builds'].append({
-                'id': build.id,
-                'buildDate': build.build_date,
-                'commitMsg': build.commit_msg,
-                'imageTag': build.image_tag
-            })
-            deploys = Deploy.query.filter_by(build_id=build.id).all()
-            for deploy in deploys:
-                data['deploys'].append({
-                    'id': deploy.id,
-                    'buildId': deploy.build_id,
-                    'deployDate': deploy.deploy_date,
-                    'commitMsg': build.commit_msg,
-                    'imageTag': build.image_tag
-                })
-        data['deploys'].sort(key=lambda x: x['id'])
+        if limit is not None:
+            # 최근 limit개만 오래된 순으로 반환하고, 이어서 조회할 커서를 함께 전달
+            builds, data['buildsCursor'] = fetchBuildPage(projectId, limit)
+            deploys, data['deploysCursor'] = fetchDeployPage(projectId, limit)
+            data['builds'] = builds[::-1]
+            data['deploys'] = deploys[::-1]
+        else:
+            # 빌드/배포 이력의 길이와 관계없이 쿼리 수가 일정하도록 한 번에 조회하고 DB에서 정렬
+            builds = Build.query.filter_by(project_id=projectId).order_by(Build.id).all()
+            data['builds'] = [serializeBuild(build) for build in builds]
+
+            deploys = db.session.query(Deploy, Build.commit_msg, Build.image_tag) \
+                .join(Build, Deploy.build_id == Build.id) \
+                .filter(Deploy.project_id == projectId) \
+                .order_by(Deploy.id).all()
+            data['deploys'] = [serializeDeploy(*row) for row in deploys]
 
         data['domainUrl'] = project.domain_url
         data['webhookUrl'] = project.webhook_url
         data['subdomain'] = project.subdomain
         data['detailedDescription'] = project.detailed_description
 
-        secrets = Secret.query.filter_by(project_id=projectId).all()
-        for secret in secrets:
-            data['secrets'].append({
-                'key': secret.key,
-                'value': secret.value
-            })
+        if includeSecrets:
+            data['secrets'] = fetchProjectSecrets(projectId)
+        else:
+            del data['secrets']
 
         return data
     except SQLAlchemyError as e:
@@ -136,18 +227,15 @@ def convertSecretsToDict(secrets):
 
 
 def getCurrentCommitMessage(projectName, user, token):
-    repoUrl = f'https://api.github.com/repos/{user.login}/{projectName}/commits?per_page=1'
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Accept': 'application/vnd.github.v3+json',
-    }
-    response = requests.get(repoUrl, headers=headers)
-    if response.status_code != 200:
+    # 빌드할 커밋은 최신이어야 하므로 rate limit 중에도 캐시된 목록으로 대신하지 않는다
+    statusCode, commits = getGithubClient().get(f'/repos/{user.login}/{projectName}/commits', token,
+                                                params={'per_page': 1}, allowStale=False)
+    if statusCode == 429:
+        raise GithubRateLimitError('GitHub API rate limit exceeded')
+    if statusCode != 200:
         raise AuthorizationError('Token is expired')
 
-    commitMsg = response.json()[0]['commit']['message']
-    sha = response.json()[0]['sha']
-    return commitMsg, sha
+    return commits[0]['commit']['message'], commits[0]['sha']
 
 
 def assignUrlsToProject(project, webhookUrl, domainUrl):
@@ -183,6 +271,12 @@ def getProjectById(projectId):
     return project
 
 
+def checkProjectNotDeleting(project):
+    # 삭제 중인 프로젝트에 빌드/배포가 끼어들면 정리한 릴리스가 다시 생긴다
+    if project.status == DELETING_STATUS:
+        raise ProjectDeletingError('Project is being deleted')
+
+
 def checkBuildExists(projectId, imageTag):
     build = Build.query.filter_by(project_id=projectId, image_tag=imageTag).first()
     if build is not None:
@@ -193,12 +287,14 @@ def handleWorkflowResponse(response, project):
     # Argo Workflow 요청이 실패하는 경우
     if response.status_code != 200:
         project.status = 5  # 빌드 실패
+        queueSseMessage(f"{project.user_id}", {'projectId': project.id, 'status': project.status})
         db.session.commit()
         raise ArgoWorkflowError('Argo Workflow request failed')
 
     # Argo Workflow 요청이 성공하는 경우
     else:
         project.status = 1  # 빌드 중
+        queueSseMessage(f"{project.user_id}", {'projectId': project.id, 'status': project.status})
         db.session.commit()
 
 
@@ -209,6 +305,15 @@ def getBuildById(buildId):
     return build
 
 
+def getBuildWithProjectById(buildId):
+    # Build와 Project를 한 번의 쿼리로 조회
+    result = db.session.query(Build, Project).join(Project, Build.project_id == Project.id) \
+        .filter(Build.id == buildId).first()
+    if result is None:
+        raise BuildNotFoundError('Build not found')
+    return result
+
+
 def checkCurrentDeployId(buildId, currentDeployId):
     deploy = Deploy.query.filter_by(build_id=buildId).order_by(Deploy.id.desc()).first()
     if deploy:
@@ -229,18 +334,30 @@ def createNewBuild(projectId, commitMsg, imageName, imageTag):
     return newBuild
 
 
-def getRolloutStatus(subdomain):
-    return "Healthy"
-    # response = requests.get(
-    #     f'http://argo-rollouts-dashboard.argo-rollouts.svc.cluster.local:3100/api/v1/rollouts/{subdomain}/{subdomain}/info',
-    #     headers={'Content-Type': 'application/json'})
-    # responseData = response.json()
-    # status = responseData['status']
+def savePendingBuild(projectId, sha, commitMsg):
+    # 같은 태그로 다시 빌드를 요청하면 기존 기록을 갱신한다
+    pendingBuild = PendingBuild.query.filter_by(project_id=projectId, image_tag=sha[:7]).first()
+    if pendingBuild is None:
+        pendingBuild = PendingBuild(project_id=projectId, image_tag=sha[:7])
+        db.session.add(pendingBuild)
+    pendingBuild.sha = sha
+    pendingBuild.commit_msg = commitMsg
+    return pendingBuild
+
+
+def getRolloutStatus(subdomain, imageTag=None):
+    # Rollout 이름과 네임스페이스는 모두 subdomain이다.
+    # imageTag를 주면 그 이미지가 아직 Rollout에 반영되지 않은 동안(이전 리비전의 phase)은 진행 중으로 본다
+    rollout = getKubeBackend().getRollout(subdomain, subdomain)
+    if imageTag is not None and getRolloutImageTag(rollout) != imageTag:
+        return 'Progressing'
+    return getRolloutPhase(rollout)
 
 
-def createNewDeploy(buildId):
+def createNewDeploy(build):
     newDeploy = Deploy(
-        build_id=buildId,
+        build_id=build.id,
+        project_id=build.project_id,
     )
     db.session.add(newDeploy)
     db.session.flush()
@@ -0,0 +1,277 @@
+import json
+import logging
+import threading
+import time
+import uuid
+
+from redis.exceptions import RedisError
+
+from .redisclient import getRedis
+from .metrics import incrementCounter
+
+JOB_QUEUE_KEY = 'jobs:{}'
+DELAYED_JOB_KEY = 'jobs:delayed'
+PERIODIC_JOB_KEY = 'jobs:periodic:{}'
+PROCESSING_JOB_KEY = 'jobs:processing:{}'
+WORKERS_KEY = 'jobs:workers'
+WORKER_HEARTBEAT_KEY = 'jobs:worker:{}'
+WORKER_HEARTBEAT_TTL = 30
+
+# 처리 중 목록에서 하나를 지우는 데 성공한 경우에만 원래 큐의 맨 앞으로 되돌린다
+# (여러 워커가 같은 목록을 복구해도 작업이 두 번 들어가지 않는다)
+REQUEUE_SCRIPT = """
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) > 0 then
+    redis.call('LPUSH', KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+# 중복 제거 키를 처음 만든 경우에만 작업을 넣는다. 키만 남고 작업이 빠져 이벤트를 잃지 않도록 한 번에 실행하고,
+# 스크립트 오류는 앞선 쓰기를 되돌리지 않으므로 넣기에 실패하면 키를 직접 지운다
+ENQUEUE_UNIQUE_SCRIPT = """
+if not redis.call('SET', KEYS[1], 1, 'NX', 'EX', ARGV[1]) then
+    return 0
+end
+local pushed = redis.pcall('RPUSH', KEYS[2], ARGV[2])
+if type(pushed) == 'table' and pushed.err then
+    redis.call('DEL', KEYS[1])
+    return pushed
+end
+return 1
+"""
+
+logger = logging.getLogger(__name__)
+
+# kind -> 작업 핸들러 설정
+_handlers = {}
+# kind -> 주기(초)
+_periodicJobs = {}
+
+
+def registerJobHandler(kind, handler, maxAttempts=3, retryDelay=5, onFailure=None, batchSize=1):
+    # batchSize가 1보다 크면 handler는 큐에 쌓인 payload 목록(최대 batchSize개)을 한 번에 받는다
+    _handlers[kind] = {
+        'handler': handler,
+        'maxAttempts': maxAttempts,
+        'retryDelay': retryDelay,
+        'onFailure': onFailure,
+        'batchSize': batchSize
+    }
+
+
+def registerPeriodicJob(kind, interval):
+    _periodicJobs[kind] = interval
+
+
+def _getQueueRedis():
+    redisClient = getRedis()
+    if redisClient is None:
+        raise RuntimeError('REDIS_URL is not configured')
+    return redisClient
+
+
+def _makeJob(kind, payload, attempt=1):
+    return json.dumps({'kind': kind, 'payload': payload, 'attempt': attempt, 'enqueuedAt': time.time()})
+
+
+def enqueueJob(kind, payload, attempt=1, delay=0):
+    job = _makeJob(kind, payload, attempt)
+    redisClient = _getQueueRedis()
+    if delay > 0:
+        redisClient.zadd(DELAYED_JOB_KEY, {job: time.time() + delay})
+    else:
+        redisClient.rpush(JOB_QUEUE_KEY.format(kind), job)
+    incrementCounter(f'jobs.{kind}.enqueued')
+
+
+def enqueueUniqueJob(kind, payload, uniqueKey, ttl):
+    # uniqueKey가 ttl 안에 이미 쓰였으면 넣지 않고 False를 반환한다
+    redisClient = _getQueueRedis()
+    enqueue = redisClient.register_script(ENQUEUE_UNIQUE_SCRIPT)
+    if not enqueue(keys=[uniqueKey, JOB_QUEUE_KEY.format(kind)], args=[ttl, _makeJob(kind, payload)]):
+        return False
+    incrementCounter(f'jobs.{kind}.enqueued')
+    return True
+
+
+def _promoteDelayedJobs(redisClient):
+    # 재시도 대기 시간이 지난 작업을 다시 큐로 옮긴다
+    for job in redisClient.zrangebyscore(DELAYED_JOB_KEY, 0, time.time()):
+        if redisClient.zrem(DELAYED_JOB_KEY, job):
+            redisClient.rpush(JOB_QUEUE_KEY.format(json.loads(job)['kind']), job)
+
+
+def _schedulePeriodicJobs(redisClient):
+    # 여러 워커 중 키를 먼저 잡은 하나만 interval마다 작업을 넣는다
+    for kind, interval in _periodicJobs.items():
+        if redisClient.set(PERIODIC_JOB_KEY.format(kind), time.time(), nx=True, ex=interval):
+            redisClient.rpush(JOB_QUEUE_KEY.format(kind), _makeJob(kind, {}))
+            incrementCounter(f'jobs.{kind}.enqueued')
+
+
+def _claimJobs(redisClient, queueKey, processingKey, count):
+    # 작업을 꺼내면서 워커의 처리 중 목록으로 옮겨, 처리 도중 워커가 죽어도 작업이 남게 한다
+    pipe = redisClient.pipeline(transaction=False)
+    for _ in range(count):
+        pipe.lmove(queueKey, processingKey, 'LEFT', 'RIGHT')
+    return [raw for raw in pipe.execute() if raw is not None]
+
+
+def _ackJobs(redisClient, processingKey, raws):
+    pipe = redisClient.pipeline(transaction=False)
+    for raw in raws:
+        pipe.lrem(processingKey, 1, raw)
+    pipe.execute()
+
+
+def _requeueJobs(redisClient, processingKey, raws):
+    requeue = redisClient.register_script(REQUEUE_SCRIPT)
+    requeued = 0
+    for raw in raws:
+        requeued += requeue(keys=[processingKey, JOB_QUEUE_KEY.format(json.loads(raw)['kind'])], args=[raw])
+    return requeued
+
+
+def _requeueStaleJobs(redisClient, workerId):
+    # 하트비트가 끊긴 워커가 처리하던 작업을 다시 큐에 넣는다
+    for otherId in redisClient.smembers(WORKERS_KEY):
+        if otherId == workerId or redisClient.exists(WORKER_HEARTBEAT_KEY.format(otherId)):
+            continue
+        processingKey = PROCESSING_JOB_KEY.format(otherId)
+        requeued = _requeueJobs(redisClient, processingKey, redisClient.lrange(processingKey, 0, -1))
+        if requeued:
+            incrementCounter('jobs.requeued', requeued)
+            logger.warning('Requeued %d job(s) left by worker %s', requeued, otherId)
+        if redisClient.llen(processingKey) == 0:
+            redisClient.srem(WORKERS_KEY, otherId)
+
+
+def _sendHeartbeats(redisClient, workerId, stopped):
+    # 오래 걸리는 작업(프로비저닝 등)을 처리하는 동안에도 살아 있음을 알린다
+    while not stopped.is_set():
+        try:
+            pipe = redisClient.pipeline(transaction=False)
+            pipe.sadd(WORKERS_KEY, workerId)
+            pipe.set(WORKER_HEARTBEAT_KEY.format(workerId), time.time(), ex=WORKER_HEARTBEAT_TTL)
+            pipe.execute()
+        except RedisError:
+            logger.exception('Redis error while sending worker heartbeat')
+        stopped.wait(WORKER_HEARTBEAT_TTL / 3)
+
+
+def findQueuedPayloads(kind):
+    # 대기, 재시도 대기, 처리 중인 kind 작업의 payload 목록 (주기 작업에서 누락된 작업을 찾을 때 사용)
+    redisClient = _getQueueRedis()
+    raws = redisClient.lrange(JOB_QUEUE_KEY.format(kind), 0, -1) + redisClient.zrange(DELAYED_JOB_KEY, 0, -1)
+    for workerId in redisClient.smembers(WORKERS_KEY):
+        raws += redisClient.lrange(PROCESSING_JOB_KEY.format(workerId), 0, -1)
+    jobs = [json.loads(raw) for raw in raws]
+    return [job['payload'] for job in jobs if job['kind'] == kind]
+
+
+def _retryOrFail(kind, config, job, error):
+    if job['attempt'] < config['maxAttempts']:
+        incrementCounter(f'jobs.{kind}.retried')
+        enqueueJob(kind, job['payload'], attempt=job['attempt'] + 1,
+                   delay=config['retryDelay'] * job['attempt'])
+    else:
+        incrementCounter(f'jobs.{kind}.failed')
+        if config['onFailure'] is not None:
+            config['onFailure'](job['payload'], error)
+
+
+def _runJobs(app, kind, jobs):
+    config = _handlers.get(kind)
+    if config is None:
+        logger.error('No handler registered for job kind %s', kind)
+        return
+
+    startedAt = time.monotonic()
+    batchFailed = False
+    with app.app_context():
+        from . import db
+        try:
+            if config['batchSize'] > 1:
+                config['handler']([job['payload'] for job in jobs])
+            else:
+                config['handler'](jobs[0]['payload'])
+            incrementCounter(f'jobs.{kind}.succeeded', len(jobs))
+        except Exception as e:
+            db.session.rollback()
+            if len(jobs) > 1:
+                # 배치 중 하나가 실패하면 나머지까지 재시도되지 않도록 하나씩 다시 실행한다
+                logger.warning('Batch of %d %s jobs failed, running them one by one: %s', len(jobs), kind, e)
+                batchFailed = True
+            else:
+                logger.exception('Job %s failed (attempt %d)', kind, jobs[0]['attempt'])
+                _retryOrFail(kind, config, jobs[0], e)
+        finally:
+            db.session.remove()
+
+    if batchFailed:
+        for job in jobs:
+            _runJobs(app, kind, [job])
+        return
+    logger.info('Job %s finished %d job(s) in %.0fms', kind, len(jobs), (time.monotonic() - startedAt) * 1000)
+
+
+def _runJob(app, job):
+    _runJobs(app, job['kind'], [job])
+
+
+def runWorker(app, pollInterval=0.2, stopped=None):
+    with app.app_context():
+        redisClient = _getQueueRedis()
+    workerId = uuid.uuid4().hex
+    processingKey = PROCESSING_JOB_KEY.format(workerId)
+    stopped = stopped or threading.Event()
+    threading.Thread(target=_sendHeartbeats, args=(redisClient, workerId, stopped),
+                     name='job-heartbeat', daemon=True).start()
+    kinds = list(_handlers)
+    logger.info('Worker %s started, listening on %s', workerId,
+                ', '.join(JOB_QUEUE_KEY.format(kind) for kind in kinds))
+
+    nextRecoveryAt = 0
+    offset = 0
+    while not stopped.is_set():
+        claimed = None
+        try:
+            if time.monotonic() >= nextRecoveryAt:
+                _requeueStaleJobs(redisClient, workerId)
+                nextRecoveryAt = time.monotonic() + WORKER_HEARTBEAT_TTL
+            _promoteDelayedJobs(redisClient)
+            _schedulePeriodicJobs(redisClient)
+            # 한 종류의 작업이 몰려도 다른 큐가 굶지 않도록 확인하는 순서를 돌린다
+            offset = (offset + 1) % max(len(kinds), 1)
+            for kind in kinds[offset:] + kinds[:offset]:
+                # 배치 작업은 같은 큐에 이미 쌓여 있는 작업을 batchSize까지 함께 꺼낸다
+                raws = _claimJobs(redisClient, JOB_QUEUE_KEY.format(kind), processingKey,
+                                  _handlers[kind]['batchSize'])
+                if raws:
+                    claimed = (kind, raws)
+                    break
+        except RedisError:
+            logger.exception('Redis error while polling jobs')
+            stopped.wait(1)
+            continue
+        if claimed is None:
+            stopped.wait(pollInterval)
+            continue
+
+        kind, raws = claimed
+        try:
+            _runJobs(app, kind, [json.loads(raw) for raw in raws])
+        except Exception:
+            # 재시도 예약조차 실패한 경우이므로 큐에 되돌려 다시 처리한다
+            logger.exception('Job %s could not be completed, requeueing', kind)
+            try:
+                _requeueJobs(redisClient, processingKey, raws)
+            except RedisError:
+                logger.exception('Redis error while requeueing jobs')
+            continue
+        try:
+            _ackJobs(redisClient, processingKey, raws)
+        except RedisError:
+            # 처리 중 목록에 남은 작업은 이 워커가 재시작한 뒤 다시 실행된다
+            logger.exception('Redis error while acknowledging jobs')
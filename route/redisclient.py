@@ -0,0 +1,19 @@
+import redis
+
+from flask import current_app
+
+# 워커 프로세스마다 REDIS_URL 별로 커넥션 풀을 하나만 유지
+_clients = {}
+
+
+def getRedis():
+    redisUrl = current_app.config.get('REDIS_URL')
+    if not redisUrl:
+        return None
+
+    client = _clients.get(redisUrl)
+    if client is None:
+        client = redis.StrictRedis.from_url(redisUrl, decode_responses=True,
+                                            socket_timeout=2, socket_connect_timeout=2)
+        _clients[redisUrl] = client
+    return client
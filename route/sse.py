@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import re
+import threading
+
+from collections import deque
+
+from flask import Blueprint, current_app, request
+from flask_sse import Message
+from redis.exceptions import RedisError
+
+from .metrics import incrementCounter, registerGauge
+from .redisclient import getRedis
+
+SSE_CHANNEL = 'sse:{}'
+SSE_STREAM_KEY = 'sse:stream:{}'
+SSE_REPLAY_SIZE = int(os.getenv('SSE_REPLAY_SIZE', '200'))
+SSE_REPLAY_TTL = 24 * 60 * 60
+SSE_QUEUE_SIZE = int(os.getenv('SSE_QUEUE_SIZE', '100'))
+SSE_KEEPALIVE = float(os.getenv('SSE_KEEPALIVE', '15'))
+
+logger = logging.getLogger(__name__)
+
+sseBlueprint = Blueprint('sse', __name__)
+
+
+STREAM_ID_PATTERN = re.compile(r'^\d+-\d+$')
+
+
+def _parseEventId(eventId):
+    milliseconds, sequence = eventId.split('-')
+    return int(milliseconds), int(sequence)
+
+
+def publishEvents(events):
+    # 채널별 Redis Stream에 먼저 남겨 재연결한 클라이언트가 놓친 이벤트를 받을 수 있게 하고,
+    # Stream 항목 ID를 SSE 이벤트 ID로 써서 발행한다. 이벤트 수와 관계없이 파이프라인 왕복은 두 번이다
+    redisClient = getRedis()
+    messages = [(channel, Message(data, type='message')) for channel, data in events]
+    pipe = redisClient.pipeline(transaction=False)
+    for channel, message in messages:
+        streamKey = SSE_STREAM_KEY.format(channel)
+        pipe.xadd(streamKey, {'message': json.dumps(message.to_dict())}, maxlen=SSE_REPLAY_SIZE, approximate=True)
+        pipe.expire(streamKey, SSE_REPLAY_TTL)
+    eventIds = pipe.execute()[::2]
+
+    pipe = redisClient.pipeline(transaction=False)
+    for (channel, message), eventId in zip(messages, eventIds):
+        message.id = eventId
+        pipe.publish(SSE_CHANNEL.format(channel), json.dumps(message.to_dict()))
+    pipe.execute()
+    incrementCounter('sse.published', len(messages))
+    return eventIds
+
+
+def publishEvent(channel, data):
+    return publishEvents([(channel, data)])[0]
+
+
+def loadMissedEvents(channel, lastEventId):
+    # lastEventId 이후의 (ID, 프레임) 목록을 반환한다. 이미 잘려 나가 이어 줄 수 없으면 None
+    if not STREAM_ID_PATTERN.match(lastEventId):
+        return None
+    entries = getRedis().xrange(SSE_STREAM_KEY.format(channel), min=lastEventId)
+    if not entries or entries[0][0] != lastEventId:
+        return None
+    return [(entryId, str(Message(**json.loads(fields['message']), id=entryId))) for entryId, fields in entries[1:]]
+
+
+class _SseClient:
+    # 유휴 스트림이 많으므로 queue.Queue(Condition 3개) 대신 deque와 Event 하나만 쓴다
+    __slots__ = ('channel', 'queueSize', 'frames', 'ready', 'dropped')
+
+    def __init__(self, channel, queueSize):
+        self.channel = channel
+        self.queueSize = queueSize
+        self.frames = deque()
+        self.ready = threading.Event()
+        self.dropped = False
+
+    def push(self, eventId, frame):
+        if len(self.frames) >= self.queueSize:
+            # 큐가 가득 찬 느린 클라이언트는 밀린 이벤트를 버리고 연결을 끊는다.
+            # EventSource가 다시 연결하면서 최신 상태를 새로 받는다
+            self.frames.clear()
+            self.dropped = True
+            self.ready.set()
+            return False
+        self.frames.append((eventId, frame))
+        self.ready.set()
+        return True
+
+    def next(self, timeout):
+        # 다음 (ID, 프레임), 끊어야 하면 None, timeout 동안 없으면 ''을 반환한다
+        while True:
+            if self.dropped:
+                return None
+            if self.frames:
+                return self.frames.popleft()
+            self.ready.clear()
+            # clear 직전에 들어온 프레임을 놓치지 않도록 다시 확인한 뒤 기다린다
+            if self.frames or self.dropped:
+                continue
+            if not self.ready.wait(timeout):
+                return ''
+
+
+class SseHub:
+    # 프로세스당 하나의 psubscribe(sse:*)로 이벤트를 받아 같은 채널을 구독하는 클라이언트 큐에 나눠 준다
+    def __init__(self, queueSize=SSE_QUEUE_SIZE):
+        self.queueSize = queueSize
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def _ensureListener(self, redisClient):
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, args=(redisClient,),
+                                              name='sse-listener', daemon=True)
+            self._listener.start()
+
+    def _listen(self, redisClient):
+        while True:
+            try:
+                pubsub = redisClient.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(SSE_CHANNEL.format('*'))
+                while True:
+                    # 소켓 타임아웃(2초)보다 짧게 기다려 메시지가 없어도 연결 오류로 취급되지 않게 한다
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None and message['type'] == 'pmessage':
+                        channel = message['channel'][len(SSE_CHANNEL.format('')):]
+                        payload = json.loads(message['data'])
+                        self.dispatch(channel, payload.get('id'), str(Message(**payload)))
+            except (RedisError, ValueError):
+                logger.exception('SSE listener disconnected, reconnecting')
+                threading.Event().wait(1)
+
+    def dispatch(self, channel, eventId, frame):
+        # 직렬화는 메시지당 한 번만 하고, 클라이언트마다 큐에 넣기만 한다
+        with self._lock:
+            clients = list(self._clients.get(channel, ()))
+        for client in clients:
+            if client.dropped:
+                continue
+            if client.push(eventId, frame):
+                incrementCounter('sse.delivered')
+            else:
+                incrementCounter('sse.slow_consumer.dropped')
+
+    def register(self, channel):
+        self._ensureListener(getRedis())
+        client = _SseClient(channel, self.queueSize)
+        with self._lock:
+            self._clients.setdefault(channel, set()).add(client)
+        incrementCounter('sse.connect')
+        return client
+
+    def unregister(self, client):
+        with self._lock:
+            clients = self._clients.get(client.channel)
+            if clients is not None:
+                clients.discard(client)
+                if not clients:
+                    del self._clients[client.channel]
+        incrementCounter('sse.disconnect')
+
+    def connectionCount(self):
+        with self._lock:
+            return sum(len(clients) for clients in self._clients.values())
+
+    def channelCount(self):
+        with self._lock:
+            return len(self._clients)
+
+    def maxQueueDepth(self):
+        with self._lock:
+            return max((len(client.frames) for clients in self._clients.values() for client in clients),
+                       default=0)
+
+
+_hub = SseHub()
+registerGauge('sse.connections', _hub.connectionCount)
+registerGauge('sse.channels', _hub.channelCount)
+registerGauge('sse.queue.max_depth', _hub.maxQueueDepth)
+
+
+def getSseHub():
+    return _hub
+
+
+def streamEvents(client, missed=(), keepalive=SSE_KEEPALIVE):
+    # 첫 청크를 바로 보내야 응답 헤더가 전송되어 EventSource가 열린다
+    yield ':connected\n\n'
+    lastReplayedId = None
+    for eventId, frame in missed:
+        if eventId is not None:
+            lastReplayedId = _parseEventId(eventId)
+        yield frame
+    while True:
+        item = client.next(keepalive)
+        if item is None:
+            return
+        if not item:
+            # 프록시의 유휴 연결 종료를 막고, 끊어진 클라이언트를 쓰기 실패로 알아챈다
+            yield ':keepalive\n\n'
+            continue
+        eventId, frame = item
+        # 재전송하는 동안 큐에 쌓인 실시간 이벤트 중 이미 보낸 것은 건너뛴다
+        if lastReplayedId is not None and eventId and _parseEventId(eventId) <= lastReplayedId:
+            incrementCounter('sse.replay.duplicate')
+            continue
+        yield frame
+
+
+@sseBlueprint.route('', methods=['GET'])
+def stream():
+    # flask_sse와 같은 형식: /stream?channel=<user_id>
+    channel = request.args.get('channel') or 'sse'
+    # 새 EventSource는 헤더를 지정할 수 없으므로 처음 연결할 때는 lastEventId 파라미터도 받는다
+    lastEventId = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    hub = getSseHub()
+    # 재전송할 이벤트를 읽는 사이에 발행된 이벤트를 놓치지 않도록 먼저 등록한다
+    client = hub.register(channel)
+    missed = ()
+    if lastEventId:
+        try:
+            missed = loadMissedEvents(channel, lastEventId)
+        except RedisError:
+            missed = None
+        if missed is None:
+            # 놓친 이벤트를 모두 이어 줄 수 없으면 클라이언트가 목록을 다시 불러오게 한다
+            incrementCounter('sse.replay.resync')
+            missed = [(None, str(Message({}, type='resync')))]
+        else:
+            incrementCounter('sse.replay.events', len(missed))
+    response = current_app.response_class(streamEvents(client, missed), mimetype='text/event-stream')
+    # 제너레이터가 시작되기 전에 끊겨도 WSGI 서버가 close()를 호출하므로 여기서 등록을 해제한다
+    response.call_on_close(lambda: hub.unregister(client))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import threading
+
+from cachetools import TTLCache
+from redis.exceptions import RedisError
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from ..redisclient import getRedis
+from ..metrics import incrementCounter
+from ..models import Token
+
+# 1차: 워커별 LRU + TTL, 2차: 워커 간 공유되는 Redis
+LOCAL_CACHE_SIZE = 1024
+LOCAL_CACHE_TTL = 30
+REDIS_CACHE_TTL = 300
+
+_localCache = TTLCache(maxsize=LOCAL_CACHE_SIZE, ttl=LOCAL_CACHE_TTL)
+_localLock = threading.Lock()
+
+
+def _cacheKey(token):
+    # 토큰 원문을 Redis 키로 남기지 않는다
+    return 'auth:token:' + hashlib.sha256(token.encode()).hexdigest()
+
+
+def getCachedUser(token):
+    key = _cacheKey(token)
+    with _localLock:
+        userData = _localCache.get(key)
+    if userData is not None:
+        incrementCounter('auth.cache.local.hit')
+        return userData
+    incrementCounter('auth.cache.local.miss')
+
+    redisClient = getRedis()
+    if redisClient is None:
+        return None
+    try:
+        cached = redisClient.get(key)
+    except RedisError:
+        incrementCounter('auth.cache.redis.error')
+        return None
+    if cached is None:
+        incrementCounter('auth.cache.redis.miss')
+        return None
+
+    incrementCounter('auth.cache.redis.hit')
+    userData = json.loads(cached)
+    with _localLock:
+        _localCache[key] = userData
+    return userData
+
+
+def cacheUser(token, user):
+    key = _cacheKey(token)
+    userData = {
+        'id': user.id,
+        'login': user.login,
+        'nickname': user.nickname,
+        'avatar_url': user.avatar_url
+    }
+    with _localLock:
+        _localCache[key] = userData
+
+    redisClient = getRedis()
+    if redisClient is None:
+        return userData
+    try:
+        redisClient.set(key, json.dumps(userData), ex=REDIS_CACHE_TTL)
+    except RedisError:
+        incrementCounter('auth.cache.redis.error')
+    return userData
+
+
+def invalidateToken(token):
+    if not token:
+        return
+    key = _cacheKey(token)
+    with _localLock:
+        _localCache.pop(key, None)
+
+    # 다른 워커의 로컬 캐시는 LOCAL_CACHE_TTL 이내에 만료된다
+    redisClient = getRedis()
+    if redisClient is None:
+        return
+    try:
+        redisClient.delete(key)
+    except RedisError:
+        incrementCounter('auth.cache.redis.error')
+
+
+def _collectChangedTokens(session, flushContext):
+    tokens = session.info.setdefault('changedTokens', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Token):
+            history = inspect(obj).attrs.access_token.history
+            tokens.update(history.sum())
+
+
+def _invalidateChangedTokens(session):
+    for token in session.info.pop('changedTokens', set()):
+        invalidateToken(token)
+
+
+def _discardChangedTokens(session):
+    session.info.pop('changedTokens', None)
+
+
+def registerTokenInvalidation():
+    # 토큰이 바뀌거나 삭제되면 커밋 후 캐시에서 지워, 어느 경로로 지워도 이전 토큰이 캐시로 통과하지 않게 한다
+    if event.contains(Session, 'after_flush', _collectChangedTokens):
+        return
+    event.listen(Session, 'after_flush', _collectChangedTokens)
+    event.listen(Session, 'after_commit', _invalidateChangedTokens)
+    event.listen(Session, 'after_rollback', _discardChangedTokens)
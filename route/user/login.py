@@ -12,7 +12,7 @@ def githubLogin():
                                   'status': 400}}), 400
 
     accessToken = getAccessTokenFromGithub(authCode)
-    userData = getUserDataFromGithub(accessToken).json()
+    userData = getUserDataFromGithub(accessToken)
 
     login = userData["login"]
     nickname = userData["name"]
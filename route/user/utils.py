@@ -1,9 +1,10 @@
 import os
-import requests
 
 from .. import db
 from ..models import User, Token
 from sqlalchemy.exc import SQLAlchemyError
+from ..github import getGithubClient
+from ..project.error import AuthorizationError
 
 
 def getAccessTokenFromGithub(authCode):
@@ -11,26 +12,17 @@ def getAccessTokenFromGithub(authCode):
     clientSecret = os.getenv("GITHUB_CLIENT_SECRET")
     redirectUri = "https://pitapat.ne.kr/callback"
     # redirectUri = 'http://localhost:3000/callback'
-    tokenUrl = 'https://github.com/login/oauth/access_token'
-    data = {
-        'client_id': clientId,
-        'client_secret': clientSecret,
-        'code': authCode,
-        'redirect_uri': redirectUri,
-    }
-    headers = {'Accept': 'application/json'}
-    response = requests.post(tokenUrl, data=data, headers=headers)
-    return response.json()['access_token']
+    accessToken = getGithubClient().exchangeCode(clientId, clientSecret, authCode, redirectUri)
+    if accessToken is None:
+        raise AuthorizationError('Invalid authorization code')
+    return accessToken
 
 
 def getUserDataFromGithub(accessToken):
-    return requests.get(
-        "https://api.github.com/user",
-        headers={
-            "Authorization": f"Bearer {accessToken}",
-            "Accept": "application/json"
-        }
-    )
+    statusCode, userData = getGithubClient().get('/user', accessToken)
+    if statusCode != 200:
+        raise AuthorizationError('Invalid GitHub access token')
+    return userData
 
 
 def createUserAndInsertToken(login, nickname, avatarUrl, accessToken):
@@ -0,0 +1,68 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# .env보다 먼저 지정해 테스트가 실제 DB/Redis에 붙지 않게 한다
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+os.environ['REDIS_URL'] = ''
+
+from route import create_app, db, redisclient  # noqa: E402
+from route.models import User, Project  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def flaskApp():
+    # create_app은 블루프린트에 CORS를 붙이므로 프로세스당 한 번만 만든다
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def app(flaskApp):
+    flaskApp.config['REDIS_URL'] = ''
+    with flaskApp.app_context():
+        db.create_all()
+        yield flaskApp
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture(scope='session')
+def fakeRedisServer():
+    # SSE 허브처럼 프로세스에 남는 리스너 스레드가 테스트마다 같은 서버를 보도록 서버는 하나만 두고 테스트마다 비운다
+    fakeredis = pytest.importorskip('fakeredis')
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def redisClient(app, fakeRedisServer):
+    fakeredis = pytest.importorskip('fakeredis')
+    client = fakeredis.FakeStrictRedis(server=fakeRedisServer, decode_responses=True)
+    redisclient._clients['redis://test'] = client
+    app.config['REDIS_URL'] = 'redis://test'
+    yield client
+    redisclient._clients.pop('redis://test', None)
+    client.flushall()
+
+
+@pytest.fixture
+def user(app):
+    user = User(login='tester', nickname='Tester', avatar_url='https://example.com/a.png')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def makeProject(app, user):
+    def makeProject(subdomain='sample', status=0, **fields):
+        project = Project(user_id=user.id, name=subdomain, framework='react', subdomain=subdomain, status=status,
+                          **fields)
+        db.session.add(project)
+        db.session.commit()
+        return project
+    return makeProject
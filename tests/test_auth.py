@@ -0,0 +1,56 @@
+import pytest
+
+from route import db
+from route.models import User, Token
+from route.project.error import AuthorizationError
+from route.project.utils import validateTokenAndGetUser
+from route.user.cache import getCachedUser
+from route.user.utils import updateAccessToken
+
+
+@pytest.fixture
+def token(redisClient, user):
+    db.session.add(Token(user_id=user.id, access_token='token'))
+    db.session.commit()
+    return 'token'
+
+
+def test_cached_user_is_not_an_orm_instance(token, user):
+    first = validateTokenAndGetUser(token)
+    second = validateTokenAndGetUser(token)
+
+    for validated in (first, second):
+        assert not isinstance(validated, User)
+        assert (validated.id, validated.login) == (user.id, 'tester')
+    assert getCachedUser(token) is not None
+
+
+def test_deleted_token_is_rejected_immediately(token):
+    validateTokenAndGetUser(token)
+
+    db.session.delete(Token.query.filter_by(access_token=token).one())
+    db.session.commit()
+
+    assert getCachedUser(token) is None
+    with pytest.raises(AuthorizationError):
+        validateTokenAndGetUser(token)
+
+
+def test_replaced_token_is_rejected_immediately(token, user):
+    validateTokenAndGetUser(token)
+
+    updateAccessToken(user.id, 'newToken')
+
+    with pytest.raises(AuthorizationError):
+        validateTokenAndGetUser(token)
+    assert validateTokenAndGetUser('newToken').id == user.id
+
+
+def test_rolled_back_delete_keeps_cache(token):
+    validateTokenAndGetUser(token)
+
+    db.session.delete(Token.query.filter_by(access_token=token).one())
+    db.session.flush()
+    db.session.rollback()
+
+    assert getCachedUser(token) is not None
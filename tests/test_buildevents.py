@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from redis.exceptions import RedisError
+
+from route.metrics import getCounters
+from route.project.buildevents import ingestBuildEvent, BUILD_EVENT_JOB, BUILD_EVENT_DEDUPE_KEY
+from route.queue import JOB_QUEUE_KEY
+
+
+def queuedEvents(redisClient):
+    return [json.loads(job)['payload'] for job in redisClient.lrange(JOB_QUEUE_KEY.format(BUILD_EVENT_JOB), 0, -1)]
+
+
+def test_duplicate_event_is_queued_once(redisClient):
+    event = {'projectId': 1, 'imageTag': '0000001', 'status': 'build-success'}
+
+    assert ingestBuildEvent(event)
+    assert not ingestBuildEvent(event)
+
+    assert queuedEvents(redisClient) == [{'projectId': 1, 'imageTag': '0000001', 'status': 'build-success'}]
+
+
+def test_failed_enqueue_does_not_keep_the_dedupe_key(redisClient):
+    event = {'projectId': 1, 'imageTag': '0000001', 'status': 'build-success'}
+    # 큐 키가 다른 타입이라 RPUSH가 실패하는 상황
+    redisClient.set(JOB_QUEUE_KEY.format(BUILD_EVENT_JOB), 'broken')
+    errorsBefore = getCounters().get('build.event.enqueue_error', 0)
+
+    with pytest.raises(RedisError):
+        ingestBuildEvent(event)
+
+    assert getCounters().get('build.event.enqueue_error', 0) == errorsBefore + 1
+    assert not redisClient.exists(BUILD_EVENT_DEDUPE_KEY.format(1, '0000001', 'build-success'))
+
+    # Argo가 다시 보내면 큐에 들어간다
+    redisClient.delete(JOB_QUEUE_KEY.format(BUILD_EVENT_JOB))
+    assert ingestBuildEvent(event)
+    assert len(queuedEvents(redisClient)) == 1
@@ -0,0 +1,126 @@
+import json
+import threading
+
+import pytest
+
+from route import db
+from route.models import Build, Secret, Token
+from route.project import cache
+from route.project.cache import getProjectVersion, getUserProjectsVersion, getCachedJson, PROJECT_VERSION_KEY, \
+    USER_PROJECTS_VERSION_KEY, RESPONSE_CACHE_KEY, VERSION_TTL
+from route.project.utils import deleteProjectById
+
+
+def test_version_is_not_created_for_unknown_project(redisClient):
+    assert getProjectVersion(12345) is None
+    assert not redisClient.exists(PROJECT_VERSION_KEY.format(12345))
+
+
+def test_version_keys_expire(redisClient, makeProject):
+    project = makeProject()
+
+    assert getProjectVersion(project.id) is not None
+    assert getUserProjectsVersion(project.user_id) is not None
+    assert 0 < redisClient.ttl(PROJECT_VERSION_KEY.format(project.id)) <= VERSION_TTL
+    assert 0 < redisClient.ttl(USER_PROJECTS_VERSION_KEY.format(project.user_id)) <= VERSION_TTL
+
+
+def test_commit_bumps_version(redisClient, makeProject):
+    project = makeProject()
+    before = int(getProjectVersion(project.id))
+
+    project.status = 1
+    db.session.commit()
+
+    assert int(getProjectVersion(project.id)) > before
+    assert 0 < redisClient.ttl(PROJECT_VERSION_KEY.format(project.id)) <= VERSION_TTL
+
+
+def test_deleting_project_removes_version_key(redisClient, makeProject):
+    project = makeProject()
+    db.session.add(Build(project_id=project.id, commit_msg='c', image_name='sample', image_tag='0000001'))
+    db.session.commit()
+    projectId, userId = project.id, project.user_id
+    getProjectVersion(projectId)
+
+    deleteProjectById(projectId)
+
+    assert not redisClient.exists(PROJECT_VERSION_KEY.format(projectId))
+    # 목록 버전은 사용자가 남아 있으므로 올라간 채로 유지된다
+    assert redisClient.exists(USER_PROJECTS_VERSION_KEY.format(userId))
+
+
+@pytest.fixture
+def countingBuilder():
+    calls = []
+
+    def builder():
+        calls.append(1)
+        return {'built': len(calls)}
+    builder.calls = calls
+    return builder
+
+
+@pytest.fixture
+def fastRebuildWait(monkeypatch):
+    monkeypatch.setattr(cache, 'REBUILD_POLL_INTERVAL', 0.01)
+    monkeypatch.setattr(cache, 'REBUILD_WAIT_TIMEOUT', 0.2)
+
+
+def test_cached_json_is_built_once(redisClient, countingBuilder):
+    first = getCachedJson('p1-v1', countingBuilder)
+    second = getCachedJson('p1-v1', countingBuilder)
+
+    assert json.loads(first) == json.loads(second) == {'built': 1}
+    assert len(countingBuilder.calls) == 1
+    assert redisClient.ttl(RESPONSE_CACHE_KEY.format('p1-v1')) > 0
+
+
+def test_follower_waits_for_lock_holder(redisClient, countingBuilder, fastRebuildWait):
+    key = RESPONSE_CACHE_KEY.format('p1-v1')
+    lock = redisClient.lock(key + ':lock', timeout=10)
+    assert lock.acquire(blocking=False)
+    # 락을 가진 다른 워커가 잠시 뒤 캐시를 채운다
+    filler = threading.Timer(0.05, lambda: redisClient.set(key, '{"built": "leader"}'))
+    filler.start()
+
+    body = getCachedJson('p1-v1', countingBuilder)
+
+    filler.join()
+    assert json.loads(body) == {'built': 'leader'}
+    assert countingBuilder.calls == []
+
+
+def test_follower_builds_itself_when_lock_holder_dies(redisClient, countingBuilder, fastRebuildWait):
+    key = RESPONSE_CACHE_KEY.format('p1-v1')
+    lock = redisClient.lock(key + ':lock', timeout=0.3)
+    assert lock.acquire(blocking=False)
+
+    # 락을 가진 워커가 캐시를 채우지 못하면 기다리다가 직접 만들고, 락은 건드리지 않는다
+    body = getCachedJson('p1-v1', countingBuilder)
+
+    assert json.loads(body) == {'built': 1}
+    assert not redisClient.exists(key)
+
+    # 락이 만료되면 다음 요청이 다시 만들어 캐시를 채운다
+    threading.Event().wait(0.3)
+    assert json.loads(getCachedJson('p1-v1', countingBuilder)) == {'built': 2}
+    assert redisClient.exists(key)
+
+
+def test_cached_project_detail_excludes_secret_values(app, redisClient, user, makeProject):
+    project = makeProject()
+    db.session.add(Secret(project_id=project.id, key='API_KEY', value='hunter2'))
+    db.session.add(Token(user_id=user.id, access_token='token'))
+    db.session.commit()
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer token'}
+
+    for _ in range(2):
+        response = client.get(f'/project/{project.id}', headers=headers)
+        assert response.status_code == 200
+        assert response.get_json()['secrets'] == [{'key': 'API_KEY', 'value': 'hunter2'}]
+
+    cachedKeys = redisClient.keys(RESPONSE_CACHE_KEY.format('*'))
+    assert cachedKeys
+    assert all('hunter2' not in redisClient.get(key) for key in cachedKeys)
@@ -0,0 +1,106 @@
+import hashlib
+import hmac
+import json
+
+import pytest
+
+from route import db
+from route.models import Build
+from route.project import commits
+from route.project.commits import getLatestCommit, recordPushEvent, verifyWebhookSignature, LATEST_COMMIT_KEY
+from route.project.error import InvalidWebhookSignatureError
+
+SHA = 'a1b2c3d4e5f6a7b8c9d0a1b2c3d4e5f6a7b8c9d0'
+
+
+def pushPayload(sha=SHA, message='push commit', timestamp='2024-05-01T12:00:00Z'):
+    return {'ref': 'refs/heads/main',
+            'repository': {'name': 'sample', 'owner': {'login': 'tester'}},
+            'head_commit': {'id': sha, 'message': message, 'timestamp': timestamp}}
+
+
+def sign(body, secret='secret'):
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+@pytest.fixture
+def webhookSecret(monkeypatch):
+    monkeypatch.setenv('GITHUB_WEBHOOK_SECRET', 'secret')
+
+
+@pytest.fixture
+def githubCommits(monkeypatch):
+    calls = []
+
+    def getCurrentCommitMessage(projectName, user, token):
+        calls.append(projectName)
+        return 'github commit', 'f' * 40
+    monkeypatch.setattr(commits, 'getCurrentCommitMessage', getCurrentCommitMessage)
+    return calls
+
+
+@pytest.mark.parametrize('signature', [None, 'sha256=0000', sign(b'{}', 'other')])
+def test_invalid_signature_is_rejected(webhookSecret, signature):
+    with pytest.raises(InvalidWebhookSignatureError):
+        verifyWebhookSignature(b'{}', signature)
+
+
+def test_signature_is_required_without_secret(monkeypatch):
+    monkeypatch.delenv('GITHUB_WEBHOOK_SECRET', raising=False)
+
+    with pytest.raises(InvalidWebhookSignatureError):
+        verifyWebhookSignature(b'{}', sign(b'{}'))
+
+
+def test_unsigned_push_is_unauthorized(app, redisClient, webhookSecret, makeProject):
+    project = makeProject()
+    body = json.dumps(pushPayload()).encode()
+
+    response = app.test_client().post('/project/github/push', data=body, content_type='application/json',
+                                      headers={'X-GitHub-Event': 'push', 'X-Hub-Signature-256': sign(body, 'other')})
+
+    assert response.status_code == 401
+    assert project.latest_commit_sha is None
+    assert not redisClient.exists(LATEST_COMMIT_KEY.format(project.id))
+
+
+def test_signed_push_fills_commit_cache(app, redisClient, webhookSecret, makeProject):
+    project = makeProject()
+    body = json.dumps(pushPayload()).encode()
+
+    response = app.test_client().post('/project/github/push', data=body, content_type='application/json',
+                                      headers={'X-GitHub-Event': 'push', 'X-Hub-Signature-256': sign(body)})
+
+    assert response.status_code == 200
+    assert redisClient.hgetall(LATEST_COMMIT_KEY.format(project.id))['sha'] == SHA
+    db.session.expire_all()
+    assert project.latest_commit_sha == SHA
+
+
+def test_older_push_does_not_overwrite_newer_commit(redisClient, makeProject):
+    project = makeProject()
+    recordPushEvent(pushPayload())
+
+    assert recordPushEvent(pushPayload('0' * 40, 'older', '2024-04-01T12:00:00Z')) == 0
+    assert redisClient.hgetall(LATEST_COMMIT_KEY.format(project.id))['sha'] == SHA
+
+
+def test_cached_commit_skips_github(redisClient, makeProject, user, githubCommits):
+    project = makeProject()
+    recordPushEvent(pushPayload())
+
+    assert getLatestCommit(project, user, 'token') == ('push commit', SHA)
+    assert githubCommits == []
+
+
+def test_already_built_commit_falls_back_to_github(redisClient, makeProject, user, githubCommits):
+    project = makeProject()
+    recordPushEvent(pushPayload())
+    db.session.add(Build(project_id=project.id, commit_msg='push commit', image_name='sample', image_tag=SHA[:7]))
+    db.session.commit()
+
+    assert getLatestCommit(project, user, 'token') == ('github commit', 'f' * 40)
+    assert githubCommits == ['sample']
+    # GitHub에서 받은 커밋으로 캐시를 채워 다음 요청은 GitHub를 부르지 않는다
+    assert getLatestCommit(project, user, 'token') == ('github commit', 'f' * 40)
+    assert githubCommits == ['sample']
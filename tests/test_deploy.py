@@ -0,0 +1,106 @@
+import subprocess
+
+import pytest
+
+from route import db
+from route.models import Build, Project, Token
+from route.project import deploy, task
+from route.project.buildevents import applyBuildEvents
+from route.project.deploy import deployWithKubeApi, HELM_DESIRED_KEY, HELM_DESIRED_TTL
+from route.project.kube import FakeKubeBackend, setKubeBackend
+from route.project.teardown import teardownProject, handleTeardownFailure, TEARDOWN_JOB
+from route.project.status import DELETING_STATUS
+from route.project.sweeper import requeueStuckProjects
+from route.queue import findQueuedPayloads
+
+
+class RecordingHelm:
+    def __init__(self):
+        self.upgrades = []
+
+    def upgrade(self, releaseName, chartName, values, **kwargs):
+        self.upgrades.append((releaseName, chartName, values))
+        return subprocess.CompletedProcess([], 0, '', '')
+
+
+@pytest.fixture
+def kubeBackend():
+    backend = FakeKubeBackend()
+    setKubeBackend(backend)
+    yield backend
+    setKubeBackend(None)
+
+
+@pytest.fixture
+def helm(monkeypatch):
+    helm = RecordingHelm()
+    monkeypatch.setattr(task, 'getHelmService', lambda: helm)
+    return helm
+
+
+def test_both_deploy_paths_use_the_chart_default_port(redisClient, kubeBackend, helm, monkeypatch):
+    monkeypatch.setattr(deploy, 'enqueueJob', lambda kind, payload: None)
+    kubeBackend.addRollout('sample', 'sample', containerPort=3000)
+
+    deployWithKubeApi('sample', '0000001', None)
+    task.deployWithHelm('sample', '0000001', None)
+
+    container = kubeBackend.getRollout('sample', 'sample')['spec']['template']['spec']['containers'][0]
+    assert container['ports'][0]['containerPort'] == task.DEFAULT_TARGET_PORT
+    assert helm.upgrades[0][2]['image']['targetPort'] == task.DEFAULT_TARGET_PORT
+
+
+def test_desired_tag_expires_and_is_removed_on_teardown(redisClient, kubeBackend, helm, makeProject, monkeypatch):
+    monkeypatch.setattr(deploy, 'enqueueJob', lambda kind, payload: None)
+    kubeBackend.addRollout('sample', 'sample')
+    project = makeProject('sample', status=DELETING_STATUS)
+
+    deployWithKubeApi('sample', '0000001', 8080)
+    assert 0 < redisClient.ttl(HELM_DESIRED_KEY.format('sample')) <= HELM_DESIRED_TTL
+
+    # 모든 정리 단계가 이미 끝난 상태로 만들어 행 삭제와 키 정리만 확인한다
+    monkeypatch.setattr('route.project.teardown.buildTeardownSteps', lambda project: [])
+    teardownProject({'projectId': project.id})
+    assert not redisClient.exists(HELM_DESIRED_KEY.format('sample'))
+
+
+def test_failed_teardown_keeps_project_for_the_sweeper(redisClient, makeProject):
+    project = makeProject('sample', status=DELETING_STATUS)
+
+    handleTeardownFailure({'projectId': project.id}, RuntimeError('helm failed'))
+
+    db.session.expire_all()
+    assert db.session.get(Project, project.id).status == DELETING_STATUS
+    # 스위퍼가 삭제 작업을 다시 넣어 정리가 끝날 때까지 재시도한다
+    requeueStuckProjects()
+    assert findQueuedPayloads(TEARDOWN_JOB) == [{'projectId': project.id}]
+
+
+@pytest.fixture
+def deletingProject(app, redisClient, user, makeProject):
+    project = makeProject('sample', status=DELETING_STATUS)
+    build = Build(project_id=project.id, commit_msg='c', image_name='sample', image_tag='0000001')
+    db.session.add(build)
+    db.session.add(Token(user_id=user.id, access_token='token'))
+    db.session.commit()
+    return project, build
+
+
+def test_build_and_deploy_of_deleting_project_are_rejected(app, deletingProject):
+    project, build = deletingProject
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer token'}
+
+    assert client.post('/project/build', json={'id': project.id}, headers=headers).status_code == 409
+    assert client.post('/project/deploy', json={'id': build.id}, headers=headers).status_code == 409
+    event = {'projectId': project.id, 'imageTag': '0000002', 'status': 'build-success'}
+    assert app.test_client().post('/project/build/event', json=event).status_code == 409
+
+
+def test_queued_build_event_of_deleting_project_is_ignored(deletingProject):
+    project, _ = deletingProject
+
+    applyBuildEvents([{'projectId': project.id, 'imageTag': '0000002', 'status': 'build-success'}])
+
+    assert Build.query.filter_by(project_id=project.id).count() == 1
+    assert db.session.get(Project, project.id).status == DELETING_STATUS
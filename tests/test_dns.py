@@ -0,0 +1,163 @@
+import pytest
+
+from route.project import dns
+from route.project.commands import migrateToWildcard
+from route.project.dns import DnsChangeCoalescer, DnsChangeError, FakeDnsBackend, makeARecord, setDnsBackend, \
+    initWildcardMode, isWildcardMode, WILDCARD_RECORD_NAMES
+
+
+@pytest.fixture
+def backend():
+    return FakeDnsBackend()
+
+
+@pytest.fixture
+def dnsBackend(backend, monkeypatch):
+    # 모듈 전역 백엔드와 와일드카드 모드를 테스트가 끝나면 되돌린다
+    monkeypatch.setattr(dns, '_wildcardMode', False)
+    setDnsBackend(backend)
+    yield backend
+    setDnsBackend(None)
+
+
+def addWildcardRecords(backend):
+    backend.applyChange(additions=[makeARecord(name) for name in WILDCARD_RECORD_NAMES])
+
+
+def test_changes_in_one_window_are_sent_as_one_change(backend):
+    coalescer = DnsChangeCoalescer(backend, window=0.05)
+
+    futures = [coalescer.add(makeARecord(f'app{index}.pitapat.ne.kr')) for index in range(3)]
+    # 같은 레코드를 다시 요청하면 하나로 합쳐진다
+    futures.append(coalescer.add(makeARecord('app1.pitapat.ne.kr')))
+
+    responses = [future.result(timeout=2) for future in futures]
+    assert backend.calls == 1
+    assert len(backend.records) == 3
+    assert len(responses[0]['additions']) == 3
+
+
+def test_add_and_delete_in_one_window_cancel_out(backend):
+    coalescer = DnsChangeCoalescer(backend, window=10)
+    record = makeARecord('app.pitapat.ne.kr')
+
+    added = coalescer.add(record)
+    deleted = coalescer.delete(record)
+    coalescer.flush()
+
+    assert added.result(timeout=0)['status'] == 'cancelled'
+    assert deleted.result(timeout=0)['status'] == 'cancelled'
+    assert backend.calls == 0
+
+
+def test_failed_batch_falls_back_to_one_change_per_record(backend):
+    # Cloud DNS는 이미 있는 레코드를 추가하면 change 전체를 409로 거절한다
+    backend.applyChange(additions=[makeARecord('taken.pitapat.ne.kr')])
+    coalescer = DnsChangeCoalescer(backend, window=10)
+
+    fresh = coalescer.add(makeARecord('fresh.pitapat.ne.kr'))
+    taken = coalescer.add(makeARecord('taken.pitapat.ne.kr'))
+    missing = coalescer.delete(makeARecord('missing.pitapat.ne.kr'))
+    coalescer.flush()
+
+    assert fresh.result(timeout=0)['additions'][0]['name'] == 'fresh.pitapat.ne.kr.'
+    with pytest.raises(DnsChangeError):
+        taken.result(timeout=0)
+    with pytest.raises(DnsChangeError):
+        missing.result(timeout=0)
+    # 준비용 1번 + 묶음 1번 + 레코드별 3번
+    assert backend.calls == 5
+    assert ('fresh.pitapat.ne.kr.', 'A') in backend.records
+
+
+def test_full_batch_is_sent_without_waiting_for_the_window(backend):
+    coalescer = DnsChangeCoalescer(backend, window=10, maxBatchSize=2)
+
+    first = coalescer.add(makeARecord('first.pitapat.ne.kr'))
+    second = coalescer.add(makeARecord('second.pitapat.ne.kr'))
+
+    assert first.result(timeout=2) is second.result(timeout=2)
+    assert backend.calls == 1
+
+
+def test_wildcard_mode_is_off_unless_requested(app, dnsBackend, monkeypatch):
+    monkeypatch.delenv('DNS_WILDCARD_MODE', raising=False)
+    addWildcardRecords(dnsBackend)
+
+    initWildcardMode(app)
+
+    assert not isWildcardMode()
+
+
+def test_wildcard_mode_is_on_when_records_exist(app, dnsBackend, monkeypatch):
+    monkeypatch.setenv('DNS_WILDCARD_MODE', 'true')
+    addWildcardRecords(dnsBackend)
+
+    initWildcardMode(app)
+
+    assert isWildcardMode()
+
+
+def test_wildcard_mode_falls_back_when_records_are_missing(app, dnsBackend, monkeypatch):
+    monkeypatch.setenv('DNS_WILDCARD_MODE', 'true')
+    dnsBackend.applyChange(additions=[makeARecord(WILDCARD_RECORD_NAMES[0])])
+
+    initWildcardMode(app)
+
+    assert not isWildcardMode()
+
+
+def test_wildcard_mode_falls_back_when_backend_fails(app, dnsBackend, monkeypatch):
+    monkeypatch.setenv('DNS_WILDCARD_MODE', 'true')
+
+    def failListRecords(name=None, recordType=None):
+        raise DnsChangeError('unavailable')
+    monkeypatch.setattr(dnsBackend, 'listRecords', failListRecords)
+
+    initWildcardMode(app)
+
+    assert not isWildcardMode()
+
+
+@pytest.fixture
+def explicitRecords(dnsBackend, makeProject):
+    makeProject('first')
+    makeProject('second')
+    dnsBackend.applyChange(additions=[
+        makeARecord('first.pitapat.ne.kr'),
+        makeARecord('first-ci.webhook.pitapat.ne.kr'),
+        makeARecord('second.pitapat.ne.kr'),
+        # 인그레스가 아닌 곳을 가리키는 레코드는 건드리지 않는다
+        dict(makeARecord('second-ci.webhook.pitapat.ne.kr'), rrdatas=['10.0.0.1']),
+    ])
+    return dnsBackend
+
+
+def test_migrate_wildcard_requires_wildcard_records(app, explicitRecords):
+    result = app.test_cli_runner().invoke(migrateToWildcard, [])
+
+    assert result.exit_code != 0
+    assert 'use --create-wildcard' in result.output
+    assert len(explicitRecords.records) == 4
+
+
+def test_migrate_wildcard_dry_run_changes_nothing(app, explicitRecords):
+    result = app.test_cli_runner().invoke(migrateToWildcard, ['--create-wildcard'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Would delete first.pitapat.ne.kr.' in result.output
+    assert 'second-ci.webhook' not in result.output
+    assert '3 explicit record(s) to delete' in result.output
+    assert len(explicitRecords.records) == 4
+
+
+def test_migrate_wildcard_apply_replaces_explicit_records(app, explicitRecords):
+    result = app.test_cli_runner().invoke(migrateToWildcard, ['--create-wildcard', '--apply'])
+
+    assert result.exit_code == 0, result.output
+    assert '3 explicit record(s) deleted' in result.output
+    assert set(explicitRecords.records) == {
+        (WILDCARD_RECORD_NAMES[0], 'A'),
+        (WILDCARD_RECORD_NAMES[1], 'A'),
+        ('second-ci.webhook.pitapat.ne.kr.', 'A'),
+    }
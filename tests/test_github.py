@@ -0,0 +1,130 @@
+import pytest
+
+from benchmarks.fake_github import FakeGithubServer
+from route import github
+from route.github import GithubClient
+from route.metrics import getCounters
+from route.models import User, Token
+from route.project.error import GithubRateLimitError
+from route.project.utils import getCurrentCommitMessage
+
+COMMITS_PATH = '/repos/tester/sample/commits'
+
+
+@pytest.fixture
+def fakeGithub():
+    server = FakeGithubServer().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def counter(name):
+    return getCounters().get(name, 0)
+
+
+def test_params_are_sent_as_a_query_string(redisClient, fakeGithub):
+    client = GithubClient(apiUrl=fakeGithub.url)
+
+    status, body = client.get(COMMITS_PATH, 'token', {'per_page': 1, 'sha': 'main branch'})
+
+    assert status == 200
+    assert body[0]['commit']['message'] == 'fake commit'
+    assert fakeGithub.paths == [f'{COMMITS_PATH}?per_page=1&sha=main+branch']
+
+
+def test_not_modified_response_is_served_from_cache(redisClient, fakeGithub):
+    client = GithubClient(apiUrl=fakeGithub.url)
+    hitsBefore = counter('github.etag.hit')
+
+    first = client.get(COMMITS_PATH, 'token', {'per_page': 1})
+    second = client.get(COMMITS_PATH, 'token', {'per_page': 1})
+
+    assert first == second
+    assert len(fakeGithub.paths) == 2
+    assert fakeGithub.charged == 1
+    assert counter('github.etag.hit') == hitsBefore + 1
+
+
+def test_cache_is_per_token(redisClient, fakeGithub):
+    client = GithubClient(apiUrl=fakeGithub.url)
+
+    client.get(COMMITS_PATH, 'first', {'per_page': 1})
+    client.get(COMMITS_PATH, 'second', {'per_page': 1})
+
+    assert fakeGithub.charged == 2
+
+
+def test_rate_limit_is_tracked_per_token(redisClient, fakeGithub):
+    client = GithubClient(apiUrl=fakeGithub.url)
+
+    client.get('/user', 'token')
+
+    rateLimit = client.getRateLimit('token')
+    assert rateLimit['limit'] == 5000
+    assert rateLimit['remaining'] == 4999
+    assert client.getRateLimit('other') is None
+
+
+def test_stale_body_is_served_while_rate_limited(redisClient, fakeGithub):
+    fakeGithub.rateLimit = 1
+    client = GithubClient(apiUrl=fakeGithub.url)
+    staleBefore = counter('github.ratelimit.served_stale')
+
+    status, body = client.get(COMMITS_PATH, 'token', {'per_page': 1})
+    assert client.getRateLimit('token')['remaining'] == 0
+
+    assert client.get(COMMITS_PATH, 'token', {'per_page': 1}) == (status, body)
+    assert len(fakeGithub.paths) == 1
+    assert counter('github.ratelimit.served_stale') == staleBefore + 1
+
+
+def test_rate_limited_request_is_rejected_without_stale_body(redisClient, fakeGithub):
+    fakeGithub.rateLimit = 1
+    client = GithubClient(apiUrl=fakeGithub.url)
+
+    client.get(COMMITS_PATH, 'token', {'per_page': 1})
+
+    assert client.get(COMMITS_PATH, 'token', {'per_page': 1}, allowStale=False) == (429, None)
+    assert len(fakeGithub.paths) == 1
+
+
+def test_rate_limit_response_is_reported_as_429(redisClient, fakeGithub):
+    fakeGithub.rateLimit = 0
+    client = GithubClient(apiUrl=fakeGithub.url)
+
+    assert client.get(COMMITS_PATH, 'token', {'per_page': 1}) == (429, None)
+
+
+@pytest.fixture
+def githubClient(fakeGithub, monkeypatch):
+    client = GithubClient(apiUrl=fakeGithub.url, oauthUrl=fakeGithub.url)
+    monkeypatch.setattr(github, '_client', client)
+    return client
+
+
+def test_build_commit_is_not_served_stale_while_rate_limited(redisClient, fakeGithub, githubClient, user):
+    fakeGithub.rateLimit = 1
+    assert getCurrentCommitMessage('sample', user, 'token') == \
+        ('fake commit', 'a1b2c3d4e5f6a7b8c9d0a1b2c3d4e5f6a7b8c9d0')
+
+    with pytest.raises(GithubRateLimitError):
+        getCurrentCommitMessage('sample', user, 'token')
+
+
+def test_login_creates_user(app, redisClient, githubClient):
+    response = app.test_client().post('/user/login', json={'code': 'code'})
+
+    assert response.status_code == 200
+    assert response.headers['Authorization'] == 'Bearer gho_fake'
+    user = User.query.filter_by(login='fake').one()
+    assert Token.query.filter_by(user_id=user.id).one().access_token == 'gho_fake'
+
+
+def test_login_with_rejected_token_is_unauthorized(app, redisClient, fakeGithub, githubClient):
+    fakeGithub.revokedTokens.add('gho_fake')
+
+    response = app.test_client().post('/user/login', json={'code': 'code'})
+
+    assert response.status_code == 401
+    assert User.query.count() == 0
@@ -0,0 +1,145 @@
+import json
+import subprocess
+import threading
+import time
+
+import pytest
+
+from route.project import helm as helmModule
+from route.project.helm import HelmService, RELEASE_LOCK_KEY
+
+
+class FakeHelmBinary:
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.commands = []
+        self.status = 'deployed'
+        self.revision = 1
+
+    def __call__(self, command, capture_output=True, text=True, input=None, timeout=None):
+        self.commands.append((command, input))
+        if self.delay:
+            time.sleep(self.delay)
+        if command[1] == 'status':
+            return subprocess.CompletedProcess(command, 0, json.dumps({'info': {'status': self.status},
+                                                                       'version': self.revision}), '')
+        if command[1] == 'upgrade':
+            self.revision += 1
+            return subprocess.CompletedProcess(command, 0, f'Release has been upgraded.\nREVISION: {self.revision}\n', '')
+        return subprocess.CompletedProcess(command, 0, '', '')
+
+
+@pytest.fixture
+def helmBinary(monkeypatch):
+    binary = FakeHelmBinary()
+    monkeypatch.setattr(helmModule.subprocess, 'run', binary)
+    return binary
+
+
+def makeService(**kwargs):
+    service = HelmService(**kwargs)
+    service._charts['app-template'] = '/charts/app-template.tgz'
+    return service
+
+
+def test_lock_timeout_fails_without_running_helm(redisClient, helmBinary):
+    # 다른 프로세스가 잠금을 잡고 있는 상태
+    redisClient.set(RELEASE_LOCK_KEY.format('sample'), 'other', ex=60)
+    service = makeService(lockWait=0.1)
+
+    result = service.run('sample', ['helm', 'delete', '-n', 'default', 'sample'])
+
+    assert result.returncode != 0
+    assert 'Timed out waiting for the lock' in result.stderr
+    assert helmBinary.commands == []
+
+
+def test_waiting_for_a_lock_does_not_take_a_parallel_slot(app, redisClient, helmBinary):
+    redisClient.set(RELEASE_LOCK_KEY.format('locked'), 'other', ex=60)
+    service = makeService(maxParallel=1, lockWait=1)
+
+    def runLocked():
+        with app.app_context():
+            service.run('locked', ['helm', 'delete', '-n', 'default', 'locked'])
+    waiter = threading.Thread(target=runLocked)
+    waiter.start()
+    time.sleep(0.1)
+
+    startedAt = time.monotonic()
+    result = service.run('free', ['helm', 'delete', '-n', 'default', 'free'])
+    elapsed = time.monotonic() - startedAt
+    waiter.join()
+
+    assert result.returncode == 0
+    assert elapsed < 0.5
+
+
+def test_redis_error_falls_back_to_local_lock(redisClient, helmBinary, monkeypatch):
+    from redis.exceptions import ConnectionError
+
+    def failingLock(*args, **kwargs):
+        raise ConnectionError('redis is down')
+    monkeypatch.setattr(redisClient, 'lock', lambda *args, **kwargs: type('L', (), {'acquire': failingLock})())
+    service = makeService()
+
+    result = service.run('sample', ['helm', 'delete', '-n', 'default', 'sample'])
+
+    assert result.returncode == 0
+    assert len(helmBinary.commands) == 1
+
+
+def upgradeInputs(helmBinary):
+    return [json.loads(input) for command, input in helmBinary.commands if command[1] == 'upgrade']
+
+
+def test_unchanged_values_skip_only_when_the_recorded_revision_is_deployed(redisClient, helmBinary):
+    service = makeService()
+    values = {'image': {'tag': 'v1', 'repository': 'sample'}}
+    service.upgrade('sample', 'app-template', values)
+
+    result = service.upgrade('sample', 'app-template', values)
+
+    assert result.returncode == 0
+    assert len(upgradeInputs(helmBinary)) == 1
+
+
+def test_failed_release_gets_full_values(redisClient, helmBinary):
+    service = makeService()
+    values = {'image': {'tag': 'v1', 'repository': 'sample'}}
+    service.upgrade('sample', 'app-template', values)
+    helmBinary.status = 'failed'
+
+    service.upgrade('sample', 'app-template', {'image': {'tag': 'v1', 'repository': 'sample'}})
+
+    assert upgradeInputs(helmBinary)[-1] == values
+
+
+def test_release_changed_outside_the_service_gets_full_values(redisClient, helmBinary):
+    service = makeService()
+    service.upgrade('sample', 'app-template', {'image': {'tag': 'v1', 'repository': 'sample'}})
+    # helm rollback 등으로 리비전이 바뀐 상태
+    helmBinary.revision += 1
+
+    service.upgrade('sample', 'app-template', {'image': {'tag': 'v2', 'repository': 'sample'}})
+
+    assert upgradeInputs(helmBinary)[-1] == {'image': {'tag': 'v2', 'repository': 'sample'}}
+
+
+def test_changed_values_send_only_the_delta(redisClient, helmBinary):
+    service = makeService()
+    service.upgrade('sample', 'app-template', {'image': {'tag': 'v1', 'repository': 'sample'}})
+
+    service.upgrade('sample', 'app-template', {'image': {'tag': 'v2', 'repository': 'sample'}})
+
+    assert upgradeInputs(helmBinary)[-1] == {'image': {'tag': 'v2'}}
+
+
+def test_forced_redeploy_sends_full_values(redisClient, helmBinary):
+    service = makeService()
+    values = {'image': {'tag': 'v1', 'repository': 'sample'}}
+    service.upgrade('sample', 'app-template', values)
+
+    service.upgrade('sample', 'app-template', values, force=True)
+
+    assert upgradeInputs(helmBinary) == [values, values]
+    assert not any(command[1] == 'status' for command, input in helmBinary.commands)
@@ -0,0 +1,147 @@
+import socket
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from route.httpclient import HttpClient, CircuitOpenError
+
+
+class StubServer:
+    # 요청마다 준비해 둔 (상태 코드, 지연 시간)을 차례로 돌려주고, 마지막 응답은 계속 반복한다
+    def __init__(self):
+        self.responses = [(200, 0)]
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+                stub.requests.append(self.command)
+                status, delay = stub.responses.pop(0) if len(stub.responses) > 1 else stub.responses[0]
+                if delay:
+                    time.sleep(delay)
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            do_GET = do_POST = _respond
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+def makeClient(**kwargs):
+    kwargs.setdefault('timeout', (1, 0.2))
+    return HttpClient('test', backoff=0, **kwargs)
+
+
+def closedPortUrl():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return f'http://127.0.0.1:{sock.getsockname()[1]}/'
+
+
+def test_idempotent_request_retries_on_read_timeout(stub):
+    stub.responses = [(200, 0.5), (200, 0)]
+
+    response = makeClient().get(stub.url)
+
+    assert response.status_code == 200
+    assert stub.requests == ['GET', 'GET']
+
+
+def test_post_is_not_retried_after_read_timeout(stub):
+    stub.responses = [(200, 0.5)]
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        makeClient().post(stub.url, json={})
+
+    assert stub.requests == ['POST']
+
+
+def test_post_is_retried_when_connect_fails(monkeypatch):
+    client = makeClient(maxRetries=2)
+    attempts = []
+    monkeypatch.setattr(client, '_sleepBeforeRetry', attempts.append)
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.post(closedPortUrl(), json={})
+
+    assert attempts == [1, 2]
+
+
+def test_idempotent_request_retries_on_gateway_errors(stub):
+    stub.responses = [(502, 0), (504, 0), (200, 0)]
+
+    response = makeClient().get(stub.url)
+
+    assert response.status_code == 200
+    assert len(stub.requests) == 3
+
+
+def test_post_is_retried_only_on_service_unavailable(stub):
+    stub.responses = [(502, 0)]
+    assert makeClient().post(stub.url, json={}).status_code == 502
+    assert stub.requests == ['POST']
+
+    stub.requests.clear()
+    stub.responses = [(503, 0), (200, 0)]
+    assert makeClient().post(stub.url, json={}).status_code == 200
+    assert stub.requests == ['POST', 'POST']
+
+
+def test_circuit_opens_after_consecutive_failures(stub):
+    stub.responses = [(500, 0)]
+    client = makeClient(failureThreshold=2, resetTimeout=60)
+    client.get(stub.url)
+    client.get(stub.url)
+
+    with pytest.raises(CircuitOpenError):
+        client.get(stub.url)
+
+    assert len(stub.requests) == 2
+
+
+def test_half_open_circuit_sends_one_probe(stub):
+    stub.responses = [(500, 0)]
+    client = makeClient(failureThreshold=1, resetTimeout=0.1)
+    client.get(stub.url)
+    time.sleep(0.15)
+
+    # 시험 요청이 실패하면 다시 열린다
+    assert client.get(stub.url).status_code == 500
+    with pytest.raises(CircuitOpenError):
+        client.get(stub.url)
+
+    time.sleep(0.15)
+    stub.responses = [(200, 0)]
+    breaker = client._breaker(f'127.0.0.1:{stub.server.server_port}')
+    assert breaker.allow()
+    # 시험 요청이 진행 중인 동안 다른 요청은 막는다
+    assert not breaker.allow()
+    breaker.recordSuccess()
+
+    assert client.get(stub.url).status_code == 200
+    assert len(stub.requests) == 3
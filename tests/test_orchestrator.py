@@ -0,0 +1,113 @@
+import threading
+
+import pytest
+
+from route import db
+from route.models import Project, Token
+from route.project import provision
+from route.project.orchestrator import Step, StepFailedError, runSteps
+from route.project.provision import provisionProject, getProvisioningState
+from route.project.status import PROVISIONED_STATUS, PROVISIONING_STATUS
+
+
+def recordingStep(name, log, dependsOn=(), fail=False):
+    def run():
+        log.append(f'run:{name}')
+        if fail:
+            raise RuntimeError(f'{name} failed')
+        return name
+    return Step(name, run, dependsOn=dependsOn, rollback=lambda: log.append(f'rollback:{name}'))
+
+
+def test_dependencies_run_first():
+    log = []
+
+    results = runSteps([recordingStep('deploy', log, dependsOn=['build']),
+                        recordingStep('build', log, dependsOn=['fetch']),
+                        recordingStep('fetch', log)])
+
+    assert log == ['run:fetch', 'run:build', 'run:deploy']
+    assert results == {'fetch': 'fetch', 'build': 'build', 'deploy': 'deploy'}
+
+
+def test_independent_steps_run_in_parallel():
+    # 두 단계가 동시에 실행되어야만 barrier를 통과한다
+    barrier = threading.Barrier(2, timeout=2)
+
+    runSteps([Step('first', barrier.wait), Step('second', barrier.wait)], maxWorkers=2)
+
+
+def test_failure_rolls_back_completed_steps_in_reverse():
+    log = []
+    steps = [recordingStep('first', log), recordingStep('second', log, dependsOn=['first']),
+             recordingStep('third', log, dependsOn=['second'], fail=True),
+             recordingStep('fourth', log, dependsOn=['third'])]
+
+    with pytest.raises(StepFailedError) as error:
+        runSteps(steps)
+
+    assert error.value.stepName == 'third'
+    assert log == ['run:first', 'run:second', 'run:third', 'rollback:second', 'rollback:first']
+
+
+def test_steps_done_in_an_earlier_attempt_are_rolled_back_too():
+    log = []
+
+    with pytest.raises(StepFailedError):
+        runSteps([recordingStep('second', log, dependsOn=['first'], fail=True)],
+                 doneSteps=[recordingStep('first', log)])
+
+    assert log == ['run:second', 'rollback:first']
+
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(ValueError):
+        runSteps([Step('deploy', lambda: None, dependsOn=['build'])])
+
+
+@pytest.fixture
+def provisioningCalls(monkeypatch):
+    calls = []
+    failing = set()
+
+    def record(name):
+        def call(*args, **kwargs):
+            calls.append(name)
+            if name in failing:
+                raise RuntimeError(f'{name} failed')
+        return call
+    for name in ('installCiChart', 'installAppChart', 'uninstallRelease', 'addDnsRecord', 'deleteDnsRecord'):
+        monkeypatch.setattr(provision, name, record(name))
+    monkeypatch.setattr(provision, 'isWildcardMode', lambda: False)
+    return calls, failing
+
+
+def test_provisioning_runs_every_step(redisClient, makeProject, provisioningCalls):
+    calls, failing = provisioningCalls
+    project = makeProject(status=PROVISIONING_STATUS)
+    db.session.add(Token(user_id=project.user_id, access_token='token'))
+    db.session.commit()
+
+    provisionProject({'projectId': project.id})
+
+    assert db.session.get(Project, project.id).status == PROVISIONED_STATUS
+    assert sorted(calls) == ['addDnsRecord', 'addDnsRecord', 'installAppChart',
+                                                      'installCiChart']
+
+
+def test_failed_retry_rolls_back_steps_from_earlier_attempts(redisClient, makeProject, provisioningCalls):
+    calls, failing = provisioningCalls
+    project = makeProject(status=PROVISIONING_STATUS)
+    db.session.add(Token(user_id=project.user_id, access_token='token'))
+    db.session.commit()
+    projectId = project.id
+    # 이전 시도에서 helm-ci까지 끝내고 워커가 죽은 상태
+    provision._recordState(projectId, 'helm-ci', {'status': 'done'})
+    failing.add('installAppChart')
+
+    with pytest.raises(StepFailedError):
+        provisionProject({'projectId': projectId})
+
+    assert 'installCiChart' not in calls
+    assert calls.count('uninstallRelease') == 1
+    assert getProvisioningState(projectId)['helm-ci']['status'] == 'rolled-back'
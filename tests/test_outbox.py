@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from redis.exceptions import RedisError
+
+from route import db
+from route.models import Outbox
+from route.project import outbox
+from route.project.outbox import relayOutboxOnce
+from route.project.utils import queueSseMessage
+from route.sse import SSE_STREAM_KEY
+
+
+def streamedMessages(redisClient, channel):
+    return [json.loads(fields['message'])['data']
+            for entryId, fields in redisClient.xrange(SSE_STREAM_KEY.format(channel))]
+
+
+def test_committed_message_is_published_by_one_pass(redisClient, makeProject):
+    project = makeProject()
+    project.status = 1
+    queueSseMessage(f'{project.user_id}', {'projectId': project.id, 'status': 1})
+    db.session.commit()
+
+    assert relayOutboxOnce() == 1
+
+    assert streamedMessages(redisClient, project.user_id) == [{'projectId': project.id, 'status': 1}]
+    assert Outbox.query.count() == 0
+
+
+def test_rolled_back_message_is_never_published(redisClient, makeProject):
+    project = makeProject()
+    userId, projectId = project.user_id, project.id
+    project.status = 1
+    queueSseMessage(f'{userId}', {'projectId': projectId, 'status': 1})
+    db.session.rollback()
+
+    assert relayOutboxOnce() == 0
+    assert streamedMessages(redisClient, userId) == []
+
+
+def test_only_the_latest_row_per_project_is_sent(redisClient, makeProject):
+    first = makeProject('first')
+    second = makeProject('second')
+    for status in (1, 2, 3):
+        queueSseMessage(f'{first.user_id}', {'projectId': first.id, 'status': status})
+        db.session.commit()
+    queueSseMessage(f'{second.user_id}', {'projectId': second.id, 'status': 1})
+    db.session.commit()
+
+    assert relayOutboxOnce() == 4
+
+    assert streamedMessages(redisClient, first.user_id) == [{'projectId': first.id, 'status': 3},
+                                                           {'projectId': second.id, 'status': 1}]
+
+
+def test_rows_are_kept_when_publishing_fails(redisClient, makeProject, monkeypatch):
+    project = makeProject()
+    queueSseMessage(f'{project.user_id}', {'projectId': project.id, 'status': 1})
+    db.session.commit()
+
+    def failingPublish(events):
+        raise RedisError('redis is down')
+    monkeypatch.setattr(outbox, 'publishEvents', failingPublish)
+    with pytest.raises(RedisError):
+        relayOutboxOnce()
+    db.session.rollback()
+    assert Outbox.query.count() == 1
+
+    monkeypatch.undo()
+    assert relayOutboxOnce() == 1
+    assert Outbox.query.count() == 0
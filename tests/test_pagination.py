@@ -0,0 +1,86 @@
+import pytest
+
+from route import db
+from route.models import Build, Deploy, Token
+from route.project.error import InvalidPaginationError
+from route.project.utils import parsePaginationArgs, fetchBuildPage, fetchDeployPage, getProjectDetailById
+
+
+@pytest.fixture
+def history(makeProject):
+    # 빌드 5개, 각 빌드에 배포 하나. 다른 프로젝트의 이력이 섞여 있어도 걸러야 한다
+    project = makeProject('sample')
+    other = makeProject('other')
+    buildIds, deployIds = [], []
+    for target in (project, other):
+        for index in range(5):
+            build = Build(project_id=target.id, commit_msg=f'commit {index}', image_name=target.name,
+                          image_tag=f'{index:07d}')
+            db.session.add(build)
+            db.session.flush()
+            deploy = Deploy(build_id=build.id, project_id=target.id)
+            db.session.add(deploy)
+            db.session.flush()
+            if target is project:
+                buildIds.append(build.id)
+                deployIds.append(deploy.id)
+    db.session.commit()
+    return project.id, buildIds, deployIds
+
+
+@pytest.mark.parametrize('args', [{'limit': '0'}, {'limit': '101'}, {'limit': 'ten'}, {'after': 'abc'}])
+def test_invalid_pagination_args_are_rejected(args):
+    with pytest.raises(InvalidPaginationError):
+        parsePaginationArgs(args)
+
+
+def test_pagination_defaults():
+    assert parsePaginationArgs({}) == (20, None)
+    assert parsePaginationArgs({'limit': '100', 'after': '7'}) == (100, 7)
+
+
+def test_build_pages_follow_the_cursor(history):
+    projectId, buildIds, deployIds = history
+
+    firstPage, cursor = fetchBuildPage(projectId, 2)
+    secondPage, secondCursor = fetchBuildPage(projectId, 2, cursor)
+    lastPage, lastCursor = fetchBuildPage(projectId, 2, secondCursor)
+
+    assert [build['id'] for build in firstPage + secondPage + lastPage] == buildIds[::-1]
+    assert cursor == buildIds[3]
+    assert lastCursor is None
+
+
+def test_exact_page_has_no_next_cursor(history):
+    projectId, buildIds, deployIds = history
+
+    page, cursor = fetchDeployPage(projectId, 5)
+
+    assert [deploy['id'] for deploy in page] == deployIds[::-1]
+    assert cursor is None
+    assert fetchDeployPage(projectId, 2, deployIds[0]) == ([], None)
+
+
+def test_detail_with_limit_returns_recent_history_oldest_first(history):
+    projectId, buildIds, deployIds = history
+
+    detail = getProjectDetailById(projectId, limit=3)
+
+    assert [build['id'] for build in detail['builds']] == buildIds[2:]
+    assert [deploy['id'] for deploy in detail['deploys']] == deployIds[2:]
+    assert detail['buildsCursor'] == buildIds[2]
+    assert detail['deploysCursor'] == deployIds[2]
+
+
+def test_out_of_range_limit_is_a_bad_request(app, user, history):
+    projectId, buildIds, deployIds = history
+    db.session.add(Token(user_id=user.id, access_token='token'))
+    db.session.commit()
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer token'}
+
+    for path in (f'/project/{projectId}/builds?limit=101', f'/project/{projectId}/deploys?after=abc',
+                 f'/project/{projectId}?limit=0'):
+        response = client.get(path, headers=headers)
+        assert response.status_code == 400, path
+        assert response.json['error']['status'] == 400
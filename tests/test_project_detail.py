@@ -0,0 +1,54 @@
+from sqlalchemy import event
+
+from route import db
+from route.models import Build, Deploy, Secret
+from route.project.utils import getProjectDetailById
+
+
+def countQueries(func):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        func()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return len(statements)
+
+
+def addHistory(project, count):
+    for index in range(count):
+        build = Build(project_id=project.id, commit_msg=f'commit {index}', image_name=project.name,
+                      image_tag=f'{index:07d}')
+        db.session.add(build)
+        db.session.flush()
+        db.session.add(Deploy(build_id=build.id, project_id=project.id))
+    db.session.add(Secret(project_id=project.id, key='KEY', value='value'))
+    db.session.commit()
+
+
+def test_detail_query_count_does_not_grow_with_history(makeProject):
+    single = makeProject('single')
+    many = makeProject('many')
+    addHistory(single, 1)
+    addHistory(many, 25)
+    singleId, manyId = single.id, many.id
+    db.session.expire_all()
+
+    # 프로젝트, 빌드, 배포(+빌드 조인), 시크릿
+    assert countQueries(lambda: getProjectDetailById(singleId)) == 4
+    assert countQueries(lambda: getProjectDetailById(manyId)) == 4
+
+
+def test_detail_returns_history_in_order(makeProject):
+    project = makeProject()
+    addHistory(project, 3)
+
+    data = getProjectDetailById(project.id)
+
+    assert [build['imageTag'] for build in data['builds']] == ['0000000', '0000001', '0000002']
+    assert len(data['deploys']) == 3
+    assert data['secrets'] == [{'key': 'KEY', 'value': 'value'}]
@@ -0,0 +1,11 @@
+from route.project.status import DELETING_STATUS
+from route.project.utils import fetchProjects
+
+
+def test_deleting_projects_are_hidden(user, makeProject):
+    makeProject('kept', status=4)
+    makeProject('leaving', status=DELETING_STATUS)
+
+    projects = fetchProjects(user.id)
+
+    assert [project['name'] for project in projects] == ['kept']
@@ -0,0 +1,94 @@
+import json
+import threading
+import time
+
+import pytest
+
+from route import queue
+from route.queue import registerJobHandler, enqueueJob, runWorker, findQueuedPayloads, _makeJob, \
+    JOB_QUEUE_KEY, PROCESSING_JOB_KEY, WORKERS_KEY, WORKER_HEARTBEAT_KEY
+
+TEST_JOB = 'test-job'
+
+
+@pytest.fixture
+def handled():
+    handled = []
+    registerJobHandler(TEST_JOB, lambda payload: handled.append(payload), maxAttempts=1)
+    yield handled
+    queue._handlers.pop(TEST_JOB, None)
+
+
+@pytest.fixture
+def worker(app, redisClient):
+    stopped = threading.Event()
+    thread = threading.Thread(target=runWorker, args=(app,), kwargs={'pollInterval': 0.01, 'stopped': stopped},
+                              daemon=True)
+
+    def start():
+        thread.start()
+    yield start
+    stopped.set()
+    thread.join(timeout=5)
+
+
+def waitFor(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_finished_job_is_acknowledged(redisClient, handled, worker):
+    enqueueJob(TEST_JOB, {'n': 1})
+    worker()
+
+    assert waitFor(lambda: handled == [{'n': 1}])
+    assert waitFor(lambda: all(redisClient.llen(PROCESSING_JOB_KEY.format(workerId)) == 0
+                               for workerId in redisClient.smembers(WORKERS_KEY)))
+    assert redisClient.llen(JOB_QUEUE_KEY.format(TEST_JOB)) == 0
+
+
+def test_job_left_by_dead_worker_is_requeued(redisClient, handled, worker):
+    # 하트비트 없이 처리 중 목록에 작업을 남긴 워커 (처리 도중 죽은 경우)
+    redisClient.sadd(WORKERS_KEY, 'dead')
+    redisClient.rpush(PROCESSING_JOB_KEY.format('dead'), _makeJob(TEST_JOB, {'n': 2}))
+    worker()
+
+    assert waitFor(lambda: handled == [{'n': 2}])
+    assert redisClient.llen(PROCESSING_JOB_KEY.format('dead')) == 0
+    assert 'dead' not in redisClient.smembers(WORKERS_KEY)
+
+
+def test_job_of_live_worker_is_not_requeued(redisClient, handled, worker):
+    redisClient.sadd(WORKERS_KEY, 'busy')
+    redisClient.set(WORKER_HEARTBEAT_KEY.format('busy'), time.time(), ex=30)
+    redisClient.rpush(PROCESSING_JOB_KEY.format('busy'), _makeJob(TEST_JOB, {'n': 3}))
+    enqueueJob(TEST_JOB, {'n': 4})
+    worker()
+
+    assert waitFor(lambda: handled == [{'n': 4}])
+    time.sleep(0.1)
+    assert handled == [{'n': 4}]
+    assert [json.loads(raw)['payload'] for raw in redisClient.lrange(PROCESSING_JOB_KEY.format('busy'), 0, -1)] \
+        == [{'n': 3}]
+    assert {'n': 3} in findQueuedPayloads(TEST_JOB)
+
+
+def test_sweeper_requeues_projects_without_jobs(redisClient, makeProject):
+    from route.project.sweeper import requeueStuckProjects
+    from route.project.provision import PROVISION_JOB
+    from route.project.teardown import TEARDOWN_JOB
+    from route.project.status import PROVISIONING_STATUS, DELETING_STATUS
+
+    lost = makeProject('lost', status=PROVISIONING_STATUS)
+    queued = makeProject('queued', status=PROVISIONING_STATUS)
+    deleting = makeProject('deleting', status=DELETING_STATUS)
+    enqueueJob(PROVISION_JOB, {'projectId': queued.id})
+
+    requeueStuckProjects()
+
+    assert sorted(payload['projectId'] for payload in findQueuedPayloads(PROVISION_JOB)) == [lost.id, queued.id]
+    assert findQueuedPayloads(TEARDOWN_JOB) == [{'projectId': deleting.id}]
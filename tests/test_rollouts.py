@@ -0,0 +1,85 @@
+import pytest
+
+from route import db
+from route.models import Build, Deploy, Project
+from route.project.kube import FakeKubeBackend
+from route.project.rollouts import RolloutWatcher, WATCHER_LEADER_KEY
+from route.project.status import DEPLOYING_STATUS
+
+
+@pytest.fixture
+def backend():
+    return FakeKubeBackend()
+
+
+@pytest.fixture
+def watcher(app, backend):
+    return RolloutWatcher(app, backend=backend, watchTimeout=0.05)
+
+
+@pytest.fixture
+def deployingProject(makeProject, backend):
+    project = makeProject('sample', status=DEPLOYING_STATUS)
+    db.session.add(Build(project_id=project.id, commit_msg='commit', image_name='sample', image_tag='0000002'))
+    db.session.commit()
+    backend.addRollout('sample', 'sample', image='ghcr.io/pnu-capstone-4/sample:0000001')
+    # 새 이미지로 패치했지만 컨트롤러가 아직 반영하지 않은 상태 (이전 리비전의 Healthy가 남아 있다)
+    backend.patchRolloutImage('sample', 'sample', 'ghcr.io/pnu-capstone-4/sample:0000002', 80)
+    return project.id
+
+
+def projectStatus(projectId):
+    return db.session.get(Project, projectId).status
+
+
+def test_stale_healthy_is_ignored_until_the_new_generation_is_observed(redisClient, watcher, backend,
+                                                                       deployingProject):
+    resourceVersion = watcher.runOnce(redisClient, None)
+    assert projectStatus(deployingProject) == DEPLOYING_STATUS
+    assert Deploy.query.count() == 0
+
+    backend.setRolloutPhase('sample', 'sample', 'Healthy')
+    watcher.runOnce(redisClient, resourceVersion)
+
+    project = db.session.get(Project, deployingProject)
+    assert project.status == 4
+    assert project.current_deploy_id is not None
+
+
+def test_healthy_creates_exactly_one_deploy(redisClient, watcher, backend, deployingProject):
+    backend.setRolloutPhase('sample', 'sample', 'Healthy')
+    backend.setRolloutPhase('sample', 'sample', 'Healthy')
+
+    resourceVersion = watcher.runOnce(redisClient, None)
+    watcher.runOnce(redisClient, resourceVersion)
+    # 다시 목록을 받아도 같은 전이를 두 번 반영하지 않는다
+    watcher.runOnce(redisClient, None)
+
+    assert Deploy.query.count() == 1
+
+
+def test_expired_resource_version_relists(redisClient, watcher, backend, deployingProject):
+    resourceVersion = watcher.runOnce(redisClient, None)
+    listCalls = backend.calls
+    backend.setRolloutPhase('sample', 'sample', 'Healthy')
+    backend.compactEvents()
+
+    assert watcher.runOnce(redisClient, resourceVersion) is None
+    assert projectStatus(deployingProject) == DEPLOYING_STATUS
+
+    watcher.runOnce(redisClient, None)
+    assert backend.calls == listCalls + 1
+    assert projectStatus(deployingProject) == 4
+
+
+def test_only_the_leader_renews_its_lease(redisClient, app, backend):
+    leader = RolloutWatcher(app, backend=backend, lease=60)
+    follower = RolloutWatcher(app, backend=backend, lease=60)
+
+    assert leader._holdLeadership(redisClient)
+    redisClient.expire(WATCHER_LEADER_KEY, 5)
+    assert not follower._holdLeadership(redisClient)
+    assert redisClient.ttl(WATCHER_LEADER_KEY) <= 5
+
+    assert leader._holdLeadership(redisClient)
+    assert redisClient.ttl(WATCHER_LEADER_KEY) > 5
@@ -0,0 +1,130 @@
+import time
+
+from itertools import islice
+
+from route.metrics import getCounters
+from route.sse import _SseClient, SseHub, getSseHub, loadMissedEvents, publishEvent, streamEvents, SSE_STREAM_KEY
+
+
+def openStream(app, query, headers=None):
+    response = app.test_client().get(f'/stream?{query}', headers=headers or {}, buffered=False)
+    return response, iter(response.response)
+
+
+def test_events_after_the_last_id_are_replayed(redisClient):
+    firstId = publishEvent('1', {'projectId': 1, 'status': 1})
+    secondId = publishEvent('1', {'projectId': 1, 'status': 2})
+    thirdId = publishEvent('1', {'projectId': 1, 'status': 3})
+
+    missed = loadMissedEvents('1', firstId)
+
+    assert [eventId for eventId, frame in missed] == [secondId, thirdId]
+    assert f'id:{secondId}' in missed[0][1]
+    assert '"status": 2' in missed[0][1]
+
+
+def test_trimmed_or_unknown_ids_need_a_resync(redisClient):
+    firstId = publishEvent('1', {'projectId': 1, 'status': 1})
+    publishEvent('1', {'projectId': 1, 'status': 2})
+    redisClient.xtrim(SSE_STREAM_KEY.format('1'), maxlen=1, approximate=False)
+
+    assert loadMissedEvents('1', firstId) is None
+    assert loadMissedEvents('1', 'not-an-id') is None
+    assert loadMissedEvents('2', firstId) is None
+
+
+def test_live_events_already_replayed_are_skipped():
+    client = _SseClient('1', 10)
+    missed = [('5-0', 'data: replayed\n\n')]
+    # 재전송 목록을 읽는 동안 같은 이벤트가 pub/sub으로도 도착한 상태
+    client.push('5-0', 'data: replayed\n\n')
+    client.push('6-0', 'data: live\n\n')
+
+    frames = list(islice(streamEvents(client, missed, keepalive=0.01), 4))
+
+    assert frames == [':connected\n\n', 'data: replayed\n\n', 'data: live\n\n', ':keepalive\n\n']
+
+
+def test_stream_replays_from_last_event_id(redisClient, app):
+    firstId = publishEvent('1', {'projectId': 1, 'status': 1})
+    publishEvent('1', {'projectId': 1, 'status': 2})
+
+    response, body = openStream(app, 'channel=1', {'Last-Event-ID': firstId})
+    try:
+        assert next(body) == b':connected\n\n'
+        assert b'"status": 2' in next(body)
+    finally:
+        response.close()
+
+
+def test_stream_asks_for_resync_when_events_were_trimmed(redisClient, app):
+    firstId = publishEvent('1', {'projectId': 1, 'status': 1})
+    publishEvent('1', {'projectId': 1, 'status': 2})
+    redisClient.xtrim(SSE_STREAM_KEY.format('1'), maxlen=1, approximate=False)
+
+    response, body = openStream(app, f'channel=1&lastEventId={firstId}')
+    try:
+        next(body)
+        assert next(body).startswith(b'event:resync')
+    finally:
+        response.close()
+
+
+def test_hub_dispatches_only_to_the_channel_clients(redisClient):
+    hub = SseHub(queueSize=10)
+    mine = hub.register('1')
+    other = hub.register('2')
+
+    hub.dispatch('1', '1-0', 'data: hello\n\n')
+
+    assert mine.next(0) == ('1-0', 'data: hello\n\n')
+    assert other.next(0) == ''
+    hub.unregister(mine)
+    hub.unregister(other)
+    assert hub.connectionCount() == 0
+
+
+def test_slow_consumer_is_dropped_when_its_queue_is_full(redisClient):
+    hub = SseHub(queueSize=2)
+    client = hub.register('1')
+    droppedBefore = getCounters().get('sse.slow_consumer.dropped', 0)
+
+    for index in range(4):
+        hub.dispatch('1', f'{index}-0', f'data: {index}\n\n')
+
+    assert client.dropped
+    assert not client.frames
+    assert client.next(0) is None
+    # 끊긴 뒤에는 더 넣지 않는다
+    assert getCounters().get('sse.slow_consumer.dropped', 0) == droppedBefore + 1
+    assert list(streamEvents(client)) == [':connected\n\n']
+    hub.unregister(client)
+
+
+def test_idle_stream_sends_keepalives():
+    client = _SseClient('1', 10)
+
+    frames = list(islice(streamEvents(client, keepalive=0.01), 3))
+
+    assert frames == [':connected\n\n', ':keepalive\n\n', ':keepalive\n\n']
+
+
+def test_published_event_reaches_an_open_stream(redisClient, app):
+    response, body = openStream(app, 'channel=7')
+    try:
+        assert next(body) == b':connected\n\n'
+        # 허브의 리스너가 구독을 마치기 전에 보낸 이벤트는 사라지므로 받을 때까지 다시 보낸다
+        client = next(iter(getSseHub()._clients['7']))
+        deadline = time.monotonic() + 5
+        eventIds = []
+        while True:
+            eventIds.append(publishEvent('7', {'projectId': 7, 'status': 4}))
+            if client.ready.wait(0.1) or time.monotonic() > deadline:
+                break
+
+        frame = next(body)
+        assert any(f'id:{eventId}'.encode() in frame for eventId in eventIds)
+        assert b'"status": 4' in frame
+    finally:
+        response.close()
+    assert getSseHub().connectionCount() == 0
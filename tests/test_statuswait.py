@@ -0,0 +1,121 @@
+import threading
+
+import pytest
+
+from sqlalchemy import text
+
+from route import db
+from route.metrics import getCounters
+from route.models import Build, Deploy, Token
+from route.project import statuswait
+from route.project.kube import FakeKubeBackend, setKubeBackend
+from route.project.status import DEPLOYING_STATUS
+from route.project.statuswait import waitForStatusChange
+
+
+@pytest.fixture
+def kubeBackend():
+    backend = FakeKubeBackend()
+    setKubeBackend(backend)
+    yield backend
+    setKubeBackend(None)
+
+
+@pytest.fixture
+def fastRecheck(monkeypatch):
+    monkeypatch.setattr(statuswait, 'ROLLOUT_RECHECK_INTERVAL', 0.05)
+
+
+def makeBuild(project):
+    build = Build(project_id=project.id, commit_msg='commit', image_name=project.name, image_tag='0000001')
+    db.session.add(build)
+    db.session.commit()
+    return build
+
+
+def test_no_transaction_is_held_while_waiting(redisClient, makeProject, fastRecheck, monkeypatch):
+    project = makeProject(status=2)
+    build = makeBuild(project)
+    inTransaction = []
+
+    class RecordingEvent(threading.Event):
+        def wait(self, timeout=None):
+            inTransaction.append(db.session().in_transaction())
+            return super().wait(timeout)
+
+    class RecordingWaiter(statuswait._Waiter):
+        def __init__(self):
+            super().__init__()
+            self.event = RecordingEvent()
+    monkeypatch.setattr(statuswait, '_Waiter', RecordingWaiter)
+
+    waitForStatusChange(project, build, 2, 0.2)
+
+    assert inTransaction and not any(inTransaction)
+
+
+def test_change_without_notification_is_seen_on_the_next_wake(redisClient, makeProject, fastRecheck):
+    project = makeProject(status=2)
+    build = makeBuild(project)
+    projectId, engine = project.id, db.engine
+
+    def changeStatus():
+        # 알림 없이(ORM 이벤트를 거치지 않고) 다른 커넥션에서 상태가 바뀐 경우
+        with engine.begin() as connection:
+            connection.execute(text('UPDATE Project SET status = 3 WHERE id = :id'), {'id': projectId})
+    timer = threading.Timer(0.1, changeStatus)
+    timer.start()
+
+    result = waitForStatusChange(project, build, 2, 1)
+    timer.join()
+
+    assert result['status'] == 3
+    assert result['changed']
+
+
+def test_rollout_lookup_errors_keep_waiting(redisClient, makeProject, kubeBackend, fastRecheck):
+    # Rollout이 없어 Kubernetes API가 404를 돌려주는 상태
+    project = makeProject(status=DEPLOYING_STATUS)
+    build = makeBuild(project)
+    errorsBefore = getCounters().get('status.wait.rollout_error', 0)
+
+    result = waitForStatusChange(project, build, DEPLOYING_STATUS, 0.2)
+
+    assert result['status'] == DEPLOYING_STATUS
+    assert not result['changed']
+    assert getCounters().get('status.wait.rollout_error', 0) > errorsBefore
+
+
+@pytest.fixture
+def staleRollout(redisClient, makeProject, kubeBackend):
+    # 이전 이미지의 Healthy가 남아 있고 컨트롤러도 그 스펙을 반영한 상태
+    project = makeProject('sample', status=DEPLOYING_STATUS)
+    kubeBackend.addRollout('sample', 'sample', image='ghcr.io/pnu-capstone-4/sample:0000000')
+    return project, makeBuild(project)
+
+
+def test_deploy_status_ignores_healthy_of_another_image(app, user, kubeBackend, staleRollout):
+    project, build = staleRollout
+    db.session.add(Token(user_id=user.id, access_token='token'))
+    db.session.commit()
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer token'}
+
+    response = client.get(f'/project/deploy/status?buildId={build.id}', headers=headers)
+    assert response.get_json() == {'status': DEPLOYING_STATUS}
+    assert Deploy.query.count() == 0
+
+    kubeBackend.patchRolloutImage('sample', 'sample', 'ghcr.io/pnu-capstone-4/sample:0000001', 80)
+    kubeBackend.setRolloutPhase('sample', 'sample', 'Healthy')
+    response = client.get(f'/project/deploy/status?buildId={build.id}', headers=headers)
+    assert response.get_json() == {'status': 4}
+    assert Deploy.query.one().build_id == build.id
+
+
+def test_wait_ignores_healthy_of_another_image(staleRollout, fastRecheck):
+    project, build = staleRollout
+
+    result = waitForStatusChange(project, build, DEPLOYING_STATUS, 0.2)
+
+    assert result['changed'] is False
+    assert Deploy.query.count() == 0
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from route import db
+from route.models import PendingBuild, getSeoulTime
+from route.project.sweeper import deleteStalePendingBuilds, PENDING_BUILD_MAX_AGE
+
+
+def test_stale_pending_builds_are_deleted(makeProject):
+    project = makeProject()
+    now = getSeoulTime()
+    db.session.add_all([
+        PendingBuild(project_id=project.id, image_tag='0000001', sha='0000001' + '0' * 33, commit_msg='old',
+                     created=now - timedelta(seconds=PENDING_BUILD_MAX_AGE + 60)),
+        PendingBuild(project_id=project.id, image_tag='0000002', sha='0000002' + '0' * 33, commit_msg='recent',
+                     created=now - timedelta(seconds=60)),
+    ])
+    db.session.commit()
+
+    assert deleteStalePendingBuilds() == 1
+    assert [pendingBuild.commit_msg for pendingBuild in PendingBuild.query] == ['recent']
@@ -0,0 +1,19 @@
+import sys
+import os
+import logging
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from route import create_app
+from route.queue import runWorker
+from route.project import sweeper  # noqa: F401 (주기적인 고아 리소스 정리 작업 등록)
+from route.project.rollouts import startRolloutWatcher
+from route.project.outbox import startOutboxRelay
+
+app = create_app()
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    startRolloutWatcher(app)  # 배포 상태는 Rollout watch로 반영한다 (리더 하나만 동작)
+    startOutboxRelay(app)  # 커밋된 상태 변경 이벤트(Outbox)를 모아 SSE로 발행한다
+    runWorker(app)  # Redis 작업 큐(프로젝트 프로비저닝 등)를 처리하는 워커 프로세스